@@ -0,0 +1,72 @@
+"""
+بنچمارک مسیر بایتی (--bytes-extraction) در برابر مسیر متنی برای بدنه متنی و Base64: توان
+عملیاتی (MB/s)، اوج حافظه تخصیص‌یافته در طول استخراج (tracemalloc) و تعداد بلوک‌های حافظه‌ای
+که پس از استخراج زنده می‌مانند (sys.getallocatedblocks). ورودی بدنه خام پاسخ (bytes) است،
+پس هزینه decode مسیر متنی (معادل response.text) هم حساب می‌شود.
+
+    python benchmarks/bench_bytes.py --size 32
+"""
+import argparse
+import base64
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'benchmarks')]
+
+import collector  # noqa: E402
+from bench_extract import corpus  # noqa: E402
+
+
+def _stream(body: bytes, raw_bytes: bool) -> list:
+    extractor = collector.StreamingExtractor(raw_bytes=raw_bytes)
+    view = memoryview(body)
+    for start in range(0, len(body), collector.STREAM_CHUNK_SIZE):
+        extractor.feed(bytes(view[start:start + collector.STREAM_CHUNK_SIZE]))
+    return extractor.close()
+
+
+PATHS = {
+    'str': lambda body: collector.extract_configs(body.decode('utf-8', 'ignore')),
+    'bytes': collector.extract_configs_bytes,
+    'stream str': lambda body: _stream(body, False),
+    'stream bytes': lambda body: _stream(body, True),
+}
+
+
+def measure(function, body: bytes) -> tuple:
+    gc.collect()
+    started = time.perf_counter()
+    result = function(body)
+    elapsed = time.perf_counter() - started
+    del result
+    gc.collect()
+    blocks = sys.getallocatedblocks()
+    tracemalloc.start()
+    result = function(body)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    gc.collect()
+    return elapsed, peak, sys.getallocatedblocks() - blocks, len(result)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size', type=int, default=32, help="حجم متن پیکره (مگابایت)")
+    args = parser.parse_args()
+
+    text = corpus(args.size).encode()
+    bodies = {'plain': text, 'base64': base64.b64encode(text)}
+    print(f"{'بدنه':>8} {'مسیر':>13} {'زمان':>8} {'MB/s':>8} {'اوج تخصیص (MB)':>16} {'بلوک‌های زنده':>14} {'کانفیگ':>8}")
+    for name, body in bodies.items():
+        for path, function in PATHS.items():
+            elapsed, peak, blocks, count = measure(function, body)
+            print(f"{name:>8} {path:>13} {elapsed:>7.2f}s {len(body) / elapsed / 1e6:>8.1f} "
+                  f"{peak / 1e6:>16.1f} {blocks:>14} {count:>8}")
+
+
+if __name__ == '__main__':
+    main()
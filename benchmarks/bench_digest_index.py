@@ -0,0 +1,109 @@
+"""
+بنچمارک DigestIndex در برابر set پایتون برای حذف تکراری بین اجراها: حافظه هر ورودی و نرخ
+جست‌وجو (عضو و غیرعضو). سه ساختار مقایسه می‌شوند: set رشته کانفیگ‌ها (مسیر غیرافزایشی)، set
+digestهای 64 بیتی (int پایتون) و DigestIndex (آرایه‌های فشرده، همراه امتیاز و شماره اجرا).
+حافظه set جدول آن (با tracemalloc) به علاوه اشیای عضو (رشته‌ها یا intها) است؛ حافظه
+DigestIndex اندازه آرایه‌ها (شامل خانه‌های خالی ضریب بار) است. زمان بارگذاری نمایه
+ذخیره‌شده با mmap و هزینه config_digest (کانونیکال در برابر رشته خام) هم گزارش می‌شود.
+
+    python benchmarks/bench_digest_index.py --count 1000000
+"""
+import argparse
+import gc
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'benchmarks')]
+
+import collector  # noqa: E402
+from bench_prefilter import scoring_corpus  # noqa: E402
+
+
+def traced(build) -> tuple:
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return result, size
+
+
+def lookup_rate(contains, keys: list) -> float:
+    started = time.perf_counter()
+    for key in keys:
+        contains(key)
+    return len(keys) / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=1_000_000, help="تعداد ورودی‌ها")
+    parser.add_argument('--lookups', type=int, default=500_000, help="تعداد جست‌وجوها برای هر حالت")
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    configs = [f"{config}#{i}" for i, config in enumerate(scoring_corpus(args.count))]
+    digests = [rng.getrandbits(64) or 1 for _ in range(args.count)]
+    missing_digests = [rng.getrandbits(64) or 1 for _ in range(args.lookups)]
+    missing_configs = [f"{config}#missing" for config in configs[:args.lookups]]
+
+    def build_index():
+        index = collector.DigestIndex()
+        for digest in digests:
+            index.visit(digest, 1)
+        return index
+
+    string_set, string_set_size = traced(lambda: set(configs))
+    string_set_size += sum(map(sys.getsizeof, configs))
+    digest_set, digest_set_size = traced(lambda: {digest for digest in digests})
+    digest_set_size += sum(map(sys.getsizeof, digests))
+    started = time.perf_counter()
+    index = build_index()
+    build_time = time.perf_counter() - started
+    index_size = (index._mask + 1) * collector.DigestIndex._SLOT_SIZE
+    average = sum(map(len, configs)) / len(configs)
+    print(f"{args.count} ورودی، میانگین طول کانفیگ {average:.0f} کاراکتر؛ ساخت DigestIndex: {build_time:.2f}s")
+
+    hits, misses = digests[:args.lookups], missing_digests
+    cases = [
+        ('set رشته‌ها', string_set_size, string_set.__contains__, configs[:args.lookups], missing_configs),
+        ('set digestها', digest_set_size, digest_set.__contains__, hits, misses),
+        ('DigestIndex', index_size, index.__contains__, hits, misses),
+    ]
+    print(f"{'ساختار':>16} {'بایت هر ورودی':>14} {'حافظه (MB)':>11} {'عضو در ثانیه':>14} {'غیرعضو در ثانیه':>16}")
+    for name, size, contains, present, absent in cases:
+        print(f"{name:>16} {size / args.count:>14.1f} {size / 1e6:>11.1f} "
+              f"{lookup_rate(contains, present):>14,.0f} {lookup_rate(contains, absent):>16,.0f}")
+    started = time.perf_counter()
+    for digest in hits:
+        index.visit(digest, 2)
+    print(f"DigestIndex.visit: {len(hits) / (time.perf_counter() - started):,.0f} در ثانیه")
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'seen.bin')
+        index.save(path)
+        index.close()
+        started = time.perf_counter()
+        loaded = collector.DigestIndex.load(path)
+        load_time = time.perf_counter() - started
+        rate = lookup_rate(loaded.__contains__, hits)
+        loaded.close()
+        print(f"فایل نمایه {os.path.getsize(path) / 1e6:.1f} MB؛ بارگذاری با mmap {load_time * 1000:.1f} ms، "
+              f"{rate:,.0f} جست‌وجوی عضو در ثانیه پس از بارگذاری")
+
+    survivors = [config for config in configs[:args.lookups] if collector._prefilter_reject_reason(config) is None]
+    for name, rejected in (('رشته خام', True), ('کانونیکال', False)):
+        started = time.perf_counter()
+        for config in survivors:
+            collector.config_digest(config, rejected)
+        print(f"config_digest ({name}): {len(survivors) / (time.perf_counter() - started):,.0f} کانفیگ در ثانیه")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+بنچمارک موتور استخراج روی یک پیکره مصنوعی (پیش‌فرض 50 مگابایت) با همه پروتکل‌ها و خطوط
+غیرکانفیگ، در برابر regex قبلی (vless|vmess)://... که به دلیل گروه گیرنده فقط نام پروتکل را
+برمی‌گرداند. نسخه اصلاح‌شده همان regex (finditer) و اجرای جداگانه یک regex برای هر پروتکل
+هم برای مقایسه اندازه‌گیری می‌شوند.
+
+    python benchmarks/bench_extract.py --size 50
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import collector  # noqa: E402
+
+OLD_PATTERN = r'(vless|vmess)://[^\s\'"<>]+'
+TEMPLATES = [
+    "vless://{uuid}@node{n}.example.com:443?type=ws&path=%2Fws&security=tls&host=node{n}.example.com#r{n}",
+    "vmess://eyJhZGQiOiJub2RlLmV4YW1wbGUuY29tIiwicG9ydCI6IjQ0MyIsImlkIjoi{n:08d}In0=",
+    "trojan://pw{n}@t{n}.example.com:443?sni=t{n}.example.com#t",
+    "ss://YWVzLTI1Ni1nY206cGFzcw@10.0.{a}.{b}:8388#ss{n}",
+    "ssr://c3NyLmV4YW1wbGUuY29tOjQ0MzpvcmlnaW46{n:08d}",
+    "hysteria2://pw{n}@h{n}.example.com:443?insecure=1#h",
+    "tuic://{uuid}:pw@u{n}.example.com:443?congestion_control=bbr#u",
+    "# comment line {n} without any config",
+    "<a href=\"vless://{uuid}@html{n}.example.com:443?security=tls\">link</a>",
+]
+
+
+def corpus(size_mb: int, seed: int = 1) -> str:
+    rng = random.Random(seed)
+    lines, total, n = [], 0, 0
+    while total < size_mb * 1024 * 1024:
+        line = rng.choice(TEMPLATES).format(uuid=f"{n:08x}-0000-4000-8000-{n:012x}", n=n, a=n % 250, b=n // 250 % 250)
+        lines.append(line)
+        total += len(line) + 1
+        n += 1
+    return '\n'.join(lines)
+
+
+def timed(label: str, function, text: str, size: int):
+    started = time.perf_counter()
+    result = function(text)
+    elapsed = time.perf_counter() - started
+    print(f"{label:<44} {elapsed:>7.2f}s {size / elapsed / 1e6:>8.1f} MB/s {len(result):>10} نتیجه")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size', type=int, default=50, help="حجم پیکره (مگابایت)")
+    args = parser.parse_args()
+
+    text = corpus(args.size)
+    size = len(text)
+    print(f"پیکره: {size / 1e6:.1f} MB، {text.count(chr(10)) + 1} خط")
+
+    old = timed("regex قبلی re.findall (فقط نام پروتکل)", lambda t: re.findall(OLD_PATTERN, t), text, size)
+    print(f"    مقادیر یکتای نتیجه regex قبلی: {sorted(set(old))}")
+    old_pattern = re.compile(OLD_PATTERN)
+    timed("regex قبلی با finditer (URI کامل، vless/vmess)",
+          lambda t: [m.group(0) for m in old_pattern.finditer(t)], text, size)
+    per_protocol = [re.compile(rf'\b{p}://[^\s\'"<>]+') for p in collector.SUPPORTED_PROTOCOLS]
+    timed("یک regex برای هر پروتکل (7 گذر)",
+          lambda t: [m for pattern in per_protocol for m in pattern.findall(t)], text, size)
+    configs = timed("CONFIG_PATTERN (یک گذر، همه پروتکل‌ها)", collector.extract_configs, text, size)
+    started = time.perf_counter()
+    counts = collector.count_protocols(configs)
+    print(f"{'count_protocols':<44} {time.perf_counter() - started:>7.2f}s  {dict(counts.most_common())}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""
+بنچمارک مرحله دریافت منابع روی سرور اشتراک جعلی محلی (بدون شبکه): زمان دریافت پشت سر هم
+(max_workers=1) در برابر دریافت هم‌زمان fetch_sources برای صدها منبع سریع، کند و مرده.
+
+    python benchmarks/bench_fetch.py --fast 200 --slow 80 --dead 20 --hanging 10
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'tests')]
+
+import collector  # noqa: E402
+from fake_subscription import FakeSubscriptionServer  # noqa: E402
+
+
+def run(urls: list, max_workers: int) -> tuple:
+    collector._session = None
+    collector._host_semaphores.clear()
+    started = time.perf_counter()
+    fetched = sum(1 for _ in collector.fetch_sources(urls, max_workers=max_workers))
+    return time.perf_counter() - started, fetched
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--fast', type=int, default=200)
+    parser.add_argument('--slow', type=int, default=80)
+    parser.add_argument('--dead', type=int, default=20, help="منابع با پاسخ 404")
+    parser.add_argument('--hanging', type=int, default=10, help="منابعی که تا پایان مهلت پاسخ نمی‌دهند")
+    parser.add_argument('--delay', type=float, default=0.2, help="تأخیر منابع کند (ثانیه)")
+    parser.add_argument('--timeout', type=float, default=1.0, help="REQUEST_TIMEOUT در طول بنچمارک")
+    parser.add_argument('--skip-sequential', action='store_true')
+    args = parser.parse_args()
+
+    logging.disable(logging.ERROR)
+    collector.REQUEST_TIMEOUT = args.timeout
+    os.chdir(tempfile.mkdtemp())
+    server = FakeSubscriptionServer().start()
+    try:
+        urls = server.add_sources(fast=args.fast, slow=args.slow, dead=args.dead, hanging=args.hanging,
+                                  slow_delay=args.delay)
+        print(f"{len(urls)} منبع: {args.fast} سریع، {args.slow} کند ({args.delay} ثانیه)، "
+              f"{args.dead} مرده (404)، {args.hanging} بی‌پاسخ (مهلت {args.timeout} ثانیه)")
+        print(f"کران پایین زمان پشت سر هم: {args.slow * args.delay + args.hanging * args.timeout:.1f} ثانیه")
+        concurrent_time, fetched = run(urls, collector.MAX_CONCURRENT_FETCHES)
+        print(f"هم‌زمان (سقف کل {collector.MAX_CONCURRENT_FETCHES}، هر میزبان {collector.MAX_FETCHES_PER_HOST}): "
+              f"{concurrent_time:.2f} ثانیه، {fetched} منبع دریافت شد، بیشینه هم‌زمانی سرور {server.max_active}")
+        if not args.skip_sequential:
+            sequential_time, _ = run(urls, 1)
+            print(f"پشت سر هم: {sequential_time:.2f} ثانیه؛ افزایش سرعت {sequential_time / concurrent_time:.1f} برابر")
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""
+بنچمارک امتیازدهی موازی (score_configs) و نقطه سربه‌سر آن با اجرای تک‌پردازه‌ای.
+
+اجزای هزینه جداگانه اندازه‌گیری می‌شوند:
+  c  زمان امتیازدهی هر کانفیگ (_score_batch تک‌پردازه‌ای)
+  S  راه‌اندازی و بستن ProcessPoolExecutor با W پردازه (ساخت پردازه‌ها با روش فعلی و اولین کار هر پردازه)
+  p  هزینه سمت پردازه اصلی برای هر کانفیگ: pickle دسته‌ها و unpickle نتیجه‌ها (سریالی)
+  q  هزینه سمت پردازه کارگر برای هر کانفیگ: unpickle دسته و pickle نتیجه (موازی)
+
+با W هسته آزاد: T_serial = N·c و T_parallel ≈ S + N·p + N·(c + q)/W، پس نقطه سربه‌سر
+N* = S / (c - p - (c + q)/W) است. مدل با اجرای واقعی روی همین دستگاه (با min(W, هسته‌ها)
+به جای W) مقایسه می‌شود و توان عملیاتی هر پردازه از خروجی _score_batch گزارش می‌شود.
+PARALLEL_SCORING_THRESHOLD از همین نقطه سربه‌سر تعیین شده است.
+
+    python benchmarks/bench_parallel.py --count 400000 --workers 1 2 4
+"""
+import argparse
+import multiprocessing
+import os
+import pickle
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'benchmarks')]
+
+import collector  # noqa: E402
+from bench_prefilter import scoring_corpus  # noqa: E402
+
+
+def _noop(_):
+    return os.getpid()
+
+
+def pool_startup(workers: int, context, repeat: int = 5) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+            list(executor.map(_noop, range(workers)))
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def transfer_costs(configs: list) -> tuple:
+    """(p, q) برای هر کانفیگ، روی دسته‌هایی به اندازه SCORING_BATCH_SIZE."""
+    batch = configs[:collector.SCORING_BATCH_SIZE]
+    result = collector._score_batch(batch)
+    started = time.perf_counter()
+    sent = pickle.dumps(batch, pickle.HIGHEST_PROTOCOL)
+    pickle.loads(pickle.dumps(result, pickle.HIGHEST_PROTOCOL))
+    parent = time.perf_counter() - started
+    started = time.perf_counter()
+    pickle.loads(sent)
+    pickle.dumps(result, pickle.HIGHEST_PROTOCOL)
+    worker = time.perf_counter() - started
+    return parent / len(batch), worker / len(batch)
+
+
+def crossover(c: float, startup: float, p: float, q: float, workers: int) -> float:
+    gain = c - p - (c + q) / workers
+    return startup / gain if gain > 0 else float('inf')
+
+
+def run_parallel(configs: list, workers: int, context) -> tuple:
+    batches = [configs[i:i + collector.SCORING_BATCH_SIZE]
+               for i in range(0, len(configs), collector.SCORING_BATCH_SIZE)]
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        results = list(executor.map(collector._score_batch, batches))
+    elapsed = time.perf_counter() - started
+    per_worker = {}
+    for _, _, pid, size, busy in results:
+        total_size, total_busy = per_worker.get(pid, (0, 0.0))
+        per_worker[pid] = (total_size + size, total_busy + busy)
+    return elapsed, [size / busy for size, busy in per_worker.values()]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=400_000, help="تعداد کانفیگ‌های پیکره")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4], help="تعداد پردازه‌ها برای اجرای واقعی")
+    parser.add_argument('--start-method', default=None, choices=multiprocessing.get_all_start_methods(),
+                        help="روش ساخت پردازه‌ها (پیش‌فرض: روش پیش‌فرض سیستم، مثل score_configs)")
+    args = parser.parse_args()
+    context = multiprocessing.get_context(args.start_method)
+
+    cores = os.cpu_count() or 1
+    configs = scoring_corpus(args.count)
+    started = time.perf_counter()
+    collector._score_batch(configs)
+    serial = time.perf_counter() - started
+    c = serial / len(configs)
+    p, q = transfer_costs(configs)
+    print(f"{cores} هسته، روش {context.get_start_method()}؛ {len(configs)} کانفیگ، "
+          f"اندازه دسته {collector.SCORING_BATCH_SIZE}")
+    print(f"c = {c * 1e6:.2f} µs   p = {p * 1e6:.2f} µs   q = {q * 1e6:.2f} µs   "
+          f"(تک‌پردازه‌ای: {serial:.2f}s، {len(configs) / serial:,.0f} کانفیگ در ثانیه)")
+
+    print(f"\n{'W':>3} {'S (ms)':>8} {'N* با W هسته':>14} {'پیش‌بینی (s)':>13} {'واقعی (s)':>10} {'کانفیگ در ثانیه هر پردازه':>26}")
+    for workers in sorted(set(args.workers + [2, 4, 8])):
+        startup = pool_startup(workers, context)
+        point = crossover(c, startup, p, q, workers)
+        line = f"{workers:>3} {startup * 1000:>8.1f} {point:>14,.0f}"
+        if workers in args.workers:
+            predicted = startup + len(configs) * (p + (c + q) / min(workers, cores))
+            elapsed, rates = run_parallel(configs, workers, context)
+            line += f" {predicted:>13.2f} {elapsed:>10.2f} {', '.join(f'{rate:,.0f}' for rate in rates):>26}"
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+بنچمارک parse_share_link در برابر urlparse + parse_qs روی کانفیگ‌های vless پیکره امتیازدهی:
+سرعت پارس (رکورد در ثانیه) و حافظه هر رکورد پارس‌شده (tracemalloc، با نگه داشتن همه
+رکوردها). برای urlparse رکورد همان جفت (ParseResult، dict لیست‌ها) است که امتیازدهی قبلی
+می‌ساخت؛ port و hostname آن property هستند و هر بار از نو محاسبه می‌شوند.
+
+    python benchmarks/bench_parser.py --count 200000
+"""
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+from urllib.parse import parse_qs, urlparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'benchmarks')]
+
+import collector  # noqa: E402
+from bench_prefilter import scoring_corpus  # noqa: E402
+
+
+def urlparse_record(config: str) -> tuple:
+    parsed = urlparse(config)
+    return parsed, parse_qs(parsed.query)
+
+
+def urlparse_fields(config: str) -> tuple:
+    """همان فیلدهایی که امتیازدهی و اثر انگشت می‌خوانند، با urlparse."""
+    parsed, params = urlparse_record(config)
+    return parsed.scheme, parsed.hostname, parsed.port, {key: values[0] for key, values in params.items()}
+
+
+def parser_fields(config: str) -> tuple:
+    link = collector.parse_share_link(config)
+    return link.scheme, link.host, link.port, link.params
+
+
+PARSERS = {
+    'urlparse + parse_qs': (urlparse_record, urlparse_fields),
+    'parse_share_link': (collector.parse_share_link, parser_fields),
+}
+
+
+def measure(parse, configs: list) -> tuple:
+    gc.collect()
+    started = time.perf_counter()
+    for config in configs:
+        parse(config)
+    elapsed = time.perf_counter() - started
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    records = [parse(config) for config in configs]
+    size = tracemalloc.get_traced_memory()[0] - before - sys.getsizeof(records)
+    tracemalloc.stop()
+    return elapsed, size / len(records)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=200_000, help="تعداد کانفیگ‌های vless")
+    args = parser.parse_args()
+
+    configs = []
+    for config in scoring_corpus(args.count * 3):
+        if config.startswith('vless://'):
+            configs.append(config)
+    configs = configs[:args.count]
+    average = sum(map(len, configs)) / len(configs)
+    print(f"{len(configs)} کانفیگ vless، میانگین طول {average:.0f} کاراکتر")
+
+    mismatches = sum(1 for config in configs if urlparse_fields(config) != parser_fields(config))
+    if mismatches:
+        raise SystemExit(f"{mismatches} کانفیگ با دو parser نتیجه متفاوت دارند")
+
+    print(f"{'parser':>28} {'زمان':>8} {'رکورد در ثانیه':>16} {'بایت هر رکورد':>15}")
+    for name, (parse, _) in PARSERS.items():
+        elapsed, per_record = measure(parse, configs)
+        print(f"{name:>28} {elapsed:>7.2f}s {len(configs) / elapsed:>16,.0f} {per_record:>15,.0f}")
+    # هزینه خواندن فیلدها: property های ParseResult در هر دسترسی دوباره پارس می‌کنند
+    for name, (_, fields) in PARSERS.items():
+        started = time.perf_counter()
+        for config in configs:
+            fields(config)
+        elapsed = time.perf_counter() - started
+        print(f"{name + ' + فیلدها':>28} {elapsed:>7.2f}s {len(configs) / elapsed:>16,.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""
+بنچمارک پیش‌فیلتر امتیازدهی روی یک پیکره مصنوعی با ترکیبی شبیه منابع تجمیعی (بیشتر کانفیگ‌ها
+vmess/trojan/ss یا vless بدون tls یا با transport نامناسب‌اند). سه مسیر مقایسه می‌شوند:
+
+  urlparse    نسخه اولیه score_and_filter_config (urlparse + parse_qs برای هر کانفیگ vless)
+  full        parse_share_link و score_share_link برای هر کانفیگ vless، بدون پیش‌فیلتر
+  prefilter   score_and_filter_config فعلی: پیش‌فیلتر روی رشته خام، parser فقط برای بازمانده‌ها
+
+نتیجه هر سه مسیر باید یکسان باشد؛ در غیر این صورت بنچمارک خطا می‌دهد.
+
+    python benchmarks/bench_prefilter.py --count 1000000
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+from collections import Counter
+from urllib.parse import parse_qs, urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import collector  # noqa: E402
+
+# (وزن، الگو)؛ وزن‌ها تقریبی از ترکیب منابع تجمیعی رایج گرفته شده‌اند
+TEMPLATES = [
+    (30, "vmess://eyJhZGQiOiJub2RlLmV4YW1wbGUuY29tIiwicG9ydCI6IjQ0MyIsImlkIjoi{n:08d}In0="),
+    (10, "trojan://pw{n}@t{n}.example.com:443?security=tls&type=ws&sni=t{n}.example.com#t"),
+    (15, "ss://YWVzLTI1Ni1nY206cGFzcw@10.0.{a}.{b}:8388#ss{n}"),
+    (3, "hysteria2://pw{n}@h{n}.example.com:443?insecure=1#h"),
+    (15, "vless://{uuid}@r{n}.example.com:443?encryption=none&flow=xtls-rprx-vision&security=reality"
+         "&sni=www.microsoft.com&fp=chrome&pbk=SbVKOEMjK0sIlbwg4akyBg5mL5KZwwB-ed4eEE7YnRc&type=tcp#reality"),
+    (5, "vless://{uuid}@10.1.{a}.{b}:80?encryption=none&security=none&type=ws&host=x{n}.example.com&path=%2F#none"),
+    (4, "vless://{uuid}@c{n}.example.com:443?encryption=none&security=tls&type=tcp&sni=c{n}.example.com#tcp"),
+    (10, "vless://{uuid}@w{n}.example.com:443?encryption=none&security=tls&type=ws&host=w{n}.example.com"
+         "&path=%2Fws%3Fed%3D2048&sni=w{n}.example.com#ws"),
+    (4, "vless://{uuid}@g{n}.ddns.net:2053?encryption=none&security=tls&type=grpc&serviceName=grpc{n}"
+        "&sni=g{n}.ddns.net#grpc"),
+    (4, "vless://{uuid}@10.2.{a}.{b}:8443?security=tls&type=ws&path=%2F#ws-without-host"),
+]
+
+
+def scoring_corpus(count: int, seed: int = 1) -> list:
+    rng = random.Random(seed)
+    weights = [weight for weight, _ in TEMPLATES]
+    templates = rng.choices([template for _, template in TEMPLATES], weights, k=count)
+    return [template.format(uuid=f"{n:08x}-0000-4000-8000-{n:012x}", n=n, a=n % 250, b=n // 250 % 250)
+            for n, template in enumerate(templates)]
+
+
+def urlparse_score(config: str) -> int:
+    """نسخه اولیه score_and_filter_config، بدون تغییر."""
+    try:
+        if not config.startswith("vless://"):
+            return 0
+        parsed_url = urlparse(config)
+        params = parse_qs(parsed_url.query)
+        if params.get('security', [''])[0] != 'tls':
+            return 0
+        transport = params.get('type', [''])[0]
+        if transport not in ['ws', 'grpc']:
+            return 0
+        if transport == 'grpc' and not params.get('serviceName', [''])[0]:
+            return 0
+        if transport == 'ws' and not params.get('host', [''])[0]:
+            return 0
+        score = 10
+        if parsed_url.port == 443:
+            score += 10
+        hostname = parsed_url.hostname
+        if hostname and not re.match(r'^\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}$', hostname):
+            if not any(ddns in hostname for ddns in ['.ddns.net', '.xyz', '.pw']):
+                score += 20
+        if params.get('sni') or params.get('host'):
+            score += 5
+        return score
+    except Exception:
+        return 0
+
+
+def full_score(config: str) -> int:
+    if not config.startswith("vless://"):
+        return 0
+    return collector._score_parsed_config(config)[0]
+
+
+PATHS = {
+    'urlparse': urlparse_score,
+    'full': full_score,
+    'prefilter': collector.score_and_filter_config,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=1_000_000, help="تعداد کانفیگ‌های پیکره")
+    args = parser.parse_args()
+
+    configs = scoring_corpus(args.count)
+    rejections = Counter()
+    for config in configs:
+        reason = collector._prefilter_reject_reason(config)
+        rejections[reason or 'survivor'] += 1
+    print(f"پیکره: {len(configs)} کانفیگ؛ نتیجه پیش‌فیلتر: {dict(rejections.most_common())}")
+
+    results = {}
+    timings = {}
+    for name, function in PATHS.items():
+        started = time.perf_counter()
+        results[name] = [function(config) for config in configs]
+        timings[name] = time.perf_counter() - started
+    for name in PATHS:
+        if results[name] != results['urlparse']:
+            raise SystemExit(f"نتیجه مسیر {name} با نسخه اولیه یکسان نیست")
+
+    accepted = sum(1 for score in results['prefilter'] if score)
+    print(f"{'مسیر':>10} {'زمان':>8} {'کانفیگ در ثانیه':>16} {'نسبت به urlparse':>17}   ({accepted} پذیرفته)")
+    for name, elapsed in timings.items():
+        print(f"{name:>10} {elapsed:>7.2f}s {len(configs) / elapsed:>16,.0f} {timings['urlparse'] / elapsed:>16.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+بنچمارک حافظه حالت جریانی (--stream) در برابر دریافت کامل بدنه: اوج RSS دریافت و استخراج یک
+منبع Base64 با حجم‌های مختلف از سرور محلی. هر اندازه‌گیری در یک پردازه جدا انجام می‌شود و
+RSS پیش از دریافت (کتابخانه‌های بارگذاری‌شده) از اوج کم می‌شود.
+
+حالت‌ها:
+  buffered  _fetch_source(stream=False): response.content، response.text و متن دیکودشده Base64
+  stream    _fetch_source(stream=True): تکه به تکه، ولی لیست کانفیگ‌های خروجی نگه داشته می‌شود
+  drain     همان StreamingExtractor با خالی کردن لیست کانفیگ‌ها پس از هر تکه؛ فقط حافظه کاری استخراج
+
+    python benchmarks/bench_streaming.py --sizes 8 32 128
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'tests')]
+
+MODES = ('buffered', 'stream', 'drain')
+
+
+def _status_mb(field: str) -> float:
+    # ru_maxrss اوج حافظه پردازه والد (که بدنه‌ها را نگه می‌دارد) را پس از exec حفظ می‌کند، VmHWM نه
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(field + ':'):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def child(mode: str, url: str):
+    """یک اندازه‌گیری؛ (RSS پایه، افزایش اوج RSS، تعداد کانفیگ) را چاپ می‌کند."""
+    import collector
+    os.chdir(tempfile.mkdtemp())
+    collector.get_session()
+    baseline = _status_mb('VmRSS')
+    if mode == 'drain':
+        count = 0
+        extractor = collector.StreamingExtractor()
+        with collector.get_session().get(url, stream=True, timeout=60) as response:
+            for chunk in response.iter_content(chunk_size=collector.STREAM_CHUNK_SIZE):
+                extractor.feed(chunk)
+                count += len(extractor.configs)
+                extractor.configs.clear()
+        count += len(extractor.close())
+    else:
+        configs, _ = collector._fetch_source(url, stream=mode == 'stream')
+        count = len(configs)
+    peak = _status_mb('VmHWM')
+    print(baseline, peak - baseline, count)
+
+
+def corpus(size_mb: int) -> bytes:
+    import base64
+    from fake_subscription import SAMPLE_CONFIGS
+    lines = []
+    total = i = 0
+    while total < size_mb * 1024 * 1024 * 3 // 4:
+        line = SAMPLE_CONFIGS[i % 50].replace('0b6d6a3e', f'{i:08x}', 1)
+        lines.append(line)
+        total += len(line) + 1
+        i += 1
+    return base64.b64encode('\n'.join(lines).encode())
+
+
+def main():
+    if len(sys.argv) == 4 and sys.argv[1] == '--child':
+        child(sys.argv[2], sys.argv[3])
+        return
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[8, 32, 128], help="حجم منبع (مگابایت)")
+    args = parser.parse_args()
+
+    from fake_subscription import FakeSubscriptionServer
+    server = FakeSubscriptionServer().start()
+    try:
+        print(f"{'حجم منبع':>10} {'حالت':>10} {'اوج RSS اضافه (MB)':>20} {'کانفیگ':>10}")
+        for size in args.sizes:
+            url = server.add(f'/{size}', corpus(size))
+            for mode in MODES:
+                output = subprocess.run([sys.executable, __file__, '--child', mode, url],
+                                        capture_output=True, text=True, check=True).stdout.split()
+                _, peak, count = float(output[0]), float(output[1]), int(output[2])
+                print(f"{size:>8}MB {mode:>10} {peak:>20.1f} {count:>10}")
+            del server.routes[f'/{size}']
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+بنچمارک select_top_configs در برابر مسیر قبلی main: ساختن یک dict برای هر کانفیگ پذیرفته‌شده،
+مرتب کردن کل لیست و حذف تکراری‌ها با set در یک گذر دوم. هر دو مسیر با کلید یکسان
+(config_fingerprint) اجرا می‌شوند؛ کلیدها از پیش محاسبه و با یک dict جایگزین تابع می‌شوند تا
+فقط روش انتخاب مقایسه شود و هزینه خود کلید (که برای هر دو مسیر یکسان است) جدا گزارش می‌شود.
+ورودی لیست (config, score) است که نیمی از آن نسخه‌های تکراری (با remark دیگر) است.
+زمان کمینه سه اجراست و اوج حافظه با tracemalloc و فقط برای ساختارهای خود انتخاب اندازه‌گیری می‌شود.
+
+    python benchmarks/bench_topk.py --count 300000 --top 100 1000
+"""
+import argparse
+import gc
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import collector  # noqa: E402
+
+
+def scored_corpus(count: int, seed: int = 1) -> list:
+    rng = random.Random(seed)
+    scored = []
+    for i in range(count):
+        n = rng.randrange(count // 2)
+        port = rng.choice((443, 443, 8443, 2053))
+        config = (f"vless://{n:08x}-0000-4000-8000-{n:012x}@w{n}.example.com:{port}?security=tls&type=ws"
+                  f"&host=w{n}.example.com&path=%2Fws#r{i}")
+        scored.append((config, rng.choice((35, 40, 45))))
+    return scored
+
+
+def sort_then_dedup(scored: list, max_output: int = None) -> list:
+    """مسیر قبلی main با کلید config_fingerprint."""
+    items = [{'id': collector.config_fingerprint(config), 'score': score, 'config': config}
+             for config, score in scored]
+    items.sort(key=lambda x: x['score'], reverse=True)
+    final_configs = []
+    seen_ids = set()
+    for item in items:
+        if item['id'] not in seen_ids:
+            final_configs.append(item['config'])
+            seen_ids.add(item['id'])
+    return final_configs[:max_output]
+
+
+def measure(function, *args, repeat: int = 3) -> tuple:
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        result = function(*args)
+        timings.append(time.perf_counter() - started)
+        del result
+    gc.collect()
+    tracemalloc.start()
+    result = function(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return min(timings), peak, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=300_000, help="تعداد کانفیگ‌های امتیازدار ورودی")
+    parser.add_argument('--top', type=int, nargs='+', default=[100, 1000], help="مقادیر --max-output")
+    args = parser.parse_args()
+
+    scored = scored_corpus(args.count)
+    started = time.perf_counter()
+    for config, _ in scored:
+        collector.config_fingerprint(config)
+    key_cost = time.perf_counter() - started
+    print(f"{len(scored)} کانفیگ امتیازدار؛ محاسبه config_fingerprint (برای هر دو مسیر): {key_cost:.2f}s")
+    keys = {config: collector.config_fingerprint(config) for config, _ in scored}
+    collector.config_fingerprint = keys.__getitem__
+
+    print(f"{'مسیر':>28} {'زمان':>8} {'اوج حافظه (MB)':>15} {'خروجی':>8}")
+    cases = [('sort-then-dedup', sort_then_dedup, None), ('select_top_configs', collector.select_top_configs, None)]
+    for top in args.top:
+        cases += [(f'sort-then-dedup [:{top}]', sort_then_dedup, top),
+                  (f'select_top_configs N={top}', collector.select_top_configs, top)]
+    outputs = {}
+    for name, function, top in cases:
+        elapsed, peak, result = measure(function, scored, top)
+        outputs.setdefault(top, []).append(result)
+        print(f"{name:>28} {elapsed:>7.2f}s {peak / 1e6:>15.1f} {len(result):>8}")
+    # هر دو مسیر به ترتیب امتیاز و در امتیاز برابر به ترتیب ورودی (sort پایدار) خروجی می‌دهند
+    for top, results in outputs.items():
+        if results[0] != results[1]:
+            raise SystemExit(f"خروجی دو مسیر برای max_output={top} یکسان نیست")
+
+
+if __name__ == '__main__':
+    main()
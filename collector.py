@@ -1,95 +1,2381 @@
+import argparse
+import asyncio
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
 import base64
+import binascii
+import codecs
 import logging
-from urllib.parse import urlparse, parse_qs
+import multiprocessing
+import hashlib
+import heapq
+from array import array
+from functools import lru_cache, partial
+import ipaddress
+import json
+import mmap
+import os
+from urllib.parse import urlparse, quote, unquote
 import re
+import shutil
+import socket
+import sqlite3
+import ssl
+import subprocess
+import tempfile
+import threading
+import queue
+import time
+from contextlib import contextmanager
+from collections import Counter, defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 
 # --- تنظیمات اولیه اسکریپت ---
 logging.basicConfig(level=logging.INFO, format='[%(levelname)s] %(message)s')
 SOURCES_FILE = "sources.txt"
 OUTPUT_FILE = "filtered_configs_v2.txt" # نام فایل خروجی جدید
 REQUEST_TIMEOUT = 20
+MAX_CONCURRENT_FETCHES = 32 # سقف کل دریافت‌های هم‌زمان
+MAX_FETCHES_PER_HOST = 8 # سقف دریافت‌های هم‌زمان از یک میزبان
+POOL_HOSTS = 10 # تعداد میزبان‌هایی که استخر اتصال آن‌ها نگه داشته می‌شود
+SOURCE_CACHE_FILE = "source_cache.json" # کش ETag/Last-Modified و کانفیگ‌های استخراج‌شده هر منبع
+SOURCE_CACHE_VERSION = 3 # با هر تغییر در منطق استخراج افزایش یابد تا کش قدیمی نادیده گرفته شود
+STREAM_DOWNLOADS = False # پیش‌فرض --stream: دریافت و استخراج تکه به تکه برای محدود کردن مصرف حافظه در منابع حجیم
+STREAM_CHUNK_SIZE = 64 * 1024 # اندازه هر تکه در حالت جریانی (بایت)
+BYTES_EXTRACTION = False # پیش‌فرض --bytes-extraction: استخراج مستقیم روی بایت‌ها؛ فقط کانفیگ‌های پیدا شده به str تبدیل می‌شوند
+# زیر این تعداد کانفیگ، امتیازدهی تک‌پردازه‌ای سریع‌تر است؛ برای هر روش ساخت پردازه جدا، چون
+# راه‌اندازی استخر با fork حدود 15 میلی‌ثانیه و با spawn/forkserver (که collector را دوباره import
+# می‌کنند) حدود نیم ثانیه است. نقطه سربه‌سر اندازه‌گیری‌شده با 2 پردازه حدود 19 هزار و 600 هزار
+# کانفیگ است (benchmarks/bench_parallel.py)؛ آستانه‌ها کمی بالاتر گذاشته شده‌اند تا سود موازی‌سازی محسوس باشد.
+PARALLEL_SCORING_THRESHOLD = {'fork': 50_000, 'forkserver': 800_000, 'spawn': 800_000}
+SCORING_BATCH_SIZE = 20_000 # تعداد کانفیگ‌های هر دسته ارسالی به پردازه‌ها (کاهش هزینه pickle)
+PROBE_CONCURRENCY = 512 # سقف اتصال‌های هم‌زمان در مرحله بررسی دسترس‌پذیری
+PROBE_TIMEOUT = 5 # مهلت هر بررسی (ثانیه)
+PROBE_DEADLINE = 120 # مهلت کل مرحله بررسی (ثانیه)
+PROBE_PER_IP_CONCURRENCY = 4 # سقف اتصال‌های هم‌زمان بررسی به یک IP
+PROBE_PER_SUBNET_CONCURRENCY = 16 # سقف اتصال‌های هم‌زمان بررسی به یک زیرشبکه /24 (یا /48 در IPv6)
+PROBE_ALPN = ['h2', 'http/1.1'] # پروتکل‌هایی که در handshake بررسی TLS پیشنهاد می‌شوند
+PROBE_SAMPLES = 1 # تعداد نمونه‌های تأخیر برای هر endpoint
+PROBE_SAMPLE_INTERVAL = 1.0 # فاصله زمانی بین نمونه‌های یک endpoint (ثانیه)
+RANK_SCORE_WEIGHT = 1.0 # وزن امتیاز ایستا در رتبه‌بندی نهایی
+RANK_LATENCY_WEIGHT = 0.01 # جریمه هر میلی‌ثانیه تأخیر میانه (p50)
+RANK_JITTER_WEIGHT = 0.02 # جریمه هر میلی‌ثانیه نوسان (p90 - p50)
+PROBE_CACHE_FILE = "probe_cache.sqlite3" # کش نتایج بررسی endpointها بین اجراها ("" برای غیرفعال کردن)
+PROBE_CACHE_SUCCESS_TTL = 3600 # مدت اعتبار نتیجه موفق (ثانیه)
+PROBE_CACHE_FAILURE_TTL = 900 # مدت اعتبار نتیجه ناموفق (ثانیه)
+DNS_CACHE_FILE = "dns_cache.json" # کش نتایج DNS (شامل نتایج منفی) بین اجراها
+DNS_POSITIVE_TTL = 3600 # مدت اعتبار نام‌های resolve شده (ثانیه)
+DNS_NEGATIVE_TTL = 600 # مدت اعتبار نام‌هایی که resolve نشدند (ثانیه)
+DNS_WORKERS = 64 # تعداد resolveهای هم‌زمان
+CORE_BINARY = "xray" # مسیر فایل اجرایی هسته پراکسی برای بررسی رفت‌وبرگشت واقعی
+CORE_WORKERS = 4 # تعداد پردازه‌های هم‌زمان هسته
+CORE_BATCH_SIZE = 32 # تعداد outboundهایی که هر پردازه هسته در یک دسته بارگذاری می‌کند
+CORE_START_TIMEOUT = 10 # مهلت آماده شدن پردازه هسته پس از راه‌اندازی (ثانیه)
+CORE_API_TIMEOUT = 10 # مهلت هر فرمان API هسته برای جایگزینی outboundهای یک دسته (ثانیه)
+ROUNDTRIP_URL = "https://www.gstatic.com/generate_204" # آدرسی که درخواست رفت‌وبرگشت از طریق پراکسی به آن ارسال می‌شود
+ROUNDTRIP_TIMEOUT = 10 # مهلت هر درخواست رفت‌وبرگشت (ثانیه)
+ROUNDTRIP_CONCURRENCY = 8 # سقف درخواست‌های هم‌زمان در هر دسته
+SPEEDTEST_URL = "https://speed.cloudflare.com/__down?bytes=2000000" # آدرس فایل با حجم ثابت برای تست سرعت
+SPEEDTEST_MAX_BYTES = 2_000_000 # حداکثر حجم دانلود در هر تست سرعت (بایت)
+SPEEDTEST_TIMEOUT = 20 # مهلت هر تست سرعت (ثانیه)
+SPEEDTEST_CONCURRENCY = 2 # سقف کل تست‌های سرعت هم‌زمان تا پهنای باند بین آن‌ها تقسیم نشود
+CONFIG_STORE_FILE = "config_store.sqlite3" # مخزن پایدار کانفیگ‌ها و امتیازهایشان برای اجرای افزایشی
+SEEN_SET_FILE = "seen_configs.bin" # نمایه فشرده digest کانفیگ‌های دیده‌شده و امتیازشان در اجرای افزایشی
+SEEN_SET_LOAD_FACTOR = 0.7 # حداکثر نسبت پر بودن جدول digestها پیش از دو برابر شدن
+SCORING_VERSION = 1 # با هر تغییر در قواعد امتیازدهی افزایش یابد تا امتیازهای ذخیره‌شده دوباره محاسبه شوند
+
+# --- آمار اجرا ---
+RUN_STATS = Counter()
+_stats_lock = threading.Lock()
+
+def _count(key: str, amount: int = 1):
+    """یک شمارنده آمار اجرا را به صورت thread-safe افزایش می‌دهد."""
+    with _stats_lock:
+        RUN_STATS[key] += amount
+
+def log_run_summary():
+    """خلاصه آمار اجرا را در لاگ می‌نویسد."""
+    requests_sent = RUN_STATS['http_requests']
+    opened = RUN_STATS['connections_opened']
+    logging.info(
+        f"خلاصه اجرا: {requests_sent} درخواست HTTP، "
+        f"{opened} اتصال جدید، {max(0, requests_sent - opened)} استفاده مجدد از اتصال."
+    )
+    logging.info(
+        f"کش منابع: {RUN_STATS['cache_hits']} برخورد، {RUN_STATS['cache_misses']} عدم برخورد، "
+        f"{RUN_STATS['cache_bytes_saved']} بایت صرفه‌جویی."
+    )
+    if RUN_STATS['configs_received']:
+        # در اجرای افزایشی مجموعه کانفیگ‌های منحصر به فرد ساخته نمی‌شود
+        logging.info(f"کانفیگ‌های دریافت‌شده (با تکرار): {RUN_STATS['configs_received']}")
+    else:
+        protocols = [f"{protocol}={RUN_STATS[f'protocol:{protocol}']}" for protocol in SUPPORTED_PROTOCOLS]
+        logging.info(f"کانفیگ‌های منحصر به فرد به تفکیک پروتکل: {', '.join(protocols)}")
+    if RUN_STATS['probes_sent']:
+        logging.info(
+            f"بررسی دسترس‌پذیری: {RUN_STATS['probes_sent']} بررسی، {RUN_STATS['probes_ok']} موفق، "
+            f"{RUN_STATS['probes_failed']} ناموفق، {RUN_STATS['probes_expired']} بدون نتیجه تا پایان مهلت کل، "
+            f"{RUN_STATS['probes_skipped']} endpoint به دلیل رسیدن به هدف یا پایان مهلت بررسی نشد."
+        )
+        logging.info(
+            f"گروه‌بندی endpointها: {RUN_STATS['probed_configs']} کانفیگ با {RUN_STATS['probes_sent']} بررسی "
+            f"(ضریب کاهش {RUN_STATS['probed_configs'] / RUN_STATS['probes_sent']:.1f})"
+        )
+    alpn = [f"{key.partition(':')[2]}={count}" for key, count in sorted(RUN_STATS.items()) if key.startswith('alpn:')]
+    if alpn or RUN_STATS['probes_cert_invalid']:
+        logging.info(
+            f"بررسی TLS: {RUN_STATS['probes_cert_invalid']} گواهی نامعتبر، ALPN: {', '.join(alpn) or '-'}"
+        )
+    statuses = [f"{key.partition(':')[2]}={count}" for key, count in sorted(RUN_STATS.items()) if key.startswith('status:')]
+    if statuses:
+        logging.info(f"کدهای پاسخ بررسی transport: {', '.join(statuses)}")
+    if RUN_STATS['probes_sent'] or RUN_STATS['probe_cache_hits']:
+        logging.info(
+            f"کش بررسی‌ها: {RUN_STATS['probe_cache_hits']} endpoint از کش، "
+            f"{RUN_STATS['probes_sent']} endpoint جدید یا منقضی بررسی شد."
+        )
+    if RUN_STATS['dns_lookups'] or RUN_STATS['dns_cache_hits']:
+        lookups, hits = RUN_STATS['dns_lookups'], RUN_STATS['dns_cache_hits']
+        average = RUN_STATS['dns_lookup_ms'] / lookups if lookups else 0
+        logging.info(
+            f"DNS: {lookups} جست‌وجو (میانگین {average:.0f} میلی‌ثانیه)، {hits} برخورد کش "
+            f"(نرخ {hits / (lookups + hits):.0%})، {RUN_STATS['dns_unresolved']} نام resolve نشد."
+        )
+    if RUN_STATS['roundtrip_ok'] or RUN_STATS['roundtrip_failed']:
+        logging.info(
+            f"بررسی رفت‌وبرگشت: {RUN_STATS['roundtrip_ok']} موفق، {RUN_STATS['roundtrip_failed']} ناموفق، "
+            f"{RUN_STATS['roundtrip_unmeasured']} بدون اندازه‌گیری (حفظ شدند)، "
+            f"{RUN_STATS['core_batches']} دسته در {RUN_STATS['core_starts']} راه‌اندازی هسته "
+            f"({RUN_STATS['core_failures']} خطای هسته)."
+        )
+    if RUN_STATS['speedtest_ok'] or RUN_STATS['speedtest_failed']:
+        logging.info(
+            f"تست سرعت: {RUN_STATS['speedtest_ok']} موفق، {RUN_STATS['speedtest_failed']} ناموفق، "
+            f"{RUN_STATS['speedtest_unmeasured']} بدون اندازه‌گیری، "
+            f"{RUN_STATS['speedtest_bytes'] / 1_000_000:.1f} مگابایت دانلود."
+        )
+    if RUN_STATS['store_known'] or RUN_STATS['store_new']:
+        logging.info(
+            f"مخزن کانفیگ‌ها: {RUN_STATS['store_new']} کانفیگ جدید امتیازدهی شد، {RUN_STATS['store_known']} از مخزن، "
+            f"{RUN_STATS['store_gone']} کانفیگ دیگر در منابع نیست."
+        )
+    rejections = [f"{key.partition(':')[2]}={count}" for key, count in sorted(RUN_STATS.items()) if key.startswith('reject:')]
+    if rejections:
+        logging.info(f"دلایل رد شدن کانفیگ‌ها: {', '.join(rejections)}")
 
 def decode_base64_content(encoded_content: str) -> str:
-    """محتوای Base64 را با مدیریت خطای padding دیکود می‌کند."""
+    """محتوای Base64 (استاندارد یا URL-safe) را با مدیریت خطای padding دیکود می‌کند."""
     try:
-        padded_content = encoded_content + '=' * (-len(encoded_content) % 4)
-        return base64.b64decode(padded_content).decode('utf-8')
-    except Exception:
+        return _decode_base64_bytes(encoded_content.encode('ascii', 'ignore')).decode('utf-8', 'ignore')
+    except binascii.Error:
         return ""
 
-def get_configs_from_sources(source_files: list) -> set:
-    """کانفیگ‌ها را از لیستی از URLها دریافت و یک مجموعه (set) از کانفیگ‌های منحصر به فرد برمی‌گرداند."""
-    all_configs = set()
-    for url in source_files:
+# --- لایه HTTP با استخر اتصال‌های keep-alive ---
+class _CountingHTTPConnectionPool(HTTPConnectionPool):
+    def _new_conn(self):
+        _count('connections_opened')
+        return super()._new_conn()
+
+class _CountingHTTPSConnectionPool(HTTPSConnectionPool):
+    def _new_conn(self):
+        _count('connections_opened')
+        return super()._new_conn()
+
+class _PooledAdapter(HTTPAdapter):
+    """آداپتوری که اتصال‌های هر میزبان را نگه می‌دارد و باز شدن اتصال‌های جدید را می‌شمارد."""
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _CountingHTTPConnectionPool,
+            'https': _CountingHTTPSConnectionPool,
+        }
+
+_session = None
+_session_lock = threading.Lock()
+
+def get_session() -> requests.Session:
+    """نشست مشترک HTTP را برمی‌گرداند تا همه دریافت‌ها از اتصال‌های باز دوباره استفاده کنند."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = _PooledAdapter(pool_connections=POOL_HOSTS, pool_maxsize=MAX_FETCHES_PER_HOST)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            session.headers.update({'Accept-Encoding': 'gzip, deflate', 'Connection': 'keep-alive'})
+            _session = session
+        return _session
+
+_host_semaphores = {}
+_host_semaphores_lock = threading.Lock()
+
+def _host_semaphore(url: str) -> threading.BoundedSemaphore:
+    """سمافور مخصوص میزبان یک URL را برمی‌گرداند (و در صورت نیاز می‌سازد)."""
+    host = urlparse(url).netloc.lower()
+    with _host_semaphores_lock:
+        semaphore = _host_semaphores.get(host)
+        if semaphore is None:
+            semaphore = threading.BoundedSemaphore(MAX_FETCHES_PER_HOST)
+            _host_semaphores[host] = semaphore
+        return semaphore
+
+# --- کش منابع (Conditional GET) ---
+def load_source_cache(path: str = SOURCE_CACHE_FILE) -> dict:
+    """کش منابع را از دیسک می‌خواند. کش ناسازگار یا خراب نادیده گرفته می‌شود."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(data, dict) or data.get('version') != SOURCE_CACHE_VERSION:
+        return {}
+    return data.get('sources', {})
+
+def _write_json_atomic(path: str, data) -> bool:
+    """داده را ابتدا در فایل موقت و سپس با جایگزینی اتمیک روی path می‌نویسد."""
+    tmp_path = path + '.tmp'
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+        return True
+    except OSError as e:
+        logging.warning(f"ذخیره فایل '{path}' ناموفق بود: {e}")
+        return False
+
+class _SourceCacheWriter:
+    """
+    کش منابع را رکورد به رکورد در فایل موقت می‌نویسد و در commit به صورت اتمیک جایگزین
+    می‌کند، تا کانفیگ‌های هر منبع پس از پردازش تا پایان اجرا در حافظه نمانند.
+    """
+    def __init__(self, path: str = SOURCE_CACHE_FILE):
+        self.path = path
+        self._tmp_path = path + '.tmp'
+        self._separator = ''
+        try:
+            self._file = open(self._tmp_path, 'w', encoding='utf-8')
+            self._file.write(f'{{"version": {SOURCE_CACHE_VERSION}, "sources": {{')
+        except OSError as e:
+            logging.warning(f"ذخیره فایل '{path}' ناموفق بود: {e}")
+            self._file = None
+
+    def write(self, url: str, entry: dict):
+        if self._file is None:
+            return
+        try:
+            self._file.write(f"{self._separator}{json.dumps(url)}: {json.dumps(entry)}")
+            self._separator = ', '
+        except OSError as e:
+            logging.warning(f"ذخیره فایل '{self.path}' ناموفق بود: {e}")
+            self.close()
+
+    def commit(self):
+        if self._file is None:
+            return
+        try:
+            self._file.write('}}')
+            self._file.close()
+            self._file = None
+            os.replace(self._tmp_path, self.path)
+        except OSError as e:
+            logging.warning(f"ذخیره فایل '{self.path}' ناموفق بود: {e}")
+            self.close()
+
+    def close(self):
+        """فایل موقتِ commit نشده را حذف می‌کند."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            try:
+                os.remove(self._tmp_path)
+            except OSError:
+                pass
+
+# --- موتور استخراج کانفیگ ---
+SUPPORTED_PROTOCOLS = ('vless', 'vmess', 'trojan', 'ssr', 'ss', 'hysteria2', 'tuic')
+# یک الگوی از پیش کامپایل‌شده برای همه پروتکل‌ها؛ گروه غیرگیرنده باعث می‌شود کل URI برگردانده شود.
+# \b مانع از تطبیق اشتباه ss:// در انتهای vmess:// می‌شود.
+CONFIG_PATTERN = re.compile(r'\b(?:' + '|'.join(SUPPORTED_PROTOCOLS) + r')://[^\s\'"<>]+')
+CONFIG_PATTERN_BYTES = re.compile(CONFIG_PATTERN.pattern.encode())
+# تا آخرین جداکننده؛ .* حریصانه از انتهای متن عقب می‌آید، پس هزینه به فاصله آخرین جداکننده تا انتها بستگی دارد
+_UNTIL_LAST_DELIMITER = re.compile(r'.*[\s\'"<>]', re.DOTALL)
+_UNTIL_LAST_DELIMITER_BYTES = re.compile(_UNTIL_LAST_DELIMITER.pattern.encode(), re.DOTALL)
+_BASE64_ALPHABET = frozenset(b'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/=-_ \t\r\n')
+_BASE64_JUNK = re.compile(rb'[^A-Za-z0-9+/=]')
+_BASE64_URLSAFE = bytes.maketrans(b'-_', b'+/')
+
+def _normalize_base64(data: bytes) -> bytes:
+    """
+    Base64 نسخه URL-safe را به الفبای استاندارد برمی‌گرداند و کاراکترهای خارج از الفبا (مثل
+    فاصله و خط جدید) را حذف می‌کند. هر سه مسیر استخراج (متنی، بایتی و جریانی) از همین تابع
+    استفاده می‌کنند تا خروجی به حالت دریافت بستگی نداشته باشد.
+    """
+    return _BASE64_JUNK.sub(b'', data.translate(_BASE64_URLSAFE))
+
+def _decode_base64_bytes(data: bytes) -> bytes:
+    """داده Base64 را پس از _normalize_base64 و تکمیل padding دیکود می‌کند؛ در صورت خطا binascii.Error می‌دهد."""
+    data = _normalize_base64(data)
+    if len(data) % 4 == 1:
+        # یک نویسه تنها هیچ بایتی را کد نمی‌کند؛ حالت جریانی هم آن را کنار می‌گذارد
+        data = data[:-1]
+    return binascii.a2b_base64(data + b'=' * (-len(data) % 4))
+_MODE_DETECT_BYTES = 4096 # حجمی از ابتدای پاسخ که برای تشخیص متنی/Base64 بودن بررسی می‌شود
+_MAX_TEXT_CARRY = 1024 * 1024 # سقف متن نگه‌داشته‌شده بین دو تکه وقتی هیچ جداکننده‌ای پیدا نشود
+
+def extract_configs(content: str) -> list:
+    """کانفیگ‌ها را از محتوای یک منبع (متنی یا Base64) استخراج می‌کند."""
+    if "://" not in content:
+        content = decode_base64_content(content)
+
+    # استفاده از findall برای استخراج تمام کانفیگ‌ها، حتی اگر به هم چسبیده باشند
+    return CONFIG_PATTERN.findall(content)
+
+def extract_configs_bytes(content: bytes) -> list:
+    """
+    نسخه بایتی extract_configs: محتوا بدون تبدیل به str پیمایش می‌شود و فقط
+    کانفیگ‌های پیدا شده دیکود می‌شوند. این کار از ساختن رشته‌های بزرگ میانی جلوگیری می‌کند.
+    """
+    if b"://" not in content:
+        try:
+            content = _decode_base64_bytes(content)
+        except binascii.Error:
+            return []
+    return [match.decode('utf-8', 'ignore') for match in CONFIG_PATTERN_BYTES.findall(content)]
+
+def count_protocols(configs) -> Counter:
+    """تعداد کانفیگ‌های هر پروتکل را برمی‌گرداند."""
+    return Counter(config.partition('://')[0] for config in configs)
+
+class StreamingExtractor:
+    """
+    کانفیگ‌ها را از بدنه پاسخ به صورت تکه به تکه استخراج می‌کند. Base64 به صورت
+    افزایشی دیکود می‌شود (کاراکترهای باقی‌مانده از یک گروه چهارتایی به تکه بعد منتقل
+    می‌شوند) و متن بعد از آخرین جداکننده نگه داشته می‌شود تا کانفیگ‌هایی که بین دو
+    تکه شکسته شده‌اند از دست نروند. مصرف حافظه متناسب با اندازه تکه است، نه حجم منبع.
+    با raw_bytes=True پیمایش روی بایت‌ها انجام می‌شود و فقط کانفیگ‌های پیدا شده دیکود می‌شوند.
+    """
+    def __init__(self, raw_bytes: bool = False):
+        self.configs = []
+        self._raw_bytes = raw_bytes
+        self._pattern = CONFIG_PATTERN_BYTES if raw_bytes else CONFIG_PATTERN
+        self._until_last_delimiter = _UNTIL_LAST_DELIMITER_BYTES if raw_bytes else _UNTIL_LAST_DELIMITER
+        self._base64 = None # تا زمان تشخیص نوع محتوا None است
+        self._head = b''
+        self._base64_carry = b''
+        self._text_carry = b'' if raw_bytes else ''
+        self._decoder = codecs.getincrementaldecoder('utf-8')(errors='ignore')
+
+    def feed(self, chunk: bytes):
+        if self._base64 is None:
+            self._head += chunk
+            if len(self._head) < _MODE_DETECT_BYTES:
+                return
+            self._detect_mode()
+            chunk, self._head = self._head, b''
+        self._feed_bytes(chunk)
+
+    def close(self) -> list:
+        if self._base64 is None:
+            self._detect_mode()
+            self._feed_bytes(self._head)
+            self._head = b''
+        if self._base64 and self._base64_carry:
+            padded = self._base64_carry + b'=' * (-len(self._base64_carry) % 4)
+            self._base64_carry = b''
+            self._feed_text(self._decode_base64(padded))
+        self._feed_text(self._decode_text(b'', final=True))
+        self._scan(self._text_carry)
+        self._text_carry = self._text_carry[:0]
+        return self.configs
+
+    def _detect_mode(self):
+        # محتوای متنی حتماً کاراکترهایی خارج از الفبای Base64 (مثل ':') دارد
+        self._base64 = all(byte in _BASE64_ALPHABET for byte in self._head)
+
+    def _feed_bytes(self, chunk: bytes):
+        if not self._base64:
+            self._feed_text(self._decode_text(chunk))
+            return
+        data = self._base64_carry + _normalize_base64(chunk)
+        complete = len(data) - len(data) % 4
+        self._base64_carry = data[complete:]
+        if complete:
+            self._feed_text(self._decode_base64(data[:complete]))
+
+    def _decode_base64(self, data: bytes) -> str:
         try:
-            logging.info(f"در حال دریافت از منبع: {url[:70]}...")
-            response = requests.get(url, timeout=REQUEST_TIMEOUT)
+            return self._decode_text(binascii.a2b_base64(data))
+        except binascii.Error:
+            return self._text_carry[:0]
+
+    def _decode_text(self, data: bytes, final: bool = False):
+        if self._raw_bytes:
+            return data
+        return self._decoder.decode(data, final=final)
+
+    def _feed_text(self, text):
+        text = self._text_carry + text
+        last_delimiter = self._until_last_delimiter.match(text)
+        if last_delimiter is None and len(text) <= _MAX_TEXT_CARRY:
+            self._text_carry = text
+            return
+        cut = last_delimiter.end() if last_delimiter else len(text)
+        self._scan(text[:cut])
+        self._text_carry = text[cut:]
+
+    def _scan(self, text):
+        if not text:
+            return
+        if self._raw_bytes:
+            self.configs.extend(match.decode('utf-8', 'ignore') for match in self._pattern.findall(text))
+        else:
+            self.configs.extend(self._pattern.findall(text))
+
+def _fetch_source(url: str, cached: dict = None, stream: bool = STREAM_DOWNLOADS,
+                  raw_bytes: bool = BYTES_EXTRACTION) -> tuple:
+    """
+    یک منبع را با رعایت سقف درخواست‌های هم‌زمان هر میزبان دریافت می‌کند و
+    (کانفیگ‌ها، رکورد جدید کش) را برمی‌گرداند. اگر منبع تغییری نکرده باشد
+    (پاسخ 304 یا هش یکسان)، کانفیگ‌های کش‌شده بدون دیکود و استخراج دوباره استفاده می‌شوند.
+    با stream=True بدنه تکه به تکه دریافت و استخراج می‌شود (StreamingExtractor) و با raw_bytes=True
+    استخراج روی بایت‌ها انجام می‌شود. بدنه همیشه UTF-8 فرض می‌شود تا خروجی به حالت استخراج بستگی نداشته باشد.
+    """
+    headers = {}
+    if cached:
+        if cached.get('etag'):
+            headers['If-None-Match'] = cached['etag']
+        if cached.get('last_modified'):
+            headers['If-Modified-Since'] = cached['last_modified']
+
+    with _host_semaphore(url):
+        logging.info(f"در حال دریافت از منبع: {url[:70]}...")
+        _count('http_requests')
+        with get_session().get(url, headers=headers, timeout=REQUEST_TIMEOUT, stream=True) as response:
+            if cached and response.status_code == 304:
+                _count('cache_hits')
+                _count('cache_bytes_saved', cached.get('size', 0))
+                return cached['configs'], cached
             response.raise_for_status()
-            content = response.text
-            
-            if "vmess://" not in content and "vless://" not in content:
-                content = decode_base64_content(content)
-            
-            # استفاده از findall برای استخراج تمام کانفیگ‌ها، حتی اگر به هم چسبیده باشند
-            found = re.findall(r'(vless|vmess)://[^\s\'"<>]+', content)
-            for config in found:
-                all_configs.add(config)
-        except requests.RequestException as e:
-            logging.error(f"خطا در دریافت اطلاعات از {url}: {e}")
+
+            if stream:
+                # در حالت جریانی هش تنها پس از استخراج معلوم می‌شود، پس فقط 304 از استخراج جلوگیری می‌کند
+                _count('cache_misses')
+                hasher = hashlib.sha256()
+                extractor = StreamingExtractor(raw_bytes=raw_bytes)
+                size = 0
+                for chunk in response.iter_content(chunk_size=STREAM_CHUNK_SIZE):
+                    hasher.update(chunk)
+                    extractor.feed(chunk)
+                    size += len(chunk)
+                configs = extractor.close()
+                digest = hasher.hexdigest()
+            else:
+                body = response.content
+                size = len(body)
+                digest = hashlib.sha256(body).hexdigest()
+                if cached and cached.get('sha256') == digest:
+                    _count('cache_hits')
+                    configs = cached['configs']
+                else:
+                    _count('cache_misses')
+                    configs = extract_configs_bytes(body) if raw_bytes else extract_configs(body.decode('utf-8', 'ignore'))
+
+    entry = {
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified'),
+        'sha256': digest,
+        'size': size,
+        'configs': configs,
+    }
+    return configs, entry
+
+def fetch_sources(urls: list, cache: dict = None, max_workers: int = MAX_CONCURRENT_FETCHES,
+                  stream: bool = STREAM_DOWNLOADS, raw_bytes: bool = BYTES_EXTRACTION):
+    """
+    منابع را به صورت هم‌زمان دریافت می‌کند و نتیجه هر منبع را به محض آماده شدن
+    به صورت (url, configs, cache_entry) برمی‌گرداند تا پردازش منتظر کندترین منبع نماند.
+    """
+    if not urls:
+        return
+    cache = cache or {}
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(urls)))) as executor:
+        futures = {executor.submit(_fetch_source, url, cache.get(url), stream, raw_bytes): url for url in urls}
+        for future in as_completed(futures):
+            # future از futures حذف می‌شود تا نتیجه‌اش پس از پردازش در حافظه نماند
+            url = futures.pop(future)
+            try:
+                configs, entry = future.result()
+                yield url, configs, entry
+            except requests.RequestException as e:
+                logging.error(f"خطا در دریافت اطلاعات از {url}: {e}")
+
+def iter_source_configs(source_files: list, stream: bool = STREAM_DOWNLOADS, raw_bytes: bool = BYTES_EXTRACTION):
+    """
+    (url, configs) هر منبع را به محض دریافت برمی‌گرداند و کش منابع را هم‌زمان روی دیسک
+    می‌نویسد؛ رکورد هر منبع پس از پردازش از حافظه آزاد می‌شود. کش فقط وقتی ذخیره می‌شود
+    که پیمایش تا انتها انجام شود.
+    """
+    old_cache = load_source_cache()
+    writer = _SourceCacheWriter()
+    fetched = set()
+    try:
+        for url, configs, entry in fetch_sources(source_files, old_cache, stream=stream, raw_bytes=raw_bytes):
+            old_cache.pop(url, None)
+            fetched.add(url)
+            writer.write(url, entry)
+            yield url, configs
+        # منابعی که این بار دریافت نشدند، رکورد قبلی خود را حفظ می‌کنند
+        for url in source_files:
+            if url not in fetched and url in old_cache:
+                writer.write(url, old_cache[url])
+        writer.commit()
+    finally:
+        writer.close()
+
+def get_configs_from_sources(source_files: list, stream: bool = STREAM_DOWNLOADS,
+                             raw_bytes: bool = BYTES_EXTRACTION) -> set:
+    """کانفیگ‌ها را از لیستی از URLها دریافت و یک مجموعه (set) از کانفیگ‌های منحصر به فرد برمی‌گرداند."""
+    all_configs = set()
+    for _, configs in iter_source_configs(source_files, stream, raw_bytes):
+        all_configs.update(configs)
+    for protocol, count in count_protocols(all_configs).most_common():
+        _count(f'protocol:{protocol}', count)
     return all_configs
 
-def score_and_filter_config(config: str) -> int:
+# --- پارسر لینک‌های اشتراک‌گذاری ---
+class ShareLink:
+    """
+    نمایش فشرده یک لینک اشتراک‌گذاری (مثل vless://uuid@host:port?query#remark).
+    params برای هر کلید فقط اولین مقدار غیرخالی را به صورت رشته نگه می‌دارد.
+    """
+    __slots__ = ('scheme', 'uuid', 'host', 'port', 'params', 'fragment')
+
+    def __init__(self, scheme, uuid, host, port, params, fragment):
+        self.scheme = scheme
+        self.uuid = uuid
+        self.host = host
+        self.port = port
+        self.params = params
+        self.fragment = fragment
+
+    def __repr__(self):
+        return f"ShareLink({self.scheme}://{self.uuid}@{self.host}:{self.port})"
+
+def _unquote_query(value: str) -> str:
+    if '+' in value:
+        value = value.replace('+', ' ')
+    return unquote(value) if '%' in value else value
+
+def parse_share_link(config: str) -> ShareLink:
+    """
+    یک لینک اشتراک‌گذاری را در یک گذر پارس می‌کند؛ جایگزین سبک urlparse + parse_qs
+    با همان رفتار (hostname با حروف کوچک، IPv6 داخل [] و decode کردن percent-encoding).
+    برای لینک نامعتبر None برمی‌گرداند.
+    """
+    scheme, sep, rest = config.partition('://')
+    if not sep or not scheme:
+        return None
+    rest, _, fragment = rest.partition('#')
+    rest, _, query = rest.partition('?')
+    end = rest.find('/')
+    netloc = rest if end < 0 else rest[:end]
+
+    userinfo, _, hostinfo = netloc.rpartition('@')
+    if '[' in hostinfo:
+        before, _, bracketed = hostinfo.partition('[')
+        host, closed, port = bracketed.partition(']')
+        if before or not closed or ']' in port:
+            return None
+        _, _, port = port.partition(':')
+    elif ']' in hostinfo:
+        return None
+    else:
+        host, _, port = hostinfo.partition(':')
+
+    if port:
+        if not (port.isdigit() and port.isascii()):
+            return None
+        port = int(port)
+        if port > 65535:
+            return None
+    else:
+        port = None
+
+    params = {}
+    if query:
+        for field in query.split('&'):
+            key, has_value, value = field.partition('=')
+            if not has_value or not value:
+                continue
+            key = _unquote_query(key)
+            if key not in params:
+                params[key] = _unquote_query(value)
+
+    return ShareLink(
+        scheme.lower(),
+        unquote(userinfo) if '%' in userinfo else userinfo,
+        host.lower() or None,
+        port,
+        params,
+        unquote(fragment) if '%' in fragment else fragment,
+    )
+
+# --- اثر انگشت کانونیکال کانفیگ ---
+_UUID_PATTERN = re.compile(r'[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}')
+
+def canonical_fingerprint(link: ShareLink) -> tuple:
+    """
+    بخش‌هایی از لینک که سرور و مسیر اتصال را تعیین می‌کنند:
+    (scheme, uuid, host, port, transport, path یا serviceName, request_host, sni, security).
+    request_host هدر Host درخواست WebSocket (یا authority در gRPC) است که پشت CDN سرور را
+    مشخص می‌کند. remark و ترتیب و باقی پارامترهای query در آن اثری ندارند. کلید گروه‌بندی
+    بررسی‌ها (_probe_key) هم از همین تابع ساخته می‌شود.
+    """
+    params = link.params
+    uuid = link.uuid.lower() if _UUID_PATTERN.fullmatch(link.uuid) else link.uuid
+    host = link.host.rstrip('.')
+    transport = params.get('type', 'tcp').lower()
+    if transport == 'grpc':
+        path = params.get('serviceName', '').strip('/')
+    else:
+        path = params.get('path', '/')
+        if not path.startswith('/'):
+            path = '/' + path
+    sni = (params.get('sni') or params.get('host') or host).lower().rstrip('.')
+    request_host = (params.get('host') or sni).lower().rstrip('.')
+    return (link.scheme, uuid, host, link.port, transport, path, request_host, sni,
+            params.get('security', 'none').lower())
+
+def config_fingerprint(config: str) -> str:
+    """
+    شکل متنی اثر انگشت کانونیکال برای حذف تکراری‌ها، مثل
+    vless://uuid@host:443?host=cdn&path=%2Fws&security=tls&sni=cdn&type=ws؛ پارامترها به ترتیب الفبا
+    و با percent-encoding یکسان نوشته می‌شوند. لینک‌های بدون UUID یا host (مثل vmess با
+    محتوای base64) به همان شکل ورودی بدون remark برگردانده می‌شوند.
+    """
+    link = parse_share_link(config)
+    if link is None or not link.uuid or not link.host:
+        return config.split('#', 1)[0].strip()
+    return _link_fingerprint(link)
+
+def _link_fingerprint(link: ShareLink) -> str:
+    scheme, uuid, host, port, transport, path, request_host, sni, security = canonical_fingerprint(link)
+    if ':' in host:
+        host = f"[{host}]"
+    return (f"{scheme}://{quote(uuid, safe='')}@{host}:{port if port is not None else ''}"
+            f"?host={quote(request_host, safe='')}&path={quote(path, safe='')}&security={quote(security, safe='')}"
+            f"&sni={quote(sni, safe='')}&type={quote(transport, safe='')}")
+
+# --- امتیازدهی ---
+_IPV4_PATTERN = re.compile(r'^\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}$')
+_DDNS_SUFFIXES = ('.ddns.net', '.xyz', '.pw')
+
+def _prefilter_reject_reason(config: str) -> str:
+    """
+    بررسی سریع روی رشته خام، بدون ساختن urlparse/parse_qs. فقط کانفیگ‌هایی را رد
+    می‌کند که بررسی کامل هم قطعاً ردشان می‌کرد؛ در غیر این صورت None برمی‌گرداند.
+    """
+    if not config.startswith("vless://"):
+        return 'not_vless'
+    end = config.find('#')
+    if end < 0:
+        end = len(config)
+    start = config.find('?', 0, end)
+    if start < 0:
+        return 'not_tls'
+    # پارامترهای percent-encoded فقط با parser کامل درست خوانده می‌شوند
+    if config.find('%', start, end) >= 0:
+        return None
+    if config.find('security=tls', start, end) < 0:
+        return 'not_tls'
+    if config.find('type=ws', start, end) < 0 and config.find('type=grpc', start, end) < 0:
+        return 'bad_transport'
+    return None
+
+def score_and_filter_config(config: str, rejections: Counter = None) -> int:
     """
     به هر کانفیگ بر اساس کیفیت آن امتیازی می‌دهد. امتیاز 0 به معنی رد شدن است.
+    اگر rejections داده شود، دلیل رد شدن هر کانفیگ در آن شمرده می‌شود.
+    """
+    reason = _prefilter_reject_reason(config)
+    if reason is None:
+        score, reason = _score_parsed_config(config)
+        if score:
+            return score
+    if rejections is not None:
+        rejections[reason] += 1
+    return 0
+
+def _score_parsed_config(config: str) -> tuple:
+    """بررسی و امتیازدهی کامل یک کانفیگ؛ (امتیاز، دلیل رد شدن) را برمی‌گرداند."""
+    link = parse_share_link(config)
+    if link is None:
+        return 0, 'malformed'
+    return score_share_link(link)
+
+def score_share_link(link: ShareLink) -> tuple:
+    """امتیازدهی یک لینک پارس‌شده؛ (امتیاز، دلیل رد شدن) را برمی‌گرداند."""
+    params = link.params
+
+    # --- بررسی‌های اصلی برای رد کردن کانفیگ ---
+    if params.get('security', '') != 'tls':
+        return 0, 'not_tls'
+
+    transport = params.get('type', '')
+    if transport not in ['ws', 'grpc']:
+        return 0, 'bad_transport'
+
+    # برای gRPC، باید serviceName وجود داشته باشد
+    if transport == 'grpc' and not params.get('serviceName'):
+        return 0, 'grpc_without_service'
+
+    # برای ws، باید host وجود داشته باشد
+    if transport == 'ws' and not params.get('host'):
+        return 0, 'ws_without_host'
+
+    # --- شروع امتیازدهی ---
+    score = 10 # امتیاز پایه برای پاس کردن فیلترهای اولیه
+
+    # امتیاز برای استفاده از پورت استاندارد
+    if link.port == 443:
+        score += 10
+
+    # امتیاز برای استفاده از دامنه تمیز (نه IP یا DDNS)
+    hostname = link.host
+    if hostname and not _IPV4_PATTERN.match(hostname):
+        if not any(ddns in hostname for ddns in _DDNS_SUFFIXES):
+            score += 20
+
+    # امتیاز برای داشتن SNI مناسب
+    if params.get('sni') or params.get('host'):
+        score += 5
+
+    return score, None
+
+# --- resolve کردن DNS ---
+def _is_ip_address(host: str) -> bool:
+    try:
+        ipaddress.ip_address(host)
+        return True
+    except ValueError:
+        return False
+
+def _lookup_host(host: str) -> tuple:
+    """یک نام را resolve می‌کند و (لیست آدرس‌ها، زمان صرف‌شده) را برمی‌گرداند."""
+    started = time.perf_counter()
+    try:
+        infos = socket.getaddrinfo(host, None, proto=socket.IPPROTO_TCP)
+        addresses = list(dict.fromkeys(info[4][0] for info in infos))
+    except (OSError, UnicodeError):
+        addresses = []
+    return addresses, time.perf_counter() - started
+
+def load_dns_cache(path: str = DNS_CACHE_FILE, now: float = None) -> dict:
+    """
+    کش DNS را از دیسک می‌خواند و فقط عناصر معتبر و منقضی‌نشده را برمی‌گرداند؛ کش خراب
+    (مثلاً لیست به جای دیکشنری) یا عناصر با شکل نادرست نادیده گرفته می‌شوند.
+    """
+    now = time.time() if now is None else now
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(data, dict):
+        return {}
+    cache = {}
+    for host, entry in data.items():
+        if not isinstance(entry, dict):
+            continue
+        expires, addresses = entry.get('expires'), entry.get('addresses')
+        if (isinstance(expires, (int, float)) and expires > now and isinstance(addresses, list)
+                and all(isinstance(address, str) for address in addresses)):
+            cache[host] = entry
+    return cache
+
+def resolve_hosts(hosts, cache_path: str = DNS_CACHE_FILE, now: float = None) -> dict:
+    """
+    نام‌ها را به صورت هم‌زمان resolve می‌کند و دیکشنری host -> اولین آدرس (یا None برای
+    نام‌های resolve نشده) برمی‌گرداند. هر نام فقط یک بار جست‌وجو می‌شود و نتایج مثبت و
+    منفی با TTL جداگانه روی دیسک کش می‌شوند. آدرس‌های IP بدون جست‌وجو برگردانده می‌شوند.
+    """
+    now = time.time() if now is None else now
+    cache = load_dns_cache(cache_path, now)
+
+    resolved = {}
+    pending = []
+    for host in dict.fromkeys(hosts):
+        if _is_ip_address(host):
+            resolved[host] = host
+        elif host in cache:
+            _count('dns_cache_hits')
+            addresses = cache[host]['addresses']
+            resolved[host] = addresses[0] if addresses else None
+        else:
+            pending.append(host)
+
+    if pending:
+        with ThreadPoolExecutor(max_workers=min(DNS_WORKERS, len(pending))) as executor:
+            for host, (addresses, elapsed) in zip(pending, executor.map(_lookup_host, pending)):
+                _count('dns_lookups')
+                _count('dns_lookup_ms', int(elapsed * 1000))
+                ttl = DNS_POSITIVE_TTL if addresses else DNS_NEGATIVE_TTL
+                cache[host] = {'addresses': addresses, 'expires': now + ttl}
+                resolved[host] = addresses[0] if addresses else None
+        _write_json_atomic(cache_path, cache)
+
+    _count('dns_unresolved', sum(1 for address in resolved.values() if address is None))
+    return resolved
+
+# --- بررسی دسترس‌پذیری (probe) ---
+class ProbeResult:
+    """نتیجه بررسی یک endpoint. زمان‌ها به ثانیه هستند."""
+    __slots__ = ('ok', 'connect_time', 'handshake_time', 'alpn', 'cert_valid', 'status', 'response_time',
+                 'error', 'samples')
+
+    def __init__(self, ok: bool, connect_time: float = None, handshake_time: float = None,
+                 alpn: str = None, cert_valid: bool = None, error: str = None):
+        self.ok = ok
+        self.connect_time = connect_time
+        self.handshake_time = handshake_time
+        self.alpn = alpn
+        self.cert_valid = cert_valid
+        self.status = None # کد وضعیت پاسخ در بررسی transport (مثلاً 101 برای WebSocket)
+        self.response_time = None # زمان از ارسال درخواست transport تا دریافت پاسخ
+        self.error = error
+        self.samples = array('d') # تأخیر نمونه‌های موفق (ثانیه)
+
+    @property
+    def latency(self) -> float:
+        """تأخیر یک نمونه: زمان handshake در بررسی TLS و در غیر این صورت زمان اتصال TCP."""
+        return self.handshake_time if self.handshake_time is not None else self.connect_time
+
+    def percentile(self, fraction: float) -> float:
+        """صدک fraction از تأخیر نمونه‌ها (روش nearest-rank)."""
+        if not self.samples:
+            return self.latency
+        ordered = sorted(self.samples)
+        return ordered[max(0, min(len(ordered) - 1, int(fraction * len(ordered) + 0.5) - 1))]
+
+    @property
+    def p50(self) -> float:
+        return self.percentile(0.5)
+
+    @property
+    def jitter(self) -> float:
+        """نوسان تأخیر: فاصله صدک 90 و میانه."""
+        return self.percentile(0.9) - self.percentile(0.5)
+
+@lru_cache(maxsize=None)
+def _tls_context(verify: bool, alpn: tuple) -> ssl.SSLContext:
+    context = ssl.create_default_context()
+    if not verify:
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+    context.set_alpn_protocols(list(alpn))
+    return context
+
+async def _close_writer(writer: asyncio.StreamWriter, timeout: float = 1):
+    """اتصال را می‌بندد؛ اگر طرف مقابل بستن TLS را تأیید نکند، اتصال قطع می‌شود."""
+    writer.close()
+    try:
+        await asyncio.wait_for(writer.wait_closed(), timeout)
+    except asyncio.TimeoutError:
+        writer.transport.abort()
+    except OSError:
+        pass
+
+def _probe_failure(error: Exception) -> ProbeResult:
+    if isinstance(error, asyncio.TimeoutError):
+        return ProbeResult(False, error='timeout')
+    return ProbeResult(False, error=type(error).__name__)
+
+async def _open_tcp(host: str, port: int, timeout: float) -> tuple:
+    """اتصال TCP باز می‌کند و (reader, writer, زمان اتصال) را برمی‌گرداند."""
+    started = time.perf_counter()
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    return reader, writer, time.perf_counter() - started
+
+async def _open_tls(host: str, port: int, sni: str, verify: bool, alpn: tuple, timeout: float) -> tuple:
+    """
+    اتصال TCP را باز و روی آن handshake TLS با SNI داده‌شده انجام می‌دهد؛
+    (reader, writer, زمان اتصال، زمان handshake، ALPN) را برمی‌گرداند.
+    """
+    reader, writer, connect_time = await _open_tcp(host, port, timeout)
+    try:
+        started = time.perf_counter()
+        await asyncio.wait_for(writer.start_tls(_tls_context(verify, alpn), server_hostname=sni), timeout)
+        handshake_time = time.perf_counter() - started
+    except BaseException:
+        # handshake نیمه‌کاره را نمی‌توان به آرامی بست
+        writer.transport.abort()
+        raise
+    negotiated = writer.get_extra_info('ssl_object').selected_alpn_protocol()
+    return reader, writer, connect_time, handshake_time, negotiated
+
+async def _connect_tls(host: str, port: int, sni: str, alpn: tuple, timeout: float) -> tuple:
+    """
+    اتصال TLS برقرار می‌کند و (reader, writer, ProbeResult) را برمی‌گرداند. اگر گواهی
+    معتبر نباشد، handshake بدون بررسی گواهی تکرار می‌شود و cert_valid=False ثبت می‌شود.
+    """
+    # SNI نامعتبر (مثل .bad.com یا برچسب بیش از 63 نویسه) پیش از باز کردن اتصال رد می‌شود؛
+    # ssl برای آن به جای OSError خطای ValueError/UnicodeError می‌دهد
+    try:
+        sni.encode('idna')
+    except UnicodeError:
+        raise ValueError(f"SNI نامعتبر: {sni!r}") from None
+    cert_valid = True
+    try:
+        reader, writer, connect_time, handshake_time, negotiated = await _open_tls(
+            host, port, sni, True, alpn, timeout)
+    except ssl.SSLCertVerificationError:
+        cert_valid = False
+        reader, writer, connect_time, handshake_time, negotiated = await _open_tls(
+            host, port, sni, False, alpn, timeout)
+    return reader, writer, ProbeResult(True, connect_time, handshake_time, negotiated, cert_valid)
+
+async def _probe_tcp(host: str, port: int, timeout: float) -> ProbeResult:
+    """یک اتصال TCP به host:port باز می‌کند و زمان اتصال را اندازه می‌گیرد."""
+    try:
+        _, writer, connect_time = await _open_tcp(host, port, timeout)
+    except (OSError, asyncio.TimeoutError) as e:
+        return _probe_failure(e)
+    await _close_writer(writer)
+    return ProbeResult(True, connect_time)
+
+async def _probe_tls(host: str, port: int, sni: str, timeout: float) -> ProbeResult:
+    """handshake TLS با SNI کانفیگ انجام می‌دهد."""
+    try:
+        _, writer, result = await _connect_tls(host, port, sni, tuple(PROBE_ALPN), timeout)
+    except ValueError:
+        return ProbeResult(False, error='bad_sni')
+    except (OSError, asyncio.TimeoutError) as e:
+        return _probe_failure(e)
+    await _close_writer(writer)
+    return result
+
+async def _websocket_upgrade(reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                             request_host: str, path: str, timeout: float) -> tuple:
+    """درخواست Upgrade به WebSocket را می‌فرستد و (کد وضعیت، زمان تا پاسخ) را برمی‌گرداند."""
+    key = base64.b64encode(os.urandom(16)).decode()
+    request = (
+        f"GET {path} HTTP/1.1\r\n"
+        f"Host: {request_host}\r\n"
+        "Upgrade: websocket\r\n"
+        "Connection: Upgrade\r\n"
+        f"Sec-WebSocket-Key: {key}\r\n"
+        "Sec-WebSocket-Version: 13\r\n"
+        "\r\n"
+    )
+    started = time.perf_counter()
+    writer.write(request.encode('utf-8'))
+    status_line = await asyncio.wait_for(reader.readline(), timeout)
+    elapsed = time.perf_counter() - started
+    parts = status_line.split(None, 2)
+    if len(parts) < 2 or not parts[0].startswith(b'HTTP/') or not parts[1].isdigit():
+        return None, elapsed
+    return int(parts[1]), elapsed
+
+async def _probe_ws(host: str, port: int, sni: str, request_host: str, path: str, timeout: float) -> ProbeResult:
+    """
+    روی TLS درخواست Upgrade به WebSocket با host و path کانفیگ می‌فرستد؛ فقط پاسخ
+    101 موفق حساب می‌شود و مسیرهای مرده (4xx/5xx) رد می‌شوند.
+    """
+    if any(char in request_host or char in path for char in '\r\n '):
+        return ProbeResult(False, error='bad_request')
+    try:
+        reader, writer, result = await _connect_tls(host, port, sni, ('http/1.1',), timeout)
+    except ValueError:
+        return ProbeResult(False, error='bad_sni')
+    except (OSError, asyncio.TimeoutError) as e:
+        return _probe_failure(e)
+    try:
+        result.status, result.response_time = await _websocket_upgrade(reader, writer, request_host, path, timeout)
+    except (OSError, asyncio.TimeoutError) as e:
+        result.ok, result.error = False, _probe_failure(e).error
+    finally:
+        await _close_writer(writer)
+    if result.ok and result.status != 101:
+        result.ok = False
+        result.error = f'http_{result.status}' if result.status else 'bad_response'
+    return result
+
+# --- بررسی HTTP/2 برای gRPC ---
+_H2_PREFACE = b'PRI * HTTP/2.0\r\n\r\nSM\r\n\r\n'
+_H2_DATA, _H2_HEADERS, _H2_RST_STREAM, _H2_SETTINGS, _H2_GOAWAY, _H2_CONTINUATION = 0x0, 0x1, 0x3, 0x4, 0x7, 0x9
+_H2_FLAG_END_STREAM, _H2_FLAG_ACK, _H2_FLAG_END_HEADERS, _H2_FLAG_PADDED, _H2_FLAG_PRIORITY = 0x1, 0x1, 0x4, 0x8, 0x20
+_H2_SETTINGS_ENABLE_PUSH = 0x2
+# جدول ایستای HPACK (RFC 7541، پیوست A)؛ اندیس 1 اولین عنصر است
+_HPACK_STATIC_TABLE = (
+    (':authority', ''), (':method', 'GET'), (':method', 'POST'), (':path', '/'), (':path', '/index.html'),
+    (':scheme', 'http'), (':scheme', 'https'), (':status', '200'), (':status', '204'), (':status', '206'),
+    (':status', '304'), (':status', '400'), (':status', '404'), (':status', '500'), ('accept-charset', ''),
+    ('accept-encoding', 'gzip, deflate'), ('accept-language', ''), ('accept-ranges', ''), ('accept', ''),
+    ('access-control-allow-origin', ''), ('age', ''), ('allow', ''), ('authorization', ''), ('cache-control', ''),
+    ('content-disposition', ''), ('content-encoding', ''), ('content-language', ''), ('content-length', ''),
+    ('content-location', ''), ('content-range', ''), ('content-type', ''), ('cookie', ''), ('date', ''),
+    ('etag', ''), ('expect', ''), ('expires', ''), ('from', ''), ('host', ''), ('if-match', ''),
+    ('if-modified-since', ''), ('if-none-match', ''), ('if-range', ''), ('if-unmodified-since', ''),
+    ('last-modified', ''), ('link', ''), ('location', ''), ('max-forwards', ''), ('proxy-authenticate', ''),
+    ('proxy-authorization', ''), ('range', ''), ('referer', ''), ('refresh', ''), ('retry-after', ''),
+    ('server', ''), ('set-cookie', ''), ('strict-transport-security', ''), ('transfer-encoding', ''),
+    ('user-agent', ''), ('vary', ''), ('via', ''), ('www-authenticate', ''),
+)
+# طول کد Huffman نمادهای 0 تا 255 و EOS (256) از RFC 7541، پیوست B. کد کانونیکال است،
+# پس خود کدها از روی طول‌ها ساخته می‌شوند
+_HPACK_HUFFMAN_LENGTHS = bytes.fromhex(
+    '0d171c1c1c1c1c1c1c181e1c1c1e1c1c1c1c1c1c1c1c1e1c1c1c1c1c1c1c1c1c060a0a0c0d06080b0a0a080b08060606'
+    '0505050606060606060607080f060c0a0d06070707070707070707070707070707070707070707070807080d130d0e06'
+    '0f05060506050606060507070606060506070605050607070707070f0b0e0d1c14161414161616171617171717171817'
+    '181816171817171717151617161717181615141616171715171616181516171715151615171617171416161617161617'
+    '1a1a1413161716191a1a1a1b1b1a181913151a1b1b1a1b1815151a1a1c1b1b1b14181415161515171616191918181a17'
+    '1a1b1a1a1b1b1b1b1b1c1b1b1b1b1b1a1e'
+)
+
+def _h2_frame(frame_type: int, flags: int, stream_id: int, payload: bytes = b'') -> bytes:
+    return len(payload).to_bytes(3, 'big') + bytes((frame_type, flags)) + stream_id.to_bytes(4, 'big') + payload
+
+def _hpack_int(value: int, prefix_bits: int, first_byte: int = 0) -> bytes:
+    limit = (1 << prefix_bits) - 1
+    if value < limit:
+        return bytes((first_byte | value,))
+    encoded = bytearray((first_byte | limit,))
+    value -= limit
+    while value >= 0x80:
+        encoded.append((value & 0x7f) | 0x80)
+        value >>= 7
+    encoded.append(value)
+    return bytes(encoded)
+
+def _hpack_string(value: str) -> bytes:
+    data = value.encode('utf-8')
+    return _hpack_int(len(data), 7) + data
+
+def _grpc_request_headers(authority: str, path: str) -> bytes:
+    """بلوک هدر HPACK (بدون Huffman و جدول پویا) برای یک درخواست gRPC."""
+    return b''.join((
+        b'\x83', # :method: POST
+        b'\x87', # :scheme: https
+        _hpack_int(4, 4) + _hpack_string(path), # :path
+        _hpack_int(1, 4) + _hpack_string(authority), # :authority
+        b'\x00' + _hpack_string('content-type') + _hpack_string('application/grpc'),
+        b'\x00' + _hpack_string('te') + _hpack_string('trailers'),
+    ))
+
+async def _read_h2_frame(reader: asyncio.StreamReader, timeout: float) -> tuple:
+    header = await asyncio.wait_for(reader.readexactly(9), timeout)
+    length = int.from_bytes(header[:3], 'big')
+    stream_id = int.from_bytes(header[5:9], 'big') & 0x7fffffff
+    payload = await asyncio.wait_for(reader.readexactly(length), timeout) if length else b''
+    return header[3], header[4], stream_id, payload
+
+@lru_cache(maxsize=None)
+def _hpack_huffman_codes() -> dict:
+    """(طول، کد) -> نماد؛ کدهای کانونیکال به ترتیب (طول، نماد) یکی‌یکی افزایش می‌یابند."""
+    codes = {}
+    code = previous = 0
+    for symbol in sorted(range(257), key=lambda symbol: (_HPACK_HUFFMAN_LENGTHS[symbol], symbol)):
+        length = _HPACK_HUFFMAN_LENGTHS[symbol]
+        if codes:
+            code = (code + 1) << (length - previous)
+        codes[length, code] = symbol
+        previous = length
+    return codes
+
+def _hpack_huffman_decode(data: bytes) -> bytes:
+    """رشته Huffman هدر را decode می‌کند؛ برای EOS یا padding نامعتبر ValueError می‌دهد."""
+    codes = _hpack_huffman_codes()
+    decoded = bytearray()
+    code = length = 0
+    for byte in data:
+        for shift in range(7, -1, -1):
+            code = (code << 1) | (byte >> shift) & 1
+            length += 1
+            symbol = codes.get((length, code))
+            if symbol is not None:
+                if symbol == 256:
+                    raise ValueError("EOS در رشته Huffman")
+                decoded.append(symbol)
+                code = length = 0
+    # padding حداکثر 7 بیت از ابتدای کد EOS (همه 1) است
+    if length > 7 or code != (1 << length) - 1:
+        raise ValueError("padding نامعتبر در رشته Huffman")
+    return bytes(decoded)
+
+def _hpack_read_int(data: bytes, offset: int, prefix_bits: int) -> tuple:
+    """عدد HPACK با پیشوند prefix_bits بیتی از data[offset] را می‌خواند؛ (مقدار، offset بعدی)."""
+    limit = (1 << prefix_bits) - 1
+    value = data[offset] & limit
+    offset += 1
+    if value < limit:
+        return value, offset
+    shift = 0
+    while True:
+        if offset >= len(data) or shift > 28:
+            raise ValueError("عدد HPACK ناقص یا بیش از حد بزرگ")
+        byte = data[offset]
+        offset += 1
+        value += (byte & 0x7f) << shift
+        shift += 7
+        if not byte & 0x80:
+            return value, offset
+
+def _hpack_read_string(data: bytes, offset: int) -> tuple:
+    """رشته HPACK (خام یا Huffman) از data[offset] را می‌خواند؛ (مقدار، offset بعدی)."""
+    if offset >= len(data):
+        raise ValueError("رشته HPACK ناقص")
+    huffman = data[offset] & 0x80
+    length, offset = _hpack_read_int(data, offset, 7)
+    end = offset + length
+    if end > len(data):
+        raise ValueError("رشته HPACK ناقص")
+    value = data[offset:end]
+    if huffman:
+        value = _hpack_huffman_decode(value)
+    return value.decode('latin-1'), end
+
+class _HpackDecoder:
+    """
+    رمزگشای بلوک‌های هدر HPACK یک اتصال HTTP/2 با جدول پویا. بلوک‌ها باید به ترتیب دریافت
+    decode شوند تا جدول با جدول فرستنده هم‌گام بماند؛ بلوک نامعتبر ValueError می‌دهد.
+    """
+    def __init__(self, max_size: int = 4096):
+        self._limit = self.max_size = max_size # سقف اعلام‌شده (SETTINGS_HEADER_TABLE_SIZE) و اندازه فعلی
+        self._table = deque() # جدیدترین عنصر در ابتدا
+        self._size = 0
+
+    def _entry(self, index: int) -> tuple:
+        if 0 < index <= len(_HPACK_STATIC_TABLE):
+            return _HPACK_STATIC_TABLE[index - 1]
+        position = index - len(_HPACK_STATIC_TABLE) - 1
+        if index == 0 or position >= len(self._table):
+            raise ValueError(f"اندیس HPACK نامعتبر: {index}")
+        return self._table[position]
+
+    def _evict(self):
+        while self._size > self.max_size:
+            name, value = self._table.pop()
+            self._size -= 32 + len(name) + len(value)
+
+    def decode(self, block: bytes) -> list:
+        """لیست (نام، مقدار) هدرهای یک بلوک کامل را برمی‌گرداند."""
+        headers = []
+        offset = 0
+        while offset < len(block):
+            first = block[offset]
+            if first & 0x80:
+                index, offset = _hpack_read_int(block, offset, 7)
+                headers.append(self._entry(index))
+            elif first & 0xe0 == 0x20:
+                size, offset = _hpack_read_int(block, offset, 5)
+                if size > self._limit:
+                    raise ValueError(f"اندازه جدول پویای HPACK بیش از سقف: {size}")
+                self.max_size = size
+                self._evict()
+            else:
+                indexing = first & 0x40
+                index, offset = _hpack_read_int(block, offset, 6 if indexing else 4)
+                if index:
+                    name = self._entry(index)[0]
+                else:
+                    name, offset = _hpack_read_string(block, offset)
+                value, offset = _hpack_read_string(block, offset)
+                headers.append((name, value))
+                if indexing:
+                    self._table.appendleft((name, value))
+                    self._size += 32 + len(name) + len(value)
+                    self._evict()
+        return headers
+
+def _h2_header_fragment(flags: int, payload: bytes) -> bytes:
+    """بخش بلوک هدر یک frame از نوع HEADERS، بدون padding و اولویت."""
+    start, end = 0, len(payload)
+    if flags & _H2_FLAG_PADDED:
+        if not payload:
+            raise ValueError("frame HEADERS ناقص")
+        start, end = 1, end - payload[0]
+    if flags & _H2_FLAG_PRIORITY:
+        start += 5
+    if start > end:
+        raise ValueError("padding frame HEADERS بیش از طول آن")
+    return payload[start:end]
+
+def _grpc_response_outcome(headers: list, end_stream: bool) -> tuple:
+    """
+    (کد :status، خطا) اولین بلوک هدر پاسخ gRPC؛ خطای None یعنی موفق. فقط :status 200 با
+    content-type از نوع application/grpc موفق است و در پاسخ trailers-only (END_STREAM روی
+    همین HEADERS) grpc-status هم باید 0 باشد. :status نامشخص هم ناموفق حساب می‌شود.
+    """
+    fields = dict(headers)
+    status = fields.get(':status', '')
+    if len(status) != 3 or not (status.isdigit() and status.isascii()):
+        return None, 'bad_status'
+    status = int(status)
+    if status != 200:
+        return status, f'http_{status}'
+    if not fields.get('content-type', '').startswith('application/grpc'):
+        return status, 'not_grpc'
+    if end_stream:
+        code = fields.get('grpc-status', '')
+        if code != '0':
+            return status, f'grpc_status_{code}' if code.isdigit() and code.isascii() else 'grpc_bad_status'
+    return status, None
+
+async def _grpc_request(reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                        authority: str, path: str, timeout: float) -> tuple:
+    """
+    preface اتصال HTTP/2 و یک درخواست gRPC به path را می‌فرستد و (کد :status، خطا، زمان تا
+    اولین frame) را برمی‌گرداند؛ خطای None یعنی پاسخ gRPC موفق (_grpc_response_outcome).
     """
+    started = time.perf_counter()
+    # push غیرفعال می‌شود تا بلوک هدر دیگری جز پاسخ استریم 1 جدول پویا را تغییر ندهد
+    settings = _H2_SETTINGS_ENABLE_PUSH.to_bytes(2, 'big') + (0).to_bytes(4, 'big')
+    writer.write(
+        _H2_PREFACE
+        + _h2_frame(_H2_SETTINGS, 0, 0, settings)
+        + _h2_frame(_H2_HEADERS, _H2_FLAG_END_STREAM | _H2_FLAG_END_HEADERS, 1,
+                    _grpc_request_headers(authority, path))
+    )
+    decoder = _HpackDecoder()
+    block = end_stream = None
+    first_frame_time = None
+    while True:
+        try:
+            frame_type, flags, stream_id, payload = await _read_h2_frame(reader, timeout)
+        except asyncio.IncompleteReadError:
+            return None, 'closed', first_frame_time
+        if first_frame_time is None:
+            first_frame_time = time.perf_counter() - started
+        if frame_type == _H2_SETTINGS and not flags & _H2_FLAG_ACK:
+            writer.write(_h2_frame(_H2_SETTINGS, _H2_FLAG_ACK, 0))
+        elif frame_type == _H2_GOAWAY:
+            return None, 'h2_goaway', first_frame_time
+        elif stream_id == 1 and frame_type == _H2_RST_STREAM:
+            return None, 'h2_rst_stream', first_frame_time
+        elif stream_id == 1 and frame_type in (_H2_HEADERS, _H2_CONTINUATION):
+            try:
+                if frame_type == _H2_HEADERS:
+                    block, end_stream = _h2_header_fragment(flags, payload), bool(flags & _H2_FLAG_END_STREAM)
+                elif block is None:
+                    return None, 'h2_protocol_error', first_frame_time
+                else:
+                    block += payload
+                if flags & _H2_FLAG_END_HEADERS:
+                    return (*_grpc_response_outcome(decoder.decode(block), end_stream), first_frame_time)
+            except ValueError:
+                return None, 'bad_headers', first_frame_time
+
+async def _probe_grpc(host: str, port: int, sni: str, authority: str, path: str, timeout: float) -> ProbeResult:
+    """
+    روی TLS با ALPN=h2 یک درخواست gRPC به /<serviceName>/Tun می‌فرستد. فقط پاسخ gRPC با
+    :status 200 (و در پاسخ trailers-only، grpc-status 0) موفق است؛ :status دیگر یا نامشخص،
+    grpc-status غیرصفر (مثلاً 12 برای serviceName اشتباه)، RST_STREAM، GOAWAY یا قطع اتصال ناموفق است.
+    """
+    try:
+        reader, writer, result = await _connect_tls(host, port, sni, ('h2',), timeout)
+    except ValueError:
+        return ProbeResult(False, error='bad_sni')
+    except (OSError, asyncio.TimeoutError) as e:
+        return _probe_failure(e)
+    try:
+        if result.alpn != 'h2':
+            error = 'no_h2'
+        else:
+            result.status, error, result.response_time = await _grpc_request(reader, writer, authority, path, timeout)
+    except (OSError, asyncio.TimeoutError) as e:
+        error = _probe_failure(e).error
+    finally:
+        await _close_writer(writer)
+    if error:
+        result.ok, result.error = False, error
+    return result
+
+async def _probe_transport(host: str, port: int, sni: str, transport: str,
+                           request_host: str, path: str, timeout: float) -> ProbeResult:
+    """بررسی متناسب با transport کانفیگ (WebSocket یا gRPC)؛ برای بقیه فقط handshake TLS."""
+    if transport == 'ws':
+        return await _probe_ws(host, port, sni, request_host, path, timeout)
+    if transport == 'grpc':
+        return await _probe_grpc(host, port, sni, request_host, path, timeout)
+    return await _probe_tls(host, port, sni, timeout)
+
+_PROBES = {'tcp': _probe_tcp, 'tls': _probe_tls, 'transport': _probe_transport}
+
+def _probe_key(link: ShareLink, address: str, mode: str) -> tuple:
+    """
+    کلید endpoint برای یک کانفیگ: آدرس resolve شده و فقط بخش‌هایی از کانفیگ که روی نتیجه
+    بررسی با روش mode اثر دارند (UUID و remark نقشی ندارند)، تا کانفیگ‌های هم‌کلید فقط یک
+    بار بررسی شوند.
+    """
+    if mode == 'tcp':
+        return (address, link.port)
+    _, _, _, port, transport, path, request_host, sni, _ = canonical_fingerprint(link)
+    if mode == 'tls':
+        return (address, port, sni)
+    if transport == 'grpc':
+        path = f"/{path}/Tun"
+    return (address, port, sni, transport, request_host, path)
+
+def _subnet(address: str) -> str:
+    """زیرشبکه /24 (برای IPv4) یا /48 (برای IPv6) یک آدرس."""
+    prefix = 24 if ipaddress.ip_address(address).version == 4 else 48
+    return str(ipaddress.ip_network(f"{address}/{prefix}", strict=False))
+
+class _FairQueue:
+    """
+    صف endpointها به تفکیک زیرشبکه مقصد. pop به نوبت (round-robin) از زیرشبکه‌هایی که
+    ظرفیت آزاد دارند برمی‌دارد تا یک CDN یا VPS پرتکرار بقیه را منتظر نگه ندارد؛ ترتیب
+    داخل هر زیرشبکه همان ترتیب ورودی (امتیاز ایستا) است.
+    """
+    def __init__(self, keys: list):
+        self.subnet_of = {}
+        self.buckets = {}
+        for key in keys:
+            subnet = self.subnet_of[key] = _subnet(key[0])
+            self.buckets.setdefault(subnet, deque()).append(key)
+        self._order = deque(self.buckets)
+        self._size = len(self.subnet_of)
+
+    def __len__(self):
+        return self._size
+
+    def depths(self) -> dict:
+        """تعداد endpointهای منتظر در هر زیرشبکه."""
+        return {subnet: len(queue) for subnet, queue in self.buckets.items()}
+
+    def pop(self, has_capacity) -> tuple:
+        """کلید بعدی از اولین زیرشبکه (به نوبت) که has_capacity(subnet) برایش True است، یا None."""
+        for _ in range(len(self._order)):
+            subnet = self._order[0]
+            self._order.rotate(-1)
+            if not has_capacity(subnet):
+                continue
+            queue = self.buckets[subnet]
+            key = queue.popleft()
+            if not queue:
+                del self.buckets[subnet]
+                self._order.pop()
+            self._size -= 1
+            return key
+        return None
+
+    def drain(self):
+        """همه کلیدهای باقی‌مانده را برمی‌گرداند و صف را خالی می‌کند."""
+        for queue in self.buckets.values():
+            yield from queue
+        self.buckets.clear()
+        self._order.clear()
+        self._size = 0
+
+async def _probe_endpoints(keys: list, mode: str, concurrency: int, timeout: float, deadline: float,
+                           samples: int = PROBE_SAMPLES, interval: float = PROBE_SAMPLE_INTERVAL,
+                           target: int = None, max_latency: float = None, weights: dict = None) -> dict:
+    """
+    endpointها را به ترتیب keys (از بهترین امتیاز ایستا) و با سقف هم‌زمانی concurrency بررسی
+    می‌کند. از هر endpoint تا samples نمونه با فاصله interval گرفته می‌شود (بین نمونه‌ها جایی
+    در سقف هم‌زمانی اشغال نمی‌شود)؛ endpointی که اولین نمونه‌اش ناموفق باشد دوباره بررسی نمی‌شود.
+
+    بررسی وقتی متوقف می‌شود که مهلت کل (deadline) تمام شود یا، اگر target داده شده باشد،
+    تعداد کانفیگ‌های سالم (مجموع weights هر endpoint موفق با میانه تأخیر حداکثر max_latency)
+    به target برسد. endpointهای شروع‌نشده یا لغوشده با خطای 'skipped' یا 'deadline' برمی‌گردند.
+
+    علاوه بر سقف کل، اتصال‌های هم‌زمان به هر IP و هر زیرشبکه هم محدود است و endpointها
+    به نوبت از زیرشبکه‌های مختلف شروع می‌شوند.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    ip_limits = defaultdict(lambda: asyncio.Semaphore(PROBE_PER_IP_CONCURRENCY))
+    subnet_limits = defaultdict(lambda: asyncio.Semaphore(PROBE_PER_SUBNET_CONCURRENCY))
+    probe = _PROBES[mode]
+    queue = _FairQueue(keys)
+
+    depths = sorted(queue.depths().items(), key=lambda item: item[1], reverse=True)
+    if depths:
+        deepest = ', '.join(f"{subnet}={depth}" for subnet, depth in depths[:5])
+        logging.info(f"صف بررسی: {len(depths)} زیرشبکه؛ پرترین‌ها: {deepest}")
+        logging.debug(f"عمق صف همه زیرشبکه‌ها: {dict(depths)}")
+
+    async def attempt(key):
+        # ابتدا سهم IP و زیرشبکه گرفته می‌شود تا انتظار برای آن‌ها جایی در سقف کل اشغال نکند
+        async with ip_limits[key[0]], subnet_limits[queue.subnet_of[key]], semaphore:
+            try:
+                return await probe(*key, timeout)
+            except Exception as e:
+                # خطای پیش‌بینی‌نشده در یک endpoint نباید کل مرحله بررسی را متوقف کند
+                logging.warning(f"خطای پیش‌بینی‌نشده در بررسی {key}: {e!r}")
+                return _probe_failure(e)
+
+    async def run(key):
+        result = await attempt(key)
+        if not result.ok:
+            return result
+        result.samples.append(result.latency)
+        for _ in range(samples - 1):
+            await asyncio.sleep(interval)
+            sample = await attempt(key)
+            if sample.ok:
+                result.samples.append(sample.latency)
+            else:
+                _count('probe_samples_lost')
+        return result
+
+    loop = asyncio.get_running_loop()
+    stop_at = loop.time() + deadline
+    # وظایفی که بین نمونه‌ها منتظرند اتصالی اشغال نمی‌کنند، پس سقف وظایف فعال بزرگ‌تر است
+    max_in_flight = concurrency * max(1, samples)
+    max_in_flight_per_subnet = PROBE_PER_SUBNET_CONCURRENCY * max(1, samples)
+    active = Counter() # تعداد وظایف فعال هر زیرشبکه
+    results = {}
+    in_flight = {}
+    healthy = 0
+
+    while target is None or healthy < target:
+        remaining = stop_at - loop.time()
+        if remaining <= 0:
+            break
+        if queue and len(in_flight) < max_in_flight:
+            key = queue.pop(lambda subnet: active[subnet] < max_in_flight_per_subnet)
+            if key is not None:
+                active[queue.subnet_of[key]] += 1
+                in_flight[asyncio.ensure_future(run(key))] = key
+                continue
+        if not in_flight:
+            break
+        done, _ = await asyncio.wait(in_flight, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            key = in_flight.pop(task)
+            active[queue.subnet_of[key]] -= 1
+            result = results[key] = task.result()
+            if result.ok and (max_latency is None or result.p50 <= max_latency):
+                healthy += weights.get(key, 1) if weights else 1
+
+    deadline_reached = target is None or healthy < target
+    for task in in_flight:
+        task.cancel()
+    if in_flight:
+        await asyncio.gather(*in_flight, return_exceptions=True)
+    for key in in_flight.values():
+        if deadline_reached:
+            _count('probes_expired')
+            results[key] = ProbeResult(False, error='deadline')
+        else:
+            results[key] = ProbeResult(False, error='skipped')
+    for key in queue.drain():
+        results[key] = ProbeResult(False, error='skipped')
+    return results
+
+class ProbeCache:
+    """
+    کش پایدار نتایج بررسی در SQLite، با کلید اثر انگشت endpoint (روش بررسی و کلید گروه).
+    نتایج موفق و ناموفق TTL جداگانه دارند تا endpointهای خراب زودتر دوباره بررسی شوند.
+    """
+    def __init__(self, path: str, success_ttl: float = PROBE_CACHE_SUCCESS_TTL,
+                 failure_ttl: float = PROBE_CACHE_FAILURE_TTL):
+        self.success_ttl = success_ttl
+        self.failure_ttl = failure_ttl
+        self._db = sqlite3.connect(path)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS probes ("
+            "fingerprint TEXT PRIMARY KEY, ok INTEGER, connect_time REAL, handshake_time REAL, alpn TEXT, "
+            "cert_valid INTEGER, status INTEGER, response_time REAL, error TEXT, samples BLOB, probed_at REAL)"
+        )
+
+    @staticmethod
+    def fingerprint(mode: str, key: tuple) -> str:
+        return json.dumps([mode, *key], ensure_ascii=False)
+
+    def get_many(self, mode: str, keys: list, now: float = None) -> dict:
+        """نتایج تازه (منقضی‌نشده) را به صورت key -> ProbeResult برمی‌گرداند."""
+        now = time.time() if now is None else now
+        fresh = {}
+        for key in keys:
+            row = self._db.execute(
+                "SELECT ok, connect_time, handshake_time, alpn, cert_valid, status, response_time, error, "
+                "samples, probed_at FROM probes WHERE fingerprint = ?", (self.fingerprint(mode, key),)
+            ).fetchone()
+            if row is None:
+                continue
+            ok, connect_time, handshake_time, alpn, cert_valid, status, response_time, error, samples, probed_at = row
+            if now - probed_at > (self.success_ttl if ok else self.failure_ttl):
+                continue
+            result = ProbeResult(bool(ok), connect_time, handshake_time, alpn,
+                                 None if cert_valid is None else bool(cert_valid), error)
+            result.status = status
+            result.response_time = response_time
+            result.samples.frombytes(samples or b'')
+            fresh[key] = result
+        return fresh
+
+    def put_many(self, mode: str, results: dict, now: float = None):
+        """نتایج بررسی واقعی را ذخیره می‌کند؛ نتایج لغوشده یا بررسی‌نشده ذخیره نمی‌شوند."""
+        now = time.time() if now is None else now
+        rows = [
+            (self.fingerprint(mode, key), int(result.ok), result.connect_time, result.handshake_time, result.alpn,
+             None if result.cert_valid is None else int(result.cert_valid), result.status, result.response_time,
+             result.error, result.samples.tobytes(), now)
+            for key, result in results.items() if result.error not in ('skipped', 'deadline')
+        ]
+        with self._db:
+            self._db.executemany("INSERT OR REPLACE INTO probes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def close(self):
+        self._db.close()
+
+def probe_configs(configs: list, mode: str = 'tcp', concurrency: int = PROBE_CONCURRENCY,
+                  timeout: float = PROBE_TIMEOUT, deadline: float = PROBE_DEADLINE,
+                  samples: int = PROBE_SAMPLES, target: int = None, max_latency: float = None,
+                  cache_path: str = PROBE_CACHE_FILE) -> dict:
+    """
+    endpoint هر کانفیگ را با روش mode ('tcp'، 'tls' یا 'transport') بررسی می‌کند و دیکشنری
+    config -> ProbeResult برمی‌گرداند. هر گروه endpoint فقط یک بار بررسی می‌شود و
+    نتیجه آن به همه کانفیگ‌های گروه داده می‌شود. configs باید به ترتیب امتیاز باشد تا با
+    target (تعداد کانفیگ سالم مورد نیاز) بهترین‌ها زودتر بررسی شوند و بقیه کنار گذاشته شوند.
+    نتایج تازه از کش cache_path دوباره استفاده می‌شوند و فقط endpointهای جدید یا منقضی بررسی می‌شوند.
+    """
+    groups, unresolved = group_probe_targets(configs, mode)
+    weights = {key: len(members) for key, members in groups.items()}
+
+    cache = ProbeCache(cache_path) if cache_path else None
+    cached = cache.get_many(mode, list(groups)) if cache else {}
+    _count('probe_cache_hits', len(cached))
+    if target is not None:
+        target -= sum(weights[key] for key, result in cached.items()
+                      if result.ok and (max_latency is None or result.p50 <= max_latency))
+    to_probe = [key for key in groups if key not in cached]
+    member_count = sum(weights[key] for key in to_probe)
+    logging.info(f"بررسی دسترس‌پذیری {len(to_probe)} endpoint برای {member_count} کانفیگ (روش {mode})، "
+                 f"{len(cached)} endpoint از کش...")
+    if target is None or target > 0:
+        results = asyncio.run(_probe_endpoints(to_probe, mode, concurrency, timeout, deadline, samples,
+                                               target=target, max_latency=max_latency, weights=weights))
+    else:
+        results = {key: ProbeResult(False, error='skipped') for key in to_probe}
+    if cache:
+        cache.put_many(mode, results)
+        cache.close()
+
+    for key, result in results.items():
+        if result.error == 'skipped':
+            _count('probes_skipped')
+            continue
+        _count('probes_sent')
+        _count('probed_configs', weights[key])
+        _count('probes_ok' if result.ok else 'probes_failed')
+        if result.alpn:
+            _count(f'alpn:{result.alpn}')
+        if result.cert_valid is False:
+            _count('probes_cert_invalid')
+        if result.status is not None:
+            _count(f'status:{result.status}')
+
+    results.update(cached)
+    probed = {config: results[key] for key, members in groups.items() for config in members}
+    unresolved_result = ProbeResult(False, error='unresolved')
+    probed.update((config, unresolved_result) for config in unresolved)
+    return probed
+
+def group_probe_targets(configs: list, mode: str) -> tuple:
+    """
+    نام میزبان کانفیگ‌ها را resolve و آن‌ها را بر اساس کلید endpoint گروه‌بندی می‌کند
+    (ترتیب گروه‌ها همان ترتیب اولین عضو هر گروه است). (گروه‌ها، کانفیگ‌های resolve نشده)
+    را برمی‌گرداند؛ کانفیگ‌های بدون آدرس یا پورت کنار گذاشته می‌شوند.
+    """
+    links = {}
+    for config in configs:
+        link = parse_share_link(config)
+        if link is not None and link.host and link.port:
+            links[config] = link
+    addresses = resolve_hosts(link.host for link in links.values())
+
+    groups = {}
+    unresolved = []
+    for config, link in links.items():
+        address = addresses.get(link.host)
+        if address is None:
+            unresolved.append(config)
+        else:
+            groups.setdefault(_probe_key(link, address, mode), []).append(config)
+    return groups, unresolved
+
+def rank_value(score: int, result: ProbeResult) -> float:
+    """
+    امتیاز نهایی یک کانفیگ بررسی‌شده: امتیاز ایستا منهای جریمه تأخیر میانه و نوسان
+    (بر حسب میلی‌ثانیه) با وزن‌های RANK_*_WEIGHT.
+    """
+    return (RANK_SCORE_WEIGHT * score
+            - RANK_LATENCY_WEIGHT * result.p50 * 1000
+            - RANK_JITTER_WEIGHT * result.jitter * 1000)
+
+def rank_probed_configs(configs: list, scores: dict, results: dict) -> list:
+    """
+    کانفیگ‌های در دسترس را بر اساس rank_value (بیشترین) مرتب می‌کند؛ کانفیگ‌های
+    غیرقابل دسترس حذف می‌شوند.
+    """
+    reachable = [config for config in configs if config in results and results[config].ok]
+    reachable.sort(key=lambda config: -rank_value(scores[config], results[config]))
+    return reachable
+
+# --- بررسی رفت‌وبرگشت واقعی از طریق هسته پراکسی ---
+def _xray_outbound(link: ShareLink, tag: str) -> dict:
+    """outbound هسته Xray برای یک لینک vless."""
+    params = link.params
+    network = params.get('type', 'tcp')
+    stream = {'network': network, 'security': params.get('security', 'none')}
+    if stream['security'] == 'tls':
+        tls = {'serverName': params.get('sni') or params.get('host') or link.host}
+        if params.get('alpn'):
+            tls['alpn'] = params['alpn'].split(',')
+        if params.get('fp'):
+            tls['fingerprint'] = params['fp']
+        stream['tlsSettings'] = tls
+    if network == 'ws':
+        stream['wsSettings'] = {'path': params.get('path', '/'), 'headers': {'Host': params.get('host', link.host)}}
+    elif network == 'grpc':
+        stream['grpcSettings'] = {'serviceName': params.get('serviceName', ''),
+                                  'multiMode': params.get('mode') == 'multi'}
+    user = {'id': link.uuid, 'encryption': params.get('encryption', 'none')}
+    if params.get('flow'):
+        user['flow'] = params['flow']
+    return {
+        'tag': tag,
+        'protocol': 'vless',
+        'settings': {'vnext': [{'address': link.host, 'port': link.port, 'users': [user]}]},
+        'streamSettings': stream,
+    }
+
+def build_core_config(ports: list, api_port: int) -> dict:
+    """
+    پیکربندی پایه یک پردازه هسته: هر پورت یک inbound HTTP (in-i) دارد که با یک قانون مسیریابی
+    به outbound out-i می‌رود و outboundهای out-i برای هر دسته با API HandlerService (روی
+    api_port) جایگزین می‌شوند. ترافیک inboundی که outbound آن بارگذاری نشده به outbound
+    پیش‌فرض (blackhole) می‌رود.
+    """
+    inbounds = [{'tag': 'api', 'listen': '127.0.0.1', 'port': api_port, 'protocol': 'dokodemo-door',
+                 'settings': {'address': '127.0.0.1'}}]
+    rules = [{'type': 'field', 'inboundTag': ['api'], 'outboundTag': 'api'}]
+    for index, port in enumerate(ports):
+        inbounds.append({'tag': f'in-{index}', 'listen': '127.0.0.1', 'port': port, 'protocol': 'http'})
+        rules.append({'type': 'field', 'inboundTag': [f'in-{index}'], 'outboundTag': f'out-{index}'})
+    return {'log': {'loglevel': 'warning'}, 'api': {'tag': 'api', 'services': ['HandlerService']},
+            'inbounds': inbounds, 'outbounds': [{'tag': 'blocked', 'protocol': 'blackhole'}],
+            'routing': {'rules': rules}}
+
+def _free_ports(count: int) -> list:
+    """count پورت آزاد محلی که سیستم‌عامل (با bind روی پورت 0) انتخاب می‌کند."""
+    sockets = []
     try:
-        if not config.startswith("vless://"):
-            return 0 # فقط VLESS را می‌پذیریم
-
-        parsed_url = urlparse(config)
-        params = parse_qs(parsed_url.query)
-        
-        # --- بررسی‌های اصلی برای رد کردن کانفیگ ---
-        if params.get('security', [''])[0] != 'tls':
-            return 0
-        
-        transport = params.get('type', [''])[0]
-        if transport not in ['ws', 'grpc']:
-            return 0
-
-        # برای gRPC، باید serviceName وجود داشته باشد
-        if transport == 'grpc' and not params.get('serviceName', [''])[0]:
-            return 0
-            
-        # برای ws، باید host وجود داشته باشد
-        if transport == 'ws' and not params.get('host', [''])[0]:
-            return 0
-
-        # --- شروع امتیازدهی ---
-        score = 10 # امتیاز پایه برای پاس کردن فیلترهای اولیه
-
-        # امتیاز برای استفاده از پورت استاندارد
-        if parsed_url.port == 443:
-            score += 10
-
-        # امتیاز برای استفاده از دامنه تمیز (نه IP یا DDNS)
-        hostname = parsed_url.hostname
-        if hostname and not re.match(r'^\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}$', hostname):
-            if not any(ddns in hostname for ddns in ['.ddns.net', '.xyz', '.pw']):
-                score += 20
-        
-        # امتیاز برای داشتن SNI مناسب
-        if params.get('sni') or params.get('host'):
-             score += 5
-
-        return score
-        
-    except Exception:
-        return 0
-
-def main():
+        for _ in range(count):
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sockets.append(sock)
+            sock.bind(('127.0.0.1', 0))
+        return [sock.getsockname()[1] for sock in sockets]
+    finally:
+        for sock in sockets:
+            sock.close()
+
+def _wait_for_ports(ports: list, process: subprocess.Popen, timeout: float) -> bool:
+    """
+    تا زمانی که همه پورت‌ها اتصال بپذیرند صبر می‌کند؛ اگر پردازه زودتر خارج شود False برمی‌گرداند.
+    هسته اگر نتواند روی یکی از پورت‌ها گوش دهد خارج می‌شود، پس زنده بودن پردازه پس از آماده شدن
+    پورت‌ها هم بررسی می‌شود تا شنونده دیگری روی همان پورت با هسته اشتباه گرفته نشود.
+    """
+    deadline = time.monotonic() + timeout
+    pending = list(ports)
+    while pending:
+        if process.poll() is not None or time.monotonic() > deadline:
+            return False
+        try:
+            socket.create_connection(('127.0.0.1', pending[-1]), timeout=0.5).close()
+            pending.pop()
+        except OSError:
+            time.sleep(0.05)
+    return process.poll() is None
+
+class ProxyBackendError(RuntimeError):
+    """backend پراکسی قابل استفاده نیست (مثلاً فایل اجرایی هسته وجود ندارد یا هیچ پردازه‌ای بالا نمی‌آید)."""
+
+class CoreWorker:
+    """
+    یک پردازه هسته ماندگار با size پورت inbound و یک پورت API که همه از سیستم‌عامل گرفته می‌شوند.
+    پردازه فقط بار اول یا پس از خرابی راه‌اندازی می‌شود؛ load برای هر دسته outboundهای دسته قبل
+    را با `xray api rmo` حذف و outboundهای دسته جدید را با `xray api ado` اضافه می‌کند، پس
+    inboundها و خود پردازه بین دسته‌ها زنده می‌مانند.
+    """
+
+    def __init__(self, binary: str, directory: str, size: int):
+        self.binary = binary
+        self.directory = directory
+        self.size = size
+        self.process = None
+        self.ports = []
+        self.api_port = None
+        self._loaded = [] # tag outboundهای دسته فعلی
+
+    def start(self) -> bool:
+        """پردازه را با پیکربندی پایه و پورت‌های آزاد تازه راه‌اندازی می‌کند؛ False اگر آماده نشد."""
+        *self.ports, self.api_port = _free_ports(self.size + 1)
+        config_path = os.path.join(self.directory, 'core.json')
+        with open(config_path, 'w', encoding='utf-8') as f:
+            json.dump(build_core_config(self.ports, self.api_port), f)
+        try:
+            self.process = subprocess.Popen([self.binary, 'run', '-c', config_path],
+                                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        except OSError as e:
+            raise ProxyBackendError(f"اجرای هسته '{self.binary}' ممکن نشد: {e}") from e
+        _count('core_starts')
+        if not _wait_for_ports(self.ports + [self.api_port], self.process, CORE_START_TIMEOUT):
+            logging.warning(f"هسته آماده نشد (کد خروج: {self.process.poll()}).")
+            self.stop()
+            return False
+        return True
+
+    def _api(self, command: str, *args) -> bool:
+        try:
+            completed = subprocess.run(
+                [self.binary, 'api', command, f'--server=127.0.0.1:{self.api_port}', *args],
+                stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, timeout=CORE_API_TIMEOUT)
+        except (OSError, subprocess.TimeoutExpired) as e:
+            logging.warning(f"فرمان API هسته '{command}' اجرا نشد: {e}")
+            return False
+        if completed.returncode:
+            error = completed.stderr.decode('utf-8', 'replace').strip().splitlines()
+            logging.warning(f"فرمان API هسته '{command}' ناموفق بود: {error[-1] if error else completed.returncode}")
+            return False
+        return True
+
+    def load(self, links: list) -> list:
+        """دسته را بارگذاری می‌کند و پورت‌های آماده هر لینک را برمی‌گرداند (None اگر هسته در دسترس نبود)."""
+        if self.process is None or self.process.poll() is not None:
+            self.stop()
+            if not self.start():
+                _count('core_failures')
+                return None
+        tags = [f'out-{index}' for index in range(len(links))]
+        batch_path = os.path.join(self.directory, 'batch.json')
+        with open(batch_path, 'w', encoding='utf-8') as f:
+            json.dump({'outbounds': [_xray_outbound(link, tag) for link, tag in zip(links, tags)]}, f)
+        if (self._loaded and not self._api('rmo', *self._loaded)) or not self._api('ado', batch_path):
+            # وضعیت outboundهای پردازه نامعلوم است؛ دسته بعدی آن را از نو راه‌اندازی می‌کند
+            _count('core_failures')
+            self.stop()
+            return None
+        self._loaded = tags
+        _count('core_batches')
+        return self.ports[:len(links)]
+
+    def stop(self):
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        self.process = None
+        self._loaded = []
+
+class CoreProxyBackend:
+    """
+    backend پراکسی با استخری از پردازه‌های هسته (مثل xray) که تا close زنده می‌مانند. lease یک
+    پردازه آزاد را به یک دسته اختصاص می‌دهد، outboundهای دسته را در آن بارگذاری می‌کند و نگاشت
+    کانفیگ به آدرس پراکسی HTTP محلی را برمی‌گرداند؛ فقط لینک‌های vless پشتیبانی می‌شوند. اگر
+    فایل اجرایی هسته وجود نداشته باشد یا هر جایگاه پردازه پیش از اولین بارگذاری موفق یک بار
+    شکست بخورد، ProxyBackendError داده می‌شود تا خرابی backend با خرابی کانفیگ‌ها اشتباه
+    گرفته نشود.
+    """
+
+    def __init__(self, binary: str = CORE_BINARY, workers: int = CORE_WORKERS,
+                 batch_size: int = CORE_BATCH_SIZE):
+        if shutil.which(binary) is None:
+            raise ProxyBackendError(f"فایل اجرایی هسته '{binary}' یافت نشد")
+        self.workers = workers
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._started = 0
+        self._failed = 0
+        self._tempdir = tempfile.TemporaryDirectory(prefix='core-')
+        self._workers = []
+        for slot in range(workers):
+            directory = os.path.join(self._tempdir.name, f'worker-{slot}')
+            os.mkdir(directory)
+            self._workers.append(CoreWorker(binary, directory, batch_size))
+        self._idle = queue.Queue()
+        for worker in self._workers:
+            self._idle.put(worker)
+
+    @contextmanager
+    def lease(self, configs: list):
+        worker = self._idle.get()
+        try:
+            self._check_usable()
+            supported = []
+            for config in configs:
+                link = parse_share_link(config)
+                if link is not None and link.scheme == 'vless':
+                    supported.append((config, link))
+            ports = self._load(worker, [link for _, link in supported]) if supported else None
+            yield {config: f'http://127.0.0.1:{port}' for (config, _), port in zip(supported, ports or ())}
+        finally:
+            self._idle.put(worker)
+
+    def _check_usable(self):
+        with self._lock:
+            if not self._started and self._failed >= self.workers:
+                raise ProxyBackendError(f"هیچ پردازه هسته‌ای راه‌اندازی نشد ({self._failed} تلاش ناموفق)")
+
+    def _load(self, worker: CoreWorker, links: list) -> list:
+        ports = worker.load(links)
+        with self._lock:
+            if ports is None:
+                self._failed += 1
+            else:
+                self._started += 1
+        if ports is None:
+            self._check_usable()
+        return ports
+
+    def close(self):
+        for worker in self._workers:
+            worker.stop()
+        self._tempdir.cleanup()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def measure_through_backend(backend, configs: list, measure, concurrency: int = ROUNDTRIP_CONCURRENCY) -> dict:
+    """
+    configs را در دسته‌های backend.batch_size بین backend.workers پردازه پخش می‌کند و
+    measure(proxy_url) را برای هر کانفیگ با حداکثر concurrency اندازه‌گیری هم‌زمان در هر دسته
+    اجرا می‌کند. backend هر شیئی با workers، batch_size و context manager lease(configs) است که
+    نگاشت کانفیگ به آدرس پراکسی محلی را برمی‌گرداند. کانفیگ‌هایی که پراکسی نگرفتند (پشتیبانی
+    نشدند یا هسته دسته‌شان بالا نیامد) در نتیجه نیستند، پس None فقط یعنی اندازه‌گیری ناموفق بود.
+    """
+    batches = [configs[i:i + backend.batch_size] for i in range(0, len(configs), backend.batch_size)]
+
+    def run_batch(batch):
+        with backend.lease(batch) as proxies:
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                futures = {config: executor.submit(measure, proxies[config]) for config in batch if config in proxies}
+            return {config: future.result() for config, future in futures.items()}
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=backend.workers) as executor:
+        for batch_results in executor.map(run_batch, batches):
+            results.update(batch_results)
+    return results
+
+def measure_roundtrip(proxy: str, url: str = ROUNDTRIP_URL, timeout: float = ROUNDTRIP_TIMEOUT) -> float:
+    """یک درخواست HTTP کامل از طریق پراکسی؛ زمان رفت‌وبرگشت (ثانیه) یا None در صورت شکست."""
+    start = time.perf_counter()
+    try:
+        response = requests.get(url, proxies={'http': proxy, 'https': proxy}, timeout=timeout)
+    except requests.RequestException:
+        return None
+    if response.status_code >= 400:
+        return None
+    return time.perf_counter() - start
+
+def roundtrip_configs(configs: list, backend, url: str = ROUNDTRIP_URL, timeout: float = ROUNDTRIP_TIMEOUT) -> dict:
+    """
+    زمان رفت‌وبرگشت هر کانفیگ از طریق backend را برمی‌گرداند ({کانفیگ: ثانیه یا None})؛
+    کانفیگ‌های اندازه‌گیری‌نشده در آن نیستند.
+    """
+    results = measure_through_backend(backend, configs, partial(measure_roundtrip, url=url, timeout=timeout))
+    ok = sum(1 for elapsed in results.values() if elapsed is not None)
+    _count('roundtrip_ok', ok)
+    _count('roundtrip_failed', len(results) - ok)
+    _count('roundtrip_unmeasured', len(configs) - len(results))
+    return results
+
+def measure_throughput(proxy: str, url: str = SPEEDTEST_URL, timeout: float = SPEEDTEST_TIMEOUT,
+                       max_bytes: int = SPEEDTEST_MAX_BYTES) -> float:
+    """
+    فایل url را (حداکثر max_bytes بایت) از طریق پراکسی دانلود می‌کند و سرعت پایدار (بایت بر ثانیه)
+    را از دریافت اولین بایت تا پایان برمی‌گرداند؛ زمان برقراری اتصال در آن حساب نمی‌شود.
+    """
+    received = 0
+    try:
+        with requests.get(url, proxies={'http': proxy, 'https': proxy}, timeout=timeout, stream=True) as response:
+            if response.status_code >= 400:
+                return None
+            chunks = response.iter_content(STREAM_CHUNK_SIZE)
+            first = next(chunks, b'')
+            start = time.perf_counter()
+            for chunk in chunks:
+                received += len(chunk)
+                if received >= max_bytes:
+                    break
+            elapsed = time.perf_counter() - start
+    except requests.RequestException:
+        return None
+    if not first or not received or elapsed <= 0:
+        return None
+    _count('speedtest_bytes', received + len(first))
+    return received / elapsed
+
+def _limited(semaphore: threading.Semaphore, measure, proxy: str):
+    with semaphore:
+        return measure(proxy)
+
+def speedtest_configs(configs: list, backend, url: str = SPEEDTEST_URL,
+                      concurrency: int = SPEEDTEST_CONCURRENCY) -> dict:
+    """
+    سرعت دانلود هر کانفیگ از طریق backend را برمی‌گرداند ({کانفیگ: بایت بر ثانیه یا None}).
+    سقف concurrency برای کل اجرا (نه هر دسته) اعمال می‌شود تا اندازه‌گیری‌ها با هم رقابت نکنند.
+    """
+    measure = partial(_limited, threading.Semaphore(concurrency), partial(measure_throughput, url=url))
+    results = measure_through_backend(backend, configs, measure, concurrency)
+    ok = sum(1 for speed in results.values() if speed is not None)
+    _count('speedtest_ok', ok)
+    _count('speedtest_failed', len(results) - ok)
+    _count('speedtest_unmeasured', len(configs) - len(results))
+    return results
+
+def order_by_throughput(configs: list, speeds: dict) -> list:
+    """
+    کانفیگ‌های دارای نتیجه تست سرعت را به ترتیب سرعت (بیشترین) به ابتدای لیست می‌برد؛
+    بقیه با همان ترتیب قبلی پس از آن‌ها می‌آیند.
+    """
+    measured = sorted((config for config in configs if speeds.get(config)), key=lambda config: -speeds[config])
+    return measured + [config for config in configs if not speeds.get(config)]
+
+def _score_batch(batch: list) -> tuple:
+    """یک دسته کانفیگ را امتیازدهی می‌کند؛ در پردازه‌های جداگانه هم اجرا می‌شود."""
+    started = time.perf_counter()
+    rejections = Counter()
+    scored = []
+    for config in batch:
+        score = score_and_filter_config(config, rejections)
+        if score > 0:
+            scored.append((config, score))
+    return scored, rejections, os.getpid(), len(batch), time.perf_counter() - started
+
+def score_configs(configs, workers: int = None) -> list:
+    """
+    همه کانفیگ‌ها را امتیازدهی می‌کند و لیست (config, score) کانفیگ‌های پذیرفته‌شده را
+    به همان ترتیب ورودی برمی‌گرداند. برای مجموعه‌های بزرگ، کار به صورت دسته‌ای بین
+    چند پردازه تقسیم می‌شود؛ برای مجموعه‌های کوچک هزینه راه‌اندازی پردازه‌ها نمی‌ارزد.
+    """
+    configs = list(configs)
+    workers = workers or os.cpu_count() or 1
+    threshold = PARALLEL_SCORING_THRESHOLD.get(multiprocessing.get_start_method(),
+                                               max(PARALLEL_SCORING_THRESHOLD.values()))
+    if workers <= 1 or len(configs) < threshold:
+        results = [_score_batch(configs)]
+    else:
+        batches = [configs[i:i + SCORING_BATCH_SIZE] for i in range(0, len(configs), SCORING_BATCH_SIZE)]
+        logging.info(f"امتیازدهی موازی با {workers} پردازه و {len(batches)} دسته...")
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_score_batch, batches))
+
+    scored = []
+    per_worker = {}
+    for batch_scored, rejections, pid, size, elapsed in results:
+        scored.extend(batch_scored)
+        for reason, count in rejections.items():
+            _count(f'reject:{reason}', count)
+        total_size, total_elapsed = per_worker.get(pid, (0, 0.0))
+        per_worker[pid] = (total_size + size, total_elapsed + elapsed)
+
+    for pid, (size, elapsed) in sorted(per_worker.items()):
+        rate = size / elapsed if elapsed > 0 else 0
+        logging.info(f"پردازه {pid}: {size} کانفیگ، {rate:,.0f} کانفیگ در ثانیه")
+    return scored
+
+def select_top_configs(scored: list, max_output: int = None) -> list:
+    """
+    در یک گذر بهترین کانفیگ هر اثر انگشت کانونیکال (config_fingerprint) را نگه می‌دارد و
+    کانفیگ‌ها را به ترتیب امتیاز (در امتیاز برابر، به ترتیب ورودی) برمی‌گرداند. با max_output فقط N کانفیگ برتر
+    با heap انتخاب می‌شوند و لیست کامل هرگز مرتب نمی‌شود.
+    """
+    # (-score, index, config): مقایسه مستقیم tupleها بدون تابع key؛ index یکتاست و به config نمی‌رسد
+    best = {}
+    for index, (config, score) in enumerate(scored):
+        key = config_fingerprint(config)
+        current = best.get(key)
+        if current is None or -score < current[0]:
+            best[key] = (-score, index, config)
+
+    if max_output is None:
+        winners = sorted(best.values())
+    else:
+        winners = heapq.nsmallest(max_output, best.values())
+    return [config for _, _, config in winners]
+
+# --- مخزن پایدار کانفیگ‌ها (اجرای افزایشی) ---
+class ConfigStore:
+    """
+    تاریخچه کانفیگ‌ها در SQLite (حالت WAL) با کلید digest: متن کانفیگ، منبع، امتیاز و نسخه
+    امتیازدهی (کانفیگ‌های ردشده با امتیاز 0)، زمان اولین و آخرین مشاهده و وضعیت فعال بودن.
+    ردیف‌های جدید یا تغییرکرده (امتیازدهی دوباره، ناپدید شدن یا بازگشت) جداگانه نوشته می‌شوند و
+    last_seen همه کانفیگ‌های فعال با یک UPDATE به زمان اجرا می‌رسد.
+    """
+    _SCHEMA_VERSION = 3
+
+    def __init__(self, path: str = CONFIG_STORE_FILE):
+        self._db = sqlite3.connect(path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        if self._db.execute("PRAGMA user_version").fetchone()[0] != self._SCHEMA_VERSION:
+            with self._db:
+                self._db.execute("DROP TABLE IF EXISTS configs")
+                self._db.execute("DROP TABLE IF EXISTS meta")
+                self._db.execute(f"PRAGMA user_version = {self._SCHEMA_VERSION}")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS configs (digest INTEGER PRIMARY KEY, config TEXT, source TEXT, "
+            "score INTEGER, scoring_version INTEGER, first_seen REAL, last_seen REAL, active INTEGER)"
+        )
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value)")
+
+    @staticmethod
+    def _key(digest: int) -> int:
+        # SQLite فقط عدد صحیح 64 بیتی علامت‌دار نگه می‌دارد
+        return digest - (1 << 64) if digest >= 1 << 63 else digest
+
+    def is_empty(self) -> bool:
+        return self._db.execute("SELECT NOT EXISTS (SELECT 1 FROM configs)").fetchone()[0] == 1
+
+    def last_run_at(self) -> float:
+        row = self._db.execute("SELECT value FROM meta WHERE key = 'last_run_at'").fetchone()
+        return row[0] if row else None
+
+    def index_rows(self):
+        """(digest، امتیاز، نسخه امتیازدهی، فعال) همه ردیف‌ها را برای بازسازی DigestIndex برمی‌گرداند."""
+        for digest, score, version, active in self._db.execute(
+                "SELECT digest, score, scoring_version, active FROM configs"):
+            yield digest % (1 << 64), score, version, bool(active)
+
+    def record(self, scored: dict, reappeared: list, disappeared: list, origins: dict = None, now: float = None,
+               digests: dict = None):
+        """
+        تغییرات یک اجرا را در یک تراکنش می‌نویسد: scored ({کانفیگ: امتیاز}) کانفیگ‌های جدید یا
+        امتیازدهی‌شده دوباره است و reappeared/disappeared فهرست digest کانفیگ‌هایی که برگشتند یا
+        دیگر دیده نشدند. digestهای از پیش محاسبه‌شده scored را می‌توان در digests داد.
+        """
+        now = time.time() if now is None else now
+        origins = origins or {}
+        digests = digests or {}
+        with self._db:
+            # last_seen کانفیگ‌های ناپدیدشده زمان اجرای قبلی می‌ماند
+            self._db.executemany("UPDATE configs SET active = 0 WHERE digest = ?",
+                                 ((self._key(digest),) for digest in disappeared))
+            self._db.execute("UPDATE configs SET last_seen = ? WHERE active = 1", (now,))
+            self._db.executemany(
+                "INSERT INTO configs VALUES (?, ?, ?, ?, ?, ?, ?, 1) ON CONFLICT(digest) DO UPDATE SET "
+                "score = excluded.score, scoring_version = excluded.scoring_version, "
+                "source = COALESCE(source, excluded.source), last_seen = excluded.last_seen, active = 1",
+                ((self._key(digests.get(config) or config_digest(config)), config, origins.get(config), score,
+                  SCORING_VERSION, now, now)
+                 for config, score in scored.items())
+            )
+            self._db.executemany("UPDATE configs SET active = 1, last_seen = ? WHERE digest = ?",
+                                 ((now, self._key(digest)) for digest in reappeared))
+            self._db.execute("INSERT OR REPLACE INTO meta VALUES ('last_run_at', ?)", (now,))
+
+    def close(self):
+        self._db.close()
+
+def _digest(text: str) -> int:
+    return int.from_bytes(hashlib.blake2b(text.encode('utf-8', 'surrogatepass'), digest_size=8).digest(),
+                          'little') or 1
+
+def config_digest(config: str, rejected: bool = None) -> int:
+    """
+    digest غیرصفر 64 بیتی کانفیگ. برای کانفیگ‌هایی که از پیش‌فیلتر عبور می‌کنند از شکل کانونیکال
+    (همان config_fingerprint) ساخته می‌شود تا نسخه‌های هم‌ارز (remark، ترتیب پارامترها، حروف
+    بزرگ و ...) یک بار امتیازدهی و ذخیره شوند؛ مقادیر خامی که امتیازدهی می‌خواند هم در آن
+    هستند، پس کانفیگ‌های هم‌digest امتیاز یکسان دارند. کانفیگ‌های ردشده با پیش‌فیلتر (rejected،
+    که اگر داده نشود همین‌جا بررسی می‌شود) و لینک‌های بدون UUID یا host پارس نمی‌شوند و digest
+    خود رشته را می‌گیرند.
+    """
+    if rejected is None:
+        rejected = _prefilter_reject_reason(config) is not None
+    link = None if rejected else parse_share_link(config)
+    if link is None or not link.uuid or not link.host:
+        return _digest(config)
+    params = link.params
+    return _digest('\n'.join((_link_fingerprint(link), link.host, params.get('security', ''), params.get('type', ''),
+                              *('1' if params.get(name) else '' for name in ('serviceName', 'host', 'sni')))))
+
+UNSCORED = -1 # امتیاز کانفیگی که هنوز (یا با نسخه فعلی قواعد) امتیازدهی نشده است
+
+class DigestIndex:
+    """
+    نگاشت فشرده digest 64 بیتی کانفیگ به (امتیاز، شماره آخرین اجرایی که دیده شد) روی سه آرایه
+    موازی با آدرس‌دهی باز (linear probing)؛ هر خانه 14 بایت است و digest صفر نشانه خانه خالی
+    است. فایل ذخیره‌شده با mmap به صورت copy-on-write باز می‌شود، پس بارگذاری به خواندن کل
+    فایل نیاز ندارد. run شماره آخرین اجرای کامل و scoring_version نسخه قواعد امتیازهاست.
+    """
+    _MAGIC = b'CFGINDX2'
+    _HEADER_SIZE = 32
+    _SLOT_SIZE = 14 # digest (Q) + امتیاز (h) + شماره اجرا (I)
+
+    def __init__(self, capacity: int = 1024):
+        capacity = 1 << max(4, (capacity - 1).bit_length())
+        self._keys = array('Q', bytes(8 * capacity))
+        self._scores = array('h', bytes(2 * capacity))
+        self._runs = array('I', bytes(4 * capacity))
+        self._mask = capacity - 1
+        self._size = 0
+        self._mmap = None
+        self.run = 0
+        self.scoring_version = SCORING_VERSION
+
+    @classmethod
+    def load(cls, path: str) -> 'DigestIndex':
+        """نمایه ذخیره‌شده با save را memory-map می‌کند؛ برای فایل نامعتبر ValueError می‌دهد."""
+        with open(path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+        capacity, remainder = divmod(len(mapped) - cls._HEADER_SIZE, cls._SLOT_SIZE)
+        size = int.from_bytes(mapped[8:16], 'little')
+        if (mapped[:8] != cls._MAGIC or remainder or capacity < 1 or capacity & (capacity - 1)
+                or size >= capacity):
+            mapped.close()
+            raise ValueError(f"فایل '{path}' یک نمایه digest معتبر نیست")
+        index = cls.__new__(cls)
+        index._mmap = mapped
+        view = memoryview(mapped)
+        scores_at = cls._HEADER_SIZE + 8 * capacity
+        runs_at = scores_at + 2 * capacity
+        index._keys = view[cls._HEADER_SIZE:scores_at].cast('Q')
+        index._scores = view[scores_at:runs_at].cast('h')
+        index._runs = view[runs_at:].cast('I')
+        view.release()
+        index._mask = capacity - 1
+        index._size = size
+        index.run = int.from_bytes(mapped[16:20], 'little')
+        index.scoring_version = int.from_bytes(mapped[20:24], 'little')
+        return index
+
+    def __len__(self):
+        return self._size
+
+    def _find(self, digest: int) -> int:
+        keys, mask = self._keys, self._mask
+        index = digest & mask
+        # در جدول سالم همیشه خانه خالی هست؛ سقف تکرار فقط جلوی حلقه بی‌پایان در فایل خراب را می‌گیرد
+        for _ in range(mask + 1):
+            value = keys[index]
+            if value == digest or value == 0:
+                return index
+            index = (index + 1) & mask
+        raise ValueError("جدول digestها خانه خالی ندارد (فایل خراب است)")
+
+    def __contains__(self, digest: int) -> bool:
+        return self._keys[self._find(digest)] == digest
+
+    def visit(self, digest: int, run: int) -> tuple:
+        """
+        digest را در اجرای run دیده‌شده ثبت می‌کند و (امتیاز، شماره اجرای قبلی) را برمی‌گرداند؛
+        digest تازه با (UNSCORED, 0) اضافه می‌شود.
+        """
+        slot = self._find(digest)
+        if self._keys[slot] == digest:
+            previous = self._scores[slot], self._runs[slot]
+            self._runs[slot] = run
+            return previous
+        self._keys[slot] = digest
+        self._scores[slot] = UNSCORED
+        self._runs[slot] = run
+        self._size += 1
+        if self._size > (self._mask + 1) * SEEN_SET_LOAD_FACTOR:
+            self._resize(2 * (self._mask + 1))
+        return UNSCORED, 0
+
+    def set_score(self, digest: int, score: int):
+        slot = self._find(digest)
+        if self._keys[slot] == digest:
+            self._scores[slot] = min(score, 0x7fff)
+
+    def last_seen_in(self, run: int) -> list:
+        """digest کانفیگ‌هایی که آخرین بار در اجرای run دیده شده‌اند."""
+        return [key for key, last in zip(self._keys, self._runs) if last == run and key]
+
+    def invalidate_scores(self, scoring_version: int):
+        """پس از تغییر قواعد امتیازدهی همه امتیازها را UNSCORED می‌کند تا دوباره محاسبه شوند."""
+        for slot in range(self._mask + 1):
+            self._scores[slot] = UNSCORED
+        self.scoring_version = scoring_version
+
+    def _resize(self, capacity: int):
+        old = self._keys, self._scores, self._runs
+        self._keys = array('Q', bytes(8 * capacity))
+        self._scores = array('h', bytes(2 * capacity))
+        self._runs = array('I', bytes(4 * capacity))
+        self._mask = capacity - 1
+        for key, score, run in zip(*old):
+            if key:
+                slot = self._find(key)
+                self._keys[slot], self._scores[slot], self._runs[slot] = key, score, run
+        self._release(old)
+
+    def _release(self, arrays):
+        if self._mmap is not None:
+            for view in arrays:
+                view.release()
+            self._mmap.close()
+            self._mmap = None
+
+    def save(self, path: str):
+        """نمایه را به صورت اتمیک در path می‌نویسد (ترتیب بایت‌های میزبان)."""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(self._MAGIC)
+            f.write(self._size.to_bytes(8, 'little'))
+            f.write(self.run.to_bytes(4, 'little'))
+            f.write(self.scoring_version.to_bytes(4, 'little'))
+            f.write(bytes(self._HEADER_SIZE - 24))
+            f.write(self._keys)
+            f.write(self._scores)
+            f.write(self._runs)
+        os.replace(tmp_path, path)
+
+    def close(self):
+        self._release((self._keys, self._scores, self._runs))
+
+def load_config_index(path: str, store: ConfigStore) -> DigestIndex:
+    """
+    نمایه digestها را از path بارگذاری می‌کند؛ اگر نبود، خراب بود یا با store هم‌خوان نبود
+    (مثلاً store پاک شده باشد)، از روی store ساخته می‌شود.
+    """
+    try:
+        index = DigestIndex.load(path)
+    except FileNotFoundError:
+        index = None
+    except (OSError, ValueError) as e:
+        logging.warning(f"نمایه digestها بارگذاری نشد و از مخزن بازسازی می‌شود: {e}")
+        index = None
+    if index is not None and (len(index) == 0) == store.is_empty():
+        return index
+    if index is not None:
+        index.close()
+    # کانفیگ‌های فعال در «اجرای قبلی» (2) و غیرفعال‌ها در اجرای پیش از آن (1) دیده شده‌اند
+    index = DigestIndex()
+    index.run = 2
+    for digest, score, version, active in store.index_rows():
+        index.visit(digest, 2 if active else 1)
+        index.set_score(digest, score if version == SCORING_VERSION else UNSCORED)
+    return index
+
+def score_configs_incremental(sources, store: ConfigStore, workers: int = None,
+                              index_path: str = SEEN_SET_FILE) -> list:
+    """
+    کانفیگ‌های sources (جفت‌های (url, configs) مثل خروجی iter_source_configs) را به صورت جریانی
+    و بدون نگه داشتن مجموعه رشته‌ها، با digest حذف تکراری و امتیازدهی می‌کند و لیست
+    (config, score) کانفیگ‌های پذیرفته‌شده را برمی‌گرداند. فقط کانفیگ‌هایی امتیازدهی می‌شوند
+    که در اجراهای قبلی دیده نشده‌اند (یا با نسخه فعلی قواعد امتیاز نگرفته‌اند)؛ امتیاز بقیه از
+    نمایه digestها خوانده می‌شود و SQLite فقط برای نوشتن تغییرات استفاده می‌شود.
+    کانفیگ‌هایی که پیش‌فیلتر ارزان ردشان می‌کند هم با امتیاز 0 ثبت می‌شوند تا در مخزن بمانند؛
+    دلیل رد آن‌ها (مثل حالت غیرافزایشی) در هر اجرا و برای هر تکرار شمرده می‌شود.
+    """
+    index = load_config_index(index_path, store)
+    try:
+        if index.scoring_version != SCORING_VERSION:
+            logging.info("قواعد امتیازدهی تغییر کرده است؛ همه کانفیگ‌ها دوباره امتیازدهی می‌شوند.")
+            index.invalidate_scores(SCORING_VERSION)
+        run = index.run + 1
+        rejections = Counter()
+        scored, to_score, rejected, reappeared = [], [], [], []
+        origins, digests = {}, {}
+        known = received = 0
+        for url, configs in sources:
+            received += len(configs)
+            for config in configs:
+                reason = _prefilter_reject_reason(config)
+                if reason is not None:
+                    rejections[reason] += 1
+                digest = config_digest(config, reason is not None)
+                score, last_run = index.visit(digest, run)
+                if last_run == run:
+                    continue
+                if score == UNSCORED:
+                    digests[config] = digest
+                    if reason is None:
+                        to_score.append(config)
+                    else:
+                        rejected.append(config)
+                    origins[config] = url
+                    continue
+                known += 1
+                if last_run < run - 1:
+                    reappeared.append(digest)
+                if score > 0:
+                    scored.append((config, score))
+        for reason, count in rejections.items():
+            _count(f'reject:{reason}', count)
+
+        new_scores = dict.fromkeys(rejected, 0)
+        new_scores.update(dict.fromkeys(to_score, 0))
+        new_scores.update(score_configs(to_score, workers))
+        for config, score in new_scores.items():
+            index.set_score(digests[config], score)
+        disappeared = index.last_seen_in(run - 1)
+        store.record(new_scores, reappeared, disappeared, origins, digests=digests)
+        index.run = run
+        index.save(index_path)
+    finally:
+        index.close()
+    _count('configs_received', received)
+    _count('store_known', known)
+    _count('store_new', len(new_scores))
+    _count('store_gone', len(disappeared))
+    return scored + [(config, score) for config, score in new_scores.items() if score > 0]
+
+def _positive_int(value: str) -> int:
+    """نوع آرگومان‌هایی که باید عدد صحیح مثبت باشند."""
+    try:
+        number = int(value)
+    except ValueError:
+        number = 0
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"باید عدد صحیح بزرگ‌تر از صفر باشد: '{value}'")
+    return number
+
+def parse_args(argv=None) -> argparse.Namespace:
+    """آرگومان‌های خط فرمان را می‌خواند."""
+    parser = argparse.ArgumentParser(description="جمع‌آوری و فیلتر کانفیگ‌های V2Ray")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="تعداد پردازه‌های امتیازدهی (پیش‌فرض: تعداد هسته‌ها؛ 1 برای اجرای تک‌پردازه‌ای)")
+    parser.add_argument('--stream', action='store_true', default=STREAM_DOWNLOADS,
+                        help="دریافت و استخراج تکه به تکه منابع تا مصرف حافظه به اندازه تکه محدود بماند، نه حجم منبع")
+    parser.add_argument('--bytes-extraction', action='store_true', default=BYTES_EXTRACTION,
+                        help="استخراج مستقیم روی بایت‌های پاسخ؛ فقط کانفیگ‌های پیدا شده به رشته تبدیل می‌شوند")
+    parser.add_argument('--max-output', type=_positive_int, default=None,
+                        help="حداکثر تعداد کانفیگ‌های خروجی (پیش‌فرض: همه)")
+    parser.add_argument('--probe', choices=('off', 'tcp', 'tls', 'transport'), default='off',
+                        help="بررسی دسترس‌پذیری کانفیگ‌ها (اتصال TCP، handshake کامل TLS یا بررسی transport: "
+                             "Upgrade به WebSocket یا درخواست HTTP/2 به سرویس gRPC) و حذف کانفیگ‌های غیرقابل دسترس")
+    parser.add_argument('--probe-samples', type=_positive_int, default=PROBE_SAMPLES,
+                        help="تعداد نمونه‌های تأخیر برای هر endpoint؛ رتبه‌بندی بر اساس میانه و نوسان آن‌هاست")
+    parser.add_argument('--probe-target', type=_positive_int, default=None,
+                        help="توقف بررسی پس از یافتن این تعداد کانفیگ سالم (به ترتیب امتیاز ایستا)")
+    parser.add_argument('--probe-max-latency', type=float, default=None,
+                        help="حداکثر میانه تأخیر (میلی‌ثانیه) برای سالم شمردن کانفیگ در --probe-target")
+    parser.add_argument('--probe-budget', type=float, default=PROBE_DEADLINE,
+                        help="حداکثر زمان کل مرحله بررسی (ثانیه)")
+    parser.add_argument('--roundtrip', action='store_true',
+                        help="ارسال یک درخواست HTTP واقعی از طریق هر کانفیگ با هسته پراکسی و حذف کانفیگ‌های ناموفق")
+    parser.add_argument('--core-path', default=CORE_BINARY,
+                        help="مسیر فایل اجرایی هسته پراکسی (سازگار با پیکربندی Xray)")
+    parser.add_argument('--roundtrip-url', default=ROUNDTRIP_URL,
+                        help="آدرس مقصد درخواست رفت‌وبرگشت")
+    parser.add_argument('--incremental', action='store_true',
+                        help=f"فقط کانفیگ‌های جدید امتیازدهی شوند؛ امتیاز بقیه از نمایه '{SEEN_SET_FILE}' خوانده و "
+                             f"تاریخچه در '{CONFIG_STORE_FILE}' ثبت می‌شود")
+    parser.add_argument('--speedtest', type=int, default=0, metavar='N',
+                        help="تست سرعت دانلود از طریق هسته پراکسی برای N کانفیگ برتر (0: غیرفعال)")
+    parser.add_argument('--speedtest-url', default=SPEEDTEST_URL,
+                        help="آدرس فایل با حجم ثابت برای تست سرعت")
+    parser.add_argument('--order', choices=('rank', 'throughput'), default='rank',
+                        help="ترتیب خروجی: رتبه امتیاز و تأخیر، یا سرعت دانلود برای کانفیگ‌های تست‌شده")
+    return parser.parse_args(argv)
+
+def main(argv=None):
     """تابع اصلی برای اجرای کل فرآیند."""
+    args = parse_args(argv)
     try:
         with open(SOURCES_FILE, 'r', encoding='utf-8') as f:
             sources = [line.strip() for line in f if line.strip()]
@@ -98,30 +2384,51 @@ def main():
         return
 
     logging.info(f"شروع جمع‌آوری از {len(sources)} منبع...")
-    unique_configs = get_configs_from_sources(sources)
-    logging.info(f"مجموعاً {len(unique_configs)} کانفیگ منحصر به فرد یافت شد.")
+    if args.incremental:
+        # دریافت، حذف تکراری با digest و امتیازدهی به صورت جریانی و بدون مجموعه کامل رشته‌ها انجام می‌شود
+        store = ConfigStore()
+        try:
+            scored_configs = score_configs_incremental(iter_source_configs(sources, args.stream, args.bytes_extraction), store, args.workers)
+        finally:
+            store.close()
+        logging.info(f"مجموعاً {RUN_STATS['configs_received']} کانفیگ دریافت شد؛ "
+                     f"{len(scored_configs)} کانفیگ از فیلتر اولیه عبور کرد.")
+    else:
+        unique_configs = get_configs_from_sources(sources, args.stream, args.bytes_extraction)
+        logging.info(f"مجموعاً {len(unique_configs)} کانفیگ منحصر به فرد یافت شد.")
 
-    logging.info("شروع فرآیند امتیازدهی و فیلتر پیشرفته...")
-    
-    scored_configs = []
-    for config in unique_configs:
-        score = score_and_filter_config(config)
-        if score > 0:
-            # یک دیکشنری برای حذف کانفیگ‌های با UUID و آدرس یکسان (سرورهای انبوه)
-            # ما فقط بهترین امتیاز هر سرور را نگه می‌داریم
-            server_id = config.split('@')[0]
-            scored_configs.append({'id': server_id, 'score': score, 'config': config})
+        logging.info("شروع فرآیند امتیازدهی و فیلتر پیشرفته...")
+        scored_configs = score_configs(unique_configs, args.workers)
 
-    # مرتب‌سازی بر اساس امتیاز (بیشترین به کمترین)
-    scored_configs.sort(key=lambda x: x['score'], reverse=True)
-    
-    # حذف سرورهای تکراری و نگه داشتن بهترین امتیاز
-    final_configs = []
-    seen_ids = set()
-    for item in scored_configs:
-        if item['id'] not in seen_ids:
-            final_configs.append(item['config'])
-            seen_ids.add(item['id'])
+    # برای هر سرور (اثر انگشت کانونیکال یکسان) فقط بهترین امتیاز نگه داشته می‌شود
+    if args.probe == 'off' and not args.roundtrip and not args.speedtest:
+        final_configs = select_top_configs(scored_configs, args.max_output)
+    else:
+        # کانفیگ‌های غیرقابل دسترس حذف می‌شوند، پس محدودیت تعداد بعد از بررسی اعمال می‌شود
+        final_configs = select_top_configs(scored_configs)
+        if args.probe != 'off':
+            max_latency = args.probe_max_latency / 1000 if args.probe_max_latency else None
+            results = probe_configs(final_configs, args.probe, deadline=args.probe_budget,
+                                    samples=args.probe_samples, target=args.probe_target, max_latency=max_latency)
+            final_configs = rank_probed_configs(final_configs, dict(scored_configs), results)
+        if args.roundtrip or args.speedtest:
+            try:
+                with CoreProxyBackend(args.core_path) as backend:
+                    if args.roundtrip:
+                        logging.info(f"بررسی رفت‌وبرگشت {len(final_configs)} کانفیگ از طریق هسته '{args.core_path}'...")
+                        roundtrips = roundtrip_configs(final_configs, backend, args.roundtrip_url)
+                        # فقط کانفیگ‌هایی حذف می‌شوند که اندازه‌گیری شدند و شکست خوردند
+                        final_configs = [config for config in final_configs
+                                         if config not in roundtrips or roundtrips[config] is not None]
+                    if args.speedtest:
+                        candidates = final_configs[:args.speedtest]
+                        logging.info(f"تست سرعت {len(candidates)} کانفیگ برتر...")
+                        speeds = speedtest_configs(candidates, backend, args.speedtest_url)
+                        if args.order == 'throughput':
+                            final_configs = order_by_throughput(final_configs, speeds)
+            except ProxyBackendError as e:
+                logging.error(f"بررسی از طریق هسته پراکسی انجام نشد و کانفیگ‌ها بدون تغییر می‌مانند: {e}")
+        final_configs = final_configs[:args.max_output]
 
     logging.info(f"پس از فیلتر پیشرفته، {len(final_configs)} کانفیگ با کیفیت بالا باقی ماند.")
 
@@ -132,6 +2439,8 @@ def main():
     else:
         logging.warning("هیچ کانفیگی از فیلترهای پیشرفته عبور نکرد.")
 
+    log_run_summary()
+
 if __name__ == "__main__":
     main()
     
@@ -0,0 +1,73 @@
+import os
+import shutil
+import sys
+from collections import Counter
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import collector  # noqa: E402
+from fake_subscription import FakeSubscriptionServer  # noqa: E402
+from probe_servers import StandInServer, make_certificate  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def isolated_run(tmp_path, monkeypatch):
+    """هر تست در tmp_path و با آمار، نشست HTTP و سمافورهای میزبان تازه اجرا می‌شود."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(collector, 'RUN_STATS', Counter())
+    monkeypatch.setattr(collector, '_session', None)
+    monkeypatch.setattr(collector, '_host_semaphores', {})
+
+
+@pytest.fixture
+def subscription_server():
+    server = FakeSubscriptionServer().start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def stand_in():
+    """سازنده سرورهای محلی StandInServer که در پایان تست بسته می‌شوند."""
+    servers = []
+
+    def start(*args, **kwargs):
+        servers.append(StandInServer(*args, **kwargs).start())
+        return servers[-1]
+
+    yield start
+    for server in servers:
+        server.stop()
+
+
+@pytest.fixture(scope='session')
+def certificate(tmp_path_factory):
+    """(cert, key) گواهی خودامضای probe.test."""
+    if shutil.which('openssl') is None:
+        pytest.skip("openssl برای ساختن گواهی تست در دسترس نیست")
+    return make_certificate(tmp_path_factory.mktemp('tls'), 'probe.test')
+
+
+@pytest.fixture
+def trust_certificate(certificate, monkeypatch):
+    """گواهی تست را به عنوان تنها CA مورد اعتماد context های بررسی TLS قرار می‌دهد."""
+    monkeypatch.setenv('SSL_CERT_FILE', certificate[0])
+    monkeypatch.delenv('SSL_CERT_DIR', raising=False)
+    collector._tls_context.cache_clear()
+    yield
+    collector._tls_context.cache_clear()
+
+
+@pytest.fixture
+def stub_core(tmp_path, monkeypatch):
+    """مسیر فایل اجرایی هسته جایگزین (tests/stub_core.py)؛ اجراها و فرمان‌های API آن در core.log ثبت می‌شوند."""
+    binary = tmp_path / 'stub-core'
+    binary.write_text(f"#!/bin/sh\nexec '{sys.executable}' '{os.path.join(os.path.dirname(__file__), 'stub_core.py')}' \"$@\"\n")
+    binary.chmod(0o755)
+    monkeypatch.setenv('STUB_CORE_LOG', str(tmp_path / 'core.log'))
+    # درخواست‌های تست به 127.0.0.1 باید از پراکسی هسته عبور کنند
+    for name in ('NO_PROXY', 'no_proxy', 'HTTP_PROXY', 'http_proxy', 'HTTPS_PROXY', 'https_proxy'):
+        monkeypatch.delenv(name, raising=False)
+    return str(binary)
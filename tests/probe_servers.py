@@ -0,0 +1,179 @@
+"""
+سرورهای محلی جایگزین endpointهای واقعی برای تست مرحله بررسی: یک سوکت شنونده روی
+127.0.0.1 که هر اتصال را (در صورت نیاز پس از handshake TLS) در یک thread به handler می‌دهد.
+"""
+import base64
+import hashlib
+import socket
+import ssl
+import subprocess
+import threading
+import time
+
+import collector
+
+
+def close_handler(server, conn):
+    """اتصال را بلافاصله پس از پذیرفتن (و handshake) می‌بندد."""
+
+
+def read_http_request(conn) -> tuple:
+    """(request line، دیکشنری هدرها با نام کوچک) یک درخواست HTTP/1.1 را می‌خواند."""
+    data = b''
+    while b'\r\n\r\n' not in data:
+        chunk = conn.recv(4096)
+        if not chunk:
+            break
+        data += chunk
+    lines = data.split(b'\r\n\r\n', 1)[0].decode('latin-1').split('\r\n')
+    headers = {}
+    for line in lines[1:]:
+        name, _, value = line.partition(':')
+        headers[name.strip().lower()] = value.strip()
+    return lines[0], headers
+
+
+def websocket_handler(paths=('/ws',), response: bytes = None):
+    """
+    handler سرور WebSocket: برای مسیرهای paths پاسخ 101 و برای بقیه 404 می‌دهد و
+    (path, Host, هدرها) هر درخواست را در server.requests ثبت می‌کند. با response همان
+    بایت‌ها به جای پاسخ فرستاده می‌شوند.
+    """
+    def handle(server, conn):
+        request_line, headers = read_http_request(conn)
+        path = request_line.split(' ')[1] if request_line.count(' ') >= 2 else None
+        server.requests.append((path, headers.get('host'), headers))
+        if response is not None:
+            conn.sendall(response)
+        elif path in paths and headers.get('upgrade', '').lower() == 'websocket':
+            accept = base64.b64encode(hashlib.sha1(
+                (headers['sec-websocket-key'] + '258EAFA5-E914-47DA-95CA-C5AB0DC85B11').encode()).digest())
+            conn.sendall(b'HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n'
+                         b'Sec-WebSocket-Accept: ' + accept + b'\r\n\r\n')
+        else:
+            conn.sendall(b'HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\n\r\n')
+    return handle
+
+
+def _recv_exactly(conn, size: int) -> bytes:
+    data = b''
+    while len(data) < size:
+        chunk = conn.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("اتصال پیش از دریافت کامل بسته شد")
+        data += chunk
+    return data
+
+
+def h2_handler(response: bytes = b''):
+    """
+    handler سرور HTTP/2: preface و frameهای کلاینت را می‌خواند، SETTINGS خودش را می‌فرستد و پس
+    از دریافت HEADERS استریم 1 بایت‌های response (frameهای آماده پاسخ) را می‌فرستد. (payload
+    SETTINGS کلاینت، بلوک هدر درخواست) در server.requests ثبت می‌شود.
+    """
+    def handle(server, conn):
+        if _recv_exactly(conn, len(collector._H2_PREFACE)) != collector._H2_PREFACE:
+            return
+        conn.sendall(collector._h2_frame(collector._H2_SETTINGS, 0, 0))
+        settings = None
+        while True:
+            header = _recv_exactly(conn, 9)
+            payload = _recv_exactly(conn, int.from_bytes(header[:3], 'big'))
+            frame_type, flags, stream_id = header[3], header[4], int.from_bytes(header[5:9], 'big')
+            if frame_type == collector._H2_SETTINGS and not flags & collector._H2_FLAG_ACK:
+                settings = payload
+            elif frame_type == collector._H2_HEADERS and stream_id == 1:
+                server.requests.append((settings, payload))
+                break
+        conn.sendall(response)
+        while conn.recv(4096):
+            pass
+    return handle
+
+
+def make_certificate(directory, name: str) -> tuple:
+    """گواهی خودامضای name (با SAN) را با openssl می‌سازد و (cert, key) را برمی‌گرداند."""
+    cert, key = str(directory / 'cert.pem'), str(directory / 'key.pem')
+    subprocess.run(['openssl', 'req', '-x509', '-newkey', 'ec', '-pkeyopt', 'ec_paramgen_curve:prime256v1',
+                    '-nodes', '-days', '2', '-subj', f'/CN={name}', '-addext', f'subjectAltName=DNS:{name}',
+                    '-keyout', key, '-out', cert], check=True, capture_output=True)
+    return cert, key
+
+
+def tls_context(certificate: tuple, alpn=('h2', 'http/1.1')) -> ssl.SSLContext:
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(*certificate)
+    if alpn:
+        context.set_alpn_protocols(list(alpn))
+    return context
+
+
+class StandInServer:
+    def __init__(self, handler=close_handler, tls: ssl.SSLContext = None):
+        self.handler = handler
+        self.tls = tls
+        self.connections = 0
+        self.requests = [] # درخواست‌هایی که handler ثبت می‌کند
+        self.server_names = [] # SNI هر handshake
+        self.alpn = [] # ALPN توافق‌شده هر handshake موفق
+        if tls is not None:
+            tls.sni_callback = lambda sock, name, context: self.server_names.append(name)
+        self._lock = threading.Lock()
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._socket.bind(('127.0.0.1', 0))
+        self._socket.listen(128)
+        self._thread = threading.Thread(target=self._accept_loop, daemon=True)
+
+    @property
+    def port(self) -> int:
+        return self._socket.getsockname()[1]
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def wait_for_connections(self, count: int, timeout: float = 2) -> int:
+        """تا پذیرفته شدن count اتصال (یا پایان timeout) صبر می‌کند؛ پذیرش در thread جداست."""
+        stop_at = time.monotonic() + timeout
+        while self.connections < count and time.monotonic() < stop_at:
+            time.sleep(0.01)
+        time.sleep(0.05) # فرصت برای اتصال‌های اضافه احتمالی
+        return self.connections
+
+    def stop(self):
+        # close به تنهایی accept در حال انتظار را در لینوکس بیدار نمی‌کند
+        try:
+            self._socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._socket.close()
+        self._thread.join(timeout=5)
+
+    def _accept_loop(self):
+        while True:
+            try:
+                conn, _ = self._socket.accept()
+            except OSError:
+                return
+            with self._lock:
+                self.connections += 1
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn):
+        try:
+            with conn:
+                conn.settimeout(10)
+                if self.tls is not None:
+                    conn = self.tls.wrap_socket(conn, server_side=True)
+                    self.alpn.append(conn.selected_alpn_protocol())
+                self.handler(self, conn)
+        except OSError:
+            pass
+
+
+def closed_port() -> int:
+    """پورتی روی 127.0.0.1 که (در لحظه فراخوانی) هیچ سوکتی به آن گوش نمی‌دهد."""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
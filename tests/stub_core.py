@@ -0,0 +1,159 @@
+"""
+هسته پراکسی جایگزین xray برای تست backend: همان فرمان‌هایی را که collector اجرا می‌کند پشتیبانی
+می‌کند و پیکربندی‌ای را که برایش ساخته می‌شود می‌خواند.
+
+    stub_core.py run -c config.json
+    stub_core.py api ado --server=127.0.0.1:PORT batch.json
+    stub_core.py api rmo --server=127.0.0.1:PORT out-0 out-1 ...
+
+run برای inbound API یک سرور JSON (یک درخواست در هر خط) و برای هر inbound HTTP یک پراکسی
+HTTP ساده راه‌اندازی می‌کند. پراکسی درخواست را از outbound مسیریابی‌شده عبور می‌دهد: اگر
+outbound وجود نداشته باشد یا شناسه کاربر آن با 'bad' شروع شود اتصال بسته می‌شود (مثل
+کانفیگ خراب) و شناسه 'rate-N' پاسخ را به N بایت در ثانیه محدود می‌کند.
+
+متغیرهای محیطی: STUB_CORE_LOG مسیر فایلی که هر اجرای run و هر فرمان API در آن ثبت می‌شود؛
+STUB_CORE_FAIL با مقدار 'run' یا نام فرمان API آن مرحله را ناموفق می‌کند.
+"""
+import json
+import os
+import socket
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+
+def log(line: str):
+    if os.environ.get('STUB_CORE_LOG'):
+        with open(os.environ['STUB_CORE_LOG'], 'a') as f:
+            f.write(f'{line}\n')
+
+
+def read_request(conn) -> bytes:
+    data = b''
+    while b'\r\n\r\n' not in data:
+        chunk = conn.recv(4096)
+        if not chunk:
+            return None
+        data += chunk
+    return data
+
+
+def relay(conn, outbound: dict):
+    """یک درخواست GET با آدرس کامل را به مقصد می‌فرستد و پاسخ را برمی‌گرداند."""
+    request = read_request(conn)
+    if request is None:
+        return
+    head = request.split(b'\r\n\r\n', 1)[0].decode('latin-1').split('\r\n')
+    method, url, _ = head[0].split(' ')
+    target = urlsplit(url)
+    user = outbound['settings']['vnext'][0]['users'][0]['id']
+    rate = int(user[len('rate-'):]) if user.startswith('rate-') else None
+    with socket.create_connection((target.hostname, target.port or 80), timeout=10) as upstream:
+        headers = [line for line in head[1:] if not line.lower().startswith(('proxy-', 'connection:'))]
+        upstream.sendall('\r\n'.join([f'{method} {target.path or "/"}{"?" + target.query if target.query else ""} '
+                                      'HTTP/1.1', *headers, 'Connection: close', '', '']).encode('latin-1'))
+        while True:
+            chunk = upstream.recv(16384 if rate is None else min(16384, rate // 20 or 1))
+            if not chunk:
+                break
+            conn.sendall(chunk)
+            if rate is not None:
+                time.sleep(len(chunk) / rate)
+
+
+class Core:
+    def __init__(self, config: dict):
+        self.outbounds = {outbound['tag']: outbound for outbound in config['outbounds']}
+        self.routes = {rule['inboundTag'][0]: rule['outboundTag'] for rule in config['routing']['rules']}
+        self.lock = threading.Lock()
+        self.listeners = []
+        for inbound in config['inbounds']:
+            sock = socket.socket()
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            sock.bind((inbound['listen'], inbound['port']))
+            sock.listen(64)
+            handler = self.serve_api if inbound['tag'] == 'api' else self.serve_proxy
+            self.listeners.append((sock, handler, inbound['tag']))
+
+    def run(self):
+        for sock, handler, tag in self.listeners:
+            threading.Thread(target=self.accept, args=(sock, handler, tag), daemon=True).start()
+        threading.Event().wait()
+
+    def accept(self, sock, handler, tag):
+        while True:
+            conn, _ = sock.accept()
+            threading.Thread(target=self.serve, args=(conn, handler, tag), daemon=True).start()
+
+    def serve(self, conn, handler, tag):
+        try:
+            with conn:
+                conn.settimeout(30)
+                handler(conn, tag)
+        except OSError:
+            pass
+
+    def serve_api(self, conn, tag):
+        line = conn.makefile('rb').readline()
+        if not line:
+            return
+        request = json.loads(line)
+        with self.lock:
+            if request['command'] == 'ado':
+                self.outbounds.update((outbound['tag'], outbound) for outbound in request['outbounds'])
+                reply = 'ok'
+            else:
+                missing = [tag for tag in request['tags'] if tag not in self.outbounds]
+                for tag in request['tags']:
+                    self.outbounds.pop(tag, None)
+                reply = f'error: unknown outbound {missing[0]}' if missing else 'ok'
+        conn.sendall(reply.encode() + b'\n')
+
+    def serve_proxy(self, conn, tag):
+        with self.lock:
+            outbound = self.outbounds.get(self.routes.get(tag))
+        if outbound is None or outbound.get('protocol') == 'blackhole':
+            return
+        if outbound['settings']['vnext'][0]['users'][0]['id'].startswith('bad'):
+            return
+        relay(conn, outbound)
+
+
+def api(command: str, arguments: list) -> int:
+    server = arguments[0].split('=', 1)[1]
+    arguments = arguments[1:]
+    log(f'api {command}')
+    if os.environ.get('STUB_CORE_FAIL') == command:
+        print('failed', file=sys.stderr)
+        return 1
+    if command == 'ado':
+        outbounds = []
+        for path in arguments:
+            with open(path) as f:
+                outbounds += json.load(f)['outbounds']
+        request = {'command': 'ado', 'outbounds': outbounds}
+    else:
+        request = {'command': 'rmo', 'tags': arguments}
+    host, port = server.rsplit(':', 1)
+    with socket.create_connection((host, int(port)), timeout=5) as conn:
+        conn.sendall(json.dumps(request).encode() + b'\n')
+        reply = conn.makefile('rb').readline().decode().strip()
+    if reply != 'ok':
+        print(reply, file=sys.stderr)
+        return 1
+    return 0
+
+
+def main(argv: list) -> int:
+    if argv[0] == 'run':
+        log('run')
+        if os.environ.get('STUB_CORE_FAIL') == 'run':
+            return 1
+        with open(argv[2]) as f:
+            Core(json.load(f)).run()
+    return api(argv[1], argv[2:])
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
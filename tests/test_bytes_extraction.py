@@ -0,0 +1,64 @@
+import base64
+
+import pytest
+
+import collector
+from fake_subscription import SAMPLE_CONFIGS, encode_body
+
+REMARK = "vless://u@h.example.com:443?type=ws#%F0%9F%87%AE-ایران"
+TEXT = encode_body(SAMPLE_CONFIGS + [REMARK])
+EXPECTED = SAMPLE_CONFIGS + [REMARK]
+BODIES = {
+    'plain': TEXT,
+    'base64': base64.b64encode(TEXT),
+    'base64_wrapped': base64.encodebytes(TEXT),
+    'base64_crlf': base64.encodebytes(TEXT).replace(b'\n', b'\r\n'),
+    'urlsafe': base64.urlsafe_b64encode(TEXT).rstrip(b'='),
+    'urlsafe_padded': base64.urlsafe_b64encode(TEXT),
+    'dangling_char': base64.b64encode(TEXT) + b'Q',
+}
+
+
+def _stream(body: bytes, chunk_size: int, raw_bytes: bool) -> list:
+    extractor = collector.StreamingExtractor(raw_bytes=raw_bytes)
+    for start in range(0, len(body), chunk_size):
+        extractor.feed(body[start:start + chunk_size])
+    return extractor.close()
+
+
+@pytest.mark.parametrize('name', sorted(BODIES))
+def test_all_extraction_paths_agree(name):
+    body = BODIES[name]
+    assert collector.extract_configs(body.decode()) == EXPECTED
+    assert collector.extract_configs_bytes(body) == EXPECTED
+    for chunk_size in (1, 3, 7, 64, 4096, len(body)):
+        assert _stream(body, chunk_size, raw_bytes=False) == EXPECTED, chunk_size
+        assert _stream(body, chunk_size, raw_bytes=True) == EXPECTED, chunk_size
+
+
+def test_invalid_base64_yields_nothing_in_every_path():
+    body = b'!!!! not a subscription ####'
+    assert collector.extract_configs(body.decode()) == []
+    assert collector.extract_configs_bytes(body) == []
+    assert _stream(body, 5, raw_bytes=True) == []
+
+
+def test_decode_base64_content_accepts_urlsafe_and_whitespace():
+    encoded = base64.urlsafe_b64encode('vless://a?x=ü~'.encode()).decode().rstrip('=')
+    assert collector.decode_base64_content(encoded[:8] + '\n ' + encoded[8:]) == 'vless://a?x=ü~'
+
+
+@pytest.mark.parametrize('stream', [False, True])
+@pytest.mark.parametrize('raw_bytes', [False, True])
+def test_fetch_modes_agree(subscription_server, stream, raw_bytes):
+    # سرور charset اعلام نمی‌کند؛ بدنه در همه حالت‌ها UTF-8 خوانده می‌شود
+    urls = [subscription_server.add(f'/{name}', body) for name, body in BODIES.items()]
+    results = dict(collector.iter_source_configs(urls, stream=stream, raw_bytes=raw_bytes))
+    assert results == {url: EXPECTED for url in urls}
+
+
+def test_flags_select_extraction_mode():
+    args = collector.parse_args(['--stream', '--bytes-extraction'])
+    assert args.stream and args.bytes_extraction
+    args = collector.parse_args([])
+    assert args.stream is collector.STREAM_DOWNLOADS and args.bytes_extraction is collector.BYTES_EXTRACTION
@@ -0,0 +1,142 @@
+import os
+import subprocess
+import sys
+from functools import partial
+
+import pytest
+
+import collector
+from probe_servers import read_http_request
+
+
+def _config(uuid: str, remark: str = '') -> str:
+    return f"vless://{uuid}@edge.example.com:443?security=tls&type=ws&host=edge.example.com&path=%2Fws#{remark}"
+
+
+def _core_log() -> list:
+    with open(os.environ['STUB_CORE_LOG']) as f:
+        return f.read().split('\n')[:-1]
+
+
+def no_content(server, conn):
+    request_line, _ = read_http_request(conn)
+    server.requests.append(request_line)
+    conn.sendall(b'HTTP/1.1 204 No Content\r\nContent-Length: 0\r\nConnection: close\r\n\r\n')
+
+
+@pytest.fixture
+def target(stand_in):
+    server = stand_in(no_content)
+    server.url = f'http://127.0.0.1:{server.port}/generate_204'
+    return server
+
+
+def test_base_config_routes_each_inbound_and_exposes_the_handler_api():
+    config = collector.build_core_config([2001, 2002], 2000)
+    assert config['api'] == {'tag': 'api', 'services': ['HandlerService']}
+    assert [(inbound['tag'], inbound['port'], inbound['protocol']) for inbound in config['inbounds']] == [
+        ('api', 2000, 'dokodemo-door'), ('in-0', 2001, 'http'), ('in-1', 2002, 'http')]
+    assert [(rule['inboundTag'], rule['outboundTag']) for rule in config['routing']['rules']] == [
+        (['api'], 'api'), (['in-0'], 'out-0'), (['in-1'], 'out-1')]
+    # outbound پیش‌فرض (اولین outbound) ترافیک inboundهای بدون outbound را دور می‌ریزد
+    assert config['outbounds'] == [{'tag': 'blocked', 'protocol': 'blackhole'}]
+
+
+def test_free_ports_are_distinct_and_bindable():
+    ports = collector._free_ports(8)
+    assert len(set(ports)) == 8
+    for port in ports:
+        with collector.socket.socket() as sock:
+            sock.bind(('127.0.0.1', port))
+
+
+def test_wait_for_ports_rejects_an_exited_process_behind_a_foreign_listener(stand_in):
+    foreign = stand_in()
+    process = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(0.3)'])
+    assert collector._wait_for_ports([foreign.port], process, 5)
+    process.wait()
+    assert not collector._wait_for_ports([foreign.port], process, 5)
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    assert not collector._wait_for_ports([collector._free_ports(1)[0]], process, 5)
+
+
+def test_one_long_lived_core_serves_every_batch(stub_core, target):
+    configs = [_config('good', 'a'), _config('bad', 'b'), _config('good', 'c'), _config('good', 'd'),
+               _config('bad', 'e'), "trojan://pw@edge.example.com:443#f"]
+    with collector.CoreProxyBackend(stub_core, workers=1, batch_size=2) as backend:
+        results = collector.roundtrip_configs(configs, backend, target.url, timeout=5)
+    assert [results.get(config) is not None for config in configs[:5]] == [True, False, True, True, False]
+    assert configs[5] not in results
+    assert len(target.requests) == 3 and target.requests[0] == 'GET /generate_204 HTTP/1.1'
+    assert _core_log() == ['run', 'api ado', 'api rmo', 'api ado', 'api rmo', 'api ado']
+    assert collector.RUN_STATS['core_starts'] == 1 and collector.RUN_STATS['core_batches'] == 3
+    assert (collector.RUN_STATS['roundtrip_ok'], collector.RUN_STATS['roundtrip_failed'],
+            collector.RUN_STATS['roundtrip_unmeasured']) == (3, 2, 1)
+
+
+def test_workers_keep_separate_ports(stub_core, target):
+    configs = [_config('good', str(i)) for i in range(8)]
+    with collector.CoreProxyBackend(stub_core, workers=2, batch_size=2) as backend:
+        results = collector.roundtrip_configs(configs, backend, target.url, timeout=5)
+        ports = [port for worker in backend._workers for port in worker.ports + [worker.api_port]]
+    assert all(elapsed is not None for elapsed in results.values()) and len(results) == 8
+    assert len(set(ports)) == 6
+    assert _core_log().count('run') == 2
+
+
+def test_a_crashed_core_is_restarted_for_the_next_batch(stub_core, target):
+    with collector.CoreProxyBackend(stub_core, workers=1, batch_size=2) as backend:
+        assert collector.roundtrip_configs([_config('good')], backend, target.url, timeout=5)[_config('good')]
+        backend._workers[0].process.kill()
+        backend._workers[0].process.wait()
+        assert collector.roundtrip_configs([_config('good', 'x')], backend, target.url, timeout=5)[_config('good', 'x')]
+    assert _core_log() == ['run', 'api ado', 'run', 'api ado']
+
+
+def test_api_failure_leaves_configs_unmeasured_and_restarts_the_core(stub_core, target, monkeypatch):
+    with collector.CoreProxyBackend(stub_core, workers=1, batch_size=1) as backend:
+        assert collector.roundtrip_configs([_config('good', 'a')], backend, target.url, timeout=5)
+        monkeypatch.setenv('STUB_CORE_FAIL', 'rmo')
+        assert collector.roundtrip_configs([_config('good', 'b')], backend, target.url, timeout=5) == {}
+        monkeypatch.delenv('STUB_CORE_FAIL')
+        assert collector.roundtrip_configs([_config('good', 'c')], backend, target.url, timeout=5)[_config('good', 'c')]
+    assert _core_log() == ['run', 'api ado', 'api rmo', 'run', 'api ado']
+    assert collector.RUN_STATS['core_failures'] == 1
+
+
+def test_core_that_never_starts_is_a_backend_error(stub_core, monkeypatch):
+    monkeypatch.setenv('STUB_CORE_FAIL', 'run')
+    with collector.CoreProxyBackend(stub_core, workers=2, batch_size=2) as backend:
+        with pytest.raises(collector.ProxyBackendError):
+            collector.roundtrip_configs([_config('good', str(i)) for i in range(6)], backend, 'http://127.0.0.1:9/')
+    # دسته سوم ممکن است پیش از شکست دومین جایگاه شروع شده باشد
+    assert collector.RUN_STATS['core_failures'] in (2, 3) and collector.RUN_STATS['core_batches'] == 0
+
+
+def test_missing_binary_is_a_backend_error(tmp_path):
+    with pytest.raises(collector.ProxyBackendError):
+        collector.CoreProxyBackend(str(tmp_path / 'no-such-core'))
+
+
+class FakeBackend:
+    """backend بدون پردازه: هر کانفیگ پشتیبانی‌شده یک آدرس پراکسی ساختگی می‌گیرد."""
+    workers = 2
+    batch_size = 3
+
+    def __init__(self, unsupported=()):
+        self.unsupported = set(unsupported)
+        self.batches = []
+
+    def lease(self, configs):
+        self.batches.append(list(configs))
+        return collector.contextmanager(lambda: (yield {config: f'proxy:{config}' for config in configs
+                                                        if config not in self.unsupported}))()
+
+
+def test_measure_through_backend_batches_and_omits_configs_without_a_proxy():
+    backend = FakeBackend(unsupported={'c4'})
+    configs = [f'c{i}' for i in range(8)]
+    results = collector.measure_through_backend(backend, configs, partial(str.split, sep=':'), concurrency=2)
+    assert sorted(backend.batches) == [['c0', 'c1', 'c2'], ['c3', 'c4', 'c5'], ['c6', 'c7']]
+    assert results == {config: ['proxy', config] for config in configs if config != 'c4'}
@@ -0,0 +1,178 @@
+import pytest
+
+import collector
+from collector import UNSCORED, DigestIndex
+
+
+def _filled(count: int, run: int = 1) -> DigestIndex:
+    index = DigestIndex(capacity=16)
+    for digest in range(1, count + 1):
+        index.visit(digest * 0x9e3779b97f4a7c15 % (1 << 64) or 1, run)
+    return index
+
+
+def test_visit_adds_and_reports_previous_run():
+    index = DigestIndex()
+    assert index.visit(123, 1) == (UNSCORED, 0)
+    index.set_score(123, 7)
+    assert index.visit(123, 2) == (7, 1)
+    assert 123 in index and 456 not in index
+    assert len(index) == 1
+
+
+def test_resize_keeps_all_entries():
+    index = _filled(1000)
+    assert len(index) == 1000
+    assert index._mask + 1 >= 1000 / collector.SEEN_SET_LOAD_FACTOR
+    assert all(digest * 0x9e3779b97f4a7c15 % (1 << 64) in index for digest in range(1, 1001))
+
+
+def test_score_is_clamped_to_slot_width():
+    index = DigestIndex()
+    index.visit(5, 1)
+    index.set_score(5, 100_000)
+    assert index.visit(5, 1)[0] == 0x7fff
+
+
+def test_last_seen_in_and_invalidate_scores():
+    index = DigestIndex()
+    for digest, run in ((1, 1), (2, 2), (3, 2)):
+        index.visit(digest, run)
+        index.set_score(digest, digest)
+    assert sorted(index.last_seen_in(2)) == [2, 3]
+    index.invalidate_scores(collector.SCORING_VERSION + 1)
+    assert index.scoring_version == collector.SCORING_VERSION + 1
+    assert index.visit(2, 3) == (UNSCORED, 2)
+
+
+def test_save_load_roundtrip(tmp_path):
+    path = str(tmp_path / 'seen.bin')
+    index = _filled(300, run=4)
+    index.set_score(0x9e3779b97f4a7c15, 12)
+    index.run = 4
+    index.save(path)
+
+    loaded = DigestIndex.load(path)
+    try:
+        assert (len(loaded), loaded.run, loaded.scoring_version) == (300, 4, collector.SCORING_VERSION)
+        assert loaded.visit(0x9e3779b97f4a7c15, 5) == (12, 4)
+        # افزودن پس از بارگذاری تا رشد جدول از نسخه mmap شده کپی می‌گیرد و فایل را تغییر نمی‌دهد
+        for digest in range(1, 2000):
+            loaded.visit(digest, 5)
+        assert len(loaded) == 300 + 1999
+    finally:
+        loaded.close()
+    assert len(DigestIndex.load(path)) == 300
+
+
+def _corrupt(tmp_path, mutate) -> str:
+    path = str(tmp_path / 'seen.bin')
+    _filled(10).save(path)
+    with open(path, 'rb') as f:
+        data = bytearray(f.read())
+    data = mutate(data)
+    with open(path, 'wb') as f:
+        f.write(data)
+    return path
+
+
+@pytest.mark.parametrize('mutate', [
+    lambda data: data + b'\x00' * 3, # بایت‌های اضافه در انتها
+    lambda data: data + b'\x00' * 14, # ظرفیت غیر توان دو
+    lambda data: data[:20], # هدر ناقص
+    lambda data: b'XXXXXXXX' + data[8:], # magic نادرست
+    lambda data: data[:8] + (1 << 20).to_bytes(8, 'little') + data[16:], # size >= capacity
+], ids=['trailing', 'capacity', 'truncated', 'magic', 'size'])
+def test_load_rejects_invalid_files(tmp_path, mutate):
+    with pytest.raises(ValueError):
+        DigestIndex.load(_corrupt(tmp_path, mutate))
+
+
+def test_find_on_full_table_raises(tmp_path):
+    def fill_keys(data):
+        capacity = (len(data) - DigestIndex._HEADER_SIZE) // DigestIndex._SLOT_SIZE
+        start = DigestIndex._HEADER_SIZE
+        data[start:start + 8 * capacity] = b'\x07' * (8 * capacity)
+        return data
+
+    index = DigestIndex.load(_corrupt(tmp_path, fill_keys))
+    try:
+        with pytest.raises(ValueError):
+            index.visit(1, 2)
+    finally:
+        index.close()
+
+
+def test_load_config_index_rebuilds_from_store(tmp_path):
+    store = collector.ConfigStore(str(tmp_path / 'store.sqlite3'))
+    try:
+        configs = {'vless://a@h:1': 10, 'vless://b@h:2': 20, 'vless://c@h:3': 30}
+        store.record(configs, [], [], now=1.0)
+        gone = collector.config_digest('vless://c@h:3')
+        store.record({}, [], [gone], now=2.0)
+
+        bad_path = _corrupt(tmp_path, lambda data: data + b'\x00')
+        index = collector.load_config_index(bad_path, store)
+
+        assert len(index) == 3 and index.run == 2
+        assert index.visit(collector.config_digest('vless://a@h:1'), 3) == (10, 2)
+        assert index.visit(gone, 3) == (30, 1)
+    finally:
+        store.close()
+
+
+def test_load_config_index_discards_index_of_empty_store(tmp_path):
+    path = str(tmp_path / 'seen.bin')
+    _filled(10).save(path)
+    store = collector.ConfigStore(str(tmp_path / 'store.sqlite3'))
+    try:
+        assert len(collector.load_config_index(path, store)) == 0
+    finally:
+        store.close()
+
+
+def test_equivalent_configs_share_a_digest():
+    base = "vless://U@Edge.example.com:443?security=tls&type=ws&host=cdn.example.com&path=%2Fws&sni=cdn.example.com#a"
+    variants = ["vless://U@Edge.example.com:443?sni=cdn.example.com&path=/ws&host=cdn.example.com&type=ws"
+                "&security=tls&fp=chrome#b",
+                "vless://U@Edge.example.com:443?security=tls&type=ws&host=CDN.example.com.&path=ws&sni=cdn.example.com"]
+    for variant in variants:
+        assert collector.config_fingerprint(variant) == collector.config_fingerprint(base)
+        assert collector.config_digest(variant) == collector.config_digest(base)
+
+
+@pytest.mark.parametrize('config, other', [
+    # اثر انگشت یکسان ولی امتیاز متفاوت: مقادیر خام امتیازدهی در digest هستند
+    ("vless://u@h.example.com:443?security=tls&type=ws&host=h.example.com",
+     "vless://u@h.example.com:443?security=tls&type=ws&sni=h.example.com"),
+    ("vless://u@h.example.com:443?security=tls&type=ws&host=h",
+     "vless://u@h.example.com:443?security=TLS&type=ws&host=h"),
+    ("vless://u@1.2.3.4:443?security=tls&type=ws&host=h", "vless://u@1.2.3.4.:443?security=tls&type=ws&host=h"),
+    ("vless://u@h:443?security=tls&type=grpc&serviceName=%2F", "vless://u@h:443?security=tls&type=grpc"),
+])
+def test_configs_with_different_scores_get_different_digests(config, other):
+    assert collector.config_fingerprint(config) == collector.config_fingerprint(other)
+    assert collector.config_digest(config) != collector.config_digest(other)
+
+
+def test_prefilter_rejections_hash_the_raw_string():
+    config = "vmess://eyJhZGQiOiJhLmV4YW1wbGUuY29tIn0=#x"
+    assert collector.config_digest(config) == collector._digest(config)
+    assert collector.config_digest(config + 'y') != collector.config_digest(config)
+    assert collector.config_digest("vless://u@h:443?security=none&type=ws#a") != collector.config_digest(
+        "vless://u@h:443?security=none&type=ws#b")
+
+
+def test_equivalent_variant_is_not_rescored_in_incremental_runs(tmp_path, monkeypatch):
+    store = collector.ConfigStore(str(tmp_path / 'store.sqlite3'))
+    config = "vless://u@h.example.com:443?security=tls&type=ws&host=h.example.com#first"
+    variant = "vless://u@h.example.com:443?host=h.example.com&type=ws&security=tls#second"
+    try:
+        assert collector.score_configs_incremental([('a', [config])], store, 1, 'seen.bin') == [(config, 45)]
+        scoring_calls = []
+        monkeypatch.setattr(collector, 'score_configs', lambda configs, workers=None: scoring_calls.append(configs) or [])
+        assert collector.score_configs_incremental([('a', [variant, config])], store, 1, 'seen.bin') == [
+            (variant, 45)]
+        assert scoring_calls == [[]]
+    finally:
+        store.close()
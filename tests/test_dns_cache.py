@@ -0,0 +1,72 @@
+import json
+
+import pytest
+
+import collector
+
+
+@pytest.fixture
+def lookups(monkeypatch):
+    """جست‌وجوهای DNS ساختگی: نام‌های good.* resolve می‌شوند و بقیه نه."""
+    calls = []
+
+    def lookup(host):
+        calls.append(host)
+        return (['192.0.2.1', '192.0.2.2'] if host.startswith('good.') else []), 0.002
+
+    monkeypatch.setattr(collector, '_lookup_host', lookup)
+    return calls
+
+
+def test_positive_and_negative_results_are_cached(lookups):
+    resolved = collector.resolve_hosts(['good.a', 'bad.a', 'good.a'], now=1000)
+    assert resolved == {'good.a': '192.0.2.1', 'bad.a': None}
+    assert lookups == ['good.a', 'bad.a']
+    cache = json.load(open(collector.DNS_CACHE_FILE))
+    assert cache['good.a'] == {'addresses': ['192.0.2.1', '192.0.2.2'], 'expires': 1000 + collector.DNS_POSITIVE_TTL}
+    assert cache['bad.a'] == {'addresses': [], 'expires': 1000 + collector.DNS_NEGATIVE_TTL}
+
+    assert collector.resolve_hosts(['good.a', 'bad.a'], now=1001) == {'good.a': '192.0.2.1', 'bad.a': None}
+    assert lookups == ['good.a', 'bad.a']
+    assert collector.RUN_STATS['dns_cache_hits'] == 2
+    assert collector.RUN_STATS['dns_unresolved'] == 2
+
+
+def test_negative_entries_expire_before_positive_ones(lookups):
+    collector.resolve_hosts(['good.a', 'bad.a'], now=0)
+    collector.resolve_hosts(['good.a', 'bad.a'], now=collector.DNS_NEGATIVE_TTL + 1)
+    assert lookups == ['good.a', 'bad.a', 'bad.a']
+    collector.resolve_hosts(['good.a'], now=collector.DNS_POSITIVE_TTL + 1)
+    assert lookups[-1] == 'good.a'
+
+
+def test_ip_addresses_are_not_looked_up(lookups):
+    addresses = ['10.1.2.3', '2001:db8::1']
+    assert collector.resolve_hosts(addresses) == dict(zip(addresses, addresses))
+    assert lookups == []
+
+
+@pytest.mark.parametrize('content', [
+    '[]',
+    '"text"',
+    '{"good.a": []}',
+    '{"good.a": null}',
+    '{"good.a": {"addresses": ["192.0.2.9"]}}',
+    '{"good.a": {"addresses": "192.0.2.9", "expires": 1e12}}',
+    '{"good.a": {"addresses": [1], "expires": 1e12}}',
+    '{"good.a": {"addresses": ["192.0.2.9"], "expires": "later"}}',
+    '{not json',
+])
+def test_malformed_cache_is_ignored(lookups, content):
+    with open(collector.DNS_CACHE_FILE, 'w') as f:
+        f.write(content)
+    assert collector.resolve_hosts(['good.a']) == {'good.a': '192.0.2.1'}
+    assert lookups == ['good.a']
+    assert json.load(open(collector.DNS_CACHE_FILE))['good.a']['addresses'][0] == '192.0.2.1'
+
+
+def test_valid_entries_survive_next_to_malformed_ones(lookups):
+    with open(collector.DNS_CACHE_FILE, 'w') as f:
+        json.dump({'good.a': {'addresses': ['192.0.2.9'], 'expires': 1e12}, 'good.b': 5}, f)
+    assert collector.resolve_hosts(['good.a', 'good.b']) == {'good.a': '192.0.2.9', 'good.b': '192.0.2.1'}
+    assert lookups == ['good.b']
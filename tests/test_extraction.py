@@ -0,0 +1,38 @@
+import base64
+
+import collector
+
+MIXED = [
+    "vless://u@a.example.com:443?type=ws&security=tls#a",
+    "vmess://eyJhZGQiOiJhLmV4YW1wbGUuY29tIn0=",
+    "trojan://pw@t.example.com:443#t",
+    "ss://YWVzLTI1Ni1nY206cGFzcw@1.2.3.4:8388#ss",
+    "ssr://c3NyLmV4YW1wbGUuY29tOjQ0Mw",
+    "hysteria2://pw@h.example.com:443?insecure=1#h",
+    "tuic://u:pw@q.example.com:443#q",
+]
+
+
+def test_every_supported_protocol_is_extracted_as_a_full_uri():
+    configs = collector.extract_configs('\n'.join(MIXED))
+    assert configs == MIXED
+    assert collector.count_protocols(configs) == dict.fromkeys(collector.SUPPORTED_PROTOCOLS, 1)
+
+
+def test_base64_body_is_decoded():
+    assert collector.extract_configs(base64.b64encode('\n'.join(MIXED).encode()).decode()) == MIXED
+
+
+def test_configs_inside_markup_and_quotes():
+    text = '<a href="vless://u@h:443?x=1">x</a> \'trojan://p@h:443\' <br>ss://abc@h:1<br>'
+    assert collector.extract_configs(text) == ['vless://u@h:443?x=1', 'trojan://p@h:443', 'ss://abc@h:1']
+
+
+def test_scheme_suffixes_are_not_matched_inside_other_words():
+    # ss:// نباید در انتهای vmess:// یا کلمات دیگر تطبیق داده شود
+    assert collector.extract_configs('vmess://abc') == ['vmess://abc']
+    assert collector.extract_configs('xss://abc wss://host:443 http://x') == []
+
+
+def test_unsupported_schemes_are_ignored():
+    assert collector.extract_configs('vless://a http://b socks://c wireguard://d') == ['vless://a']
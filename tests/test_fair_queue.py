@@ -0,0 +1,68 @@
+import asyncio
+from collections import Counter
+
+import collector
+
+
+def test_subnets():
+    assert collector._subnet('10.1.2.3') == '10.1.2.0/24'
+    assert collector._subnet('2001:db8:1:2::1') == '2001:db8:1::/48'
+
+
+def test_pop_alternates_between_subnets_and_keeps_order_inside_each():
+    keys = [('10.0.0.1', 1), ('10.0.0.2', 2), ('10.0.0.3', 3), ('10.0.1.1', 4), ('10.0.2.1', 5), ('10.0.1.2', 6)]
+    queue = collector._FairQueue(keys)
+    assert queue.depths() == {'10.0.0.0/24': 3, '10.0.1.0/24': 2, '10.0.2.0/24': 1}
+    popped = [queue.pop(lambda subnet: True) for _ in range(len(keys))]
+    assert [port for _, port in popped] == [1, 4, 5, 2, 6, 3]
+    assert len(queue) == 0 and queue.pop(lambda subnet: True) is None
+
+
+def test_pop_skips_subnets_without_capacity():
+    queue = collector._FairQueue([('10.0.0.1', 1), ('10.0.0.2', 2), ('10.0.1.1', 3)])
+    assert queue.pop(lambda subnet: subnet != '10.0.0.0/24') == ('10.0.1.1', 3)
+    assert queue.pop(lambda subnet: subnet != '10.0.0.0/24') is None
+    assert queue.pop(lambda subnet: True) == ('10.0.0.1', 1)
+    assert list(queue.drain()) == [('10.0.0.2', 2)] and len(queue) == 0
+
+
+def _track_concurrency(monkeypatch):
+    """probe جعلی که بیشترین اتصال هم‌زمان هر IP و هر زیرشبکه را ثبت می‌کند."""
+    active, peak = Counter(), Counter()
+
+    async def probe(host, port, timeout):
+        for name in (host, collector._subnet(host)):
+            active[name] += 1
+            peak[name] = max(peak[name], active[name])
+        await asyncio.sleep(0.005)
+        for name in (host, collector._subnet(host)):
+            active[name] -= 1
+        return collector.ProbeResult(True, 0.005)
+
+    monkeypatch.setattr(collector, '_PROBES', {'tcp': probe})
+    return peak
+
+
+def test_connections_per_ip_and_subnet_are_capped(monkeypatch):
+    peak = _track_concurrency(monkeypatch)
+    keys = ([('10.0.0.1', port) for port in range(1000, 1020)]
+            + [(f'10.1.0.{i}', 443) for i in range(1, 41)] + [('10.2.0.1', 443)])
+    results = asyncio.run(collector._probe_endpoints(keys, 'tcp', 512, 1, 10, samples=1))
+    assert all(result.ok for result in results.values()) and len(results) == len(keys)
+    assert peak['10.0.0.1'] == collector.PROBE_PER_IP_CONCURRENCY
+    assert peak['10.1.0.0/24'] == collector.PROBE_PER_SUBNET_CONCURRENCY
+    assert peak['10.2.0.1'] == 1
+
+
+def test_busy_subnet_does_not_delay_the_others(monkeypatch):
+    started = []
+
+    async def probe(host, port, timeout):
+        started.append(host)
+        await asyncio.sleep(0.001)
+        return collector.ProbeResult(True, 0.001)
+
+    monkeypatch.setattr(collector, '_PROBES', {'tcp': probe})
+    keys = [(f'10.0.0.{i}', 443) for i in range(1, 51)] + [('10.9.0.1', 443)]
+    asyncio.run(collector._probe_endpoints(keys, 'tcp', 4, 1, 10, samples=1))
+    assert started.index('10.9.0.1') == 1
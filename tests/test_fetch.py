@@ -0,0 +1,80 @@
+import time
+
+import collector
+from fake_subscription import SAMPLE_CONFIGS, FakeSubscriptionServer
+
+
+def _fetch(urls, **kwargs) -> list:
+    return [(url, configs) for url, configs, _ in collector.fetch_sources(urls, **kwargs)]
+
+
+def test_fetches_hundreds_of_mixed_sources(subscription_server, monkeypatch):
+    monkeypatch.setattr(collector, 'REQUEST_TIMEOUT', 0.5)
+    live = subscription_server.add_sources(fast=240, slow=40, slow_delay=0.1)
+    dead = subscription_server.add_sources(dead=30, hanging=10)
+
+    started = time.perf_counter()
+    results = dict(_fetch(live + dead))
+    elapsed = time.perf_counter() - started
+
+    assert set(results) == set(live)
+    assert all(len(configs) == len(SAMPLE_CONFIGS) for configs in results.values())
+    # پشت سر هم دست‌کم 40 × 0.1 + 10 × 0.5 = 9 ثانیه طول می‌کشید
+    assert elapsed < 6
+
+
+def test_concurrent_fetch_is_faster_than_sequential(subscription_server, monkeypatch):
+    monkeypatch.setattr(collector, 'REQUEST_TIMEOUT', 0.25)
+    urls = subscription_server.add_sources(fast=8, slow=16, hanging=4, slow_delay=0.1)
+
+    started = time.perf_counter()
+    sequential = dict(_fetch(urls, max_workers=1))
+    sequential_time = time.perf_counter() - started
+    started = time.perf_counter()
+    concurrent = dict(_fetch(urls))
+    concurrent_time = time.perf_counter() - started
+
+    assert sequential == concurrent and len(concurrent) == 24
+    assert sequential_time >= 16 * 0.1 + 4 * 0.25
+    assert sequential_time / concurrent_time > 4
+
+
+def test_per_host_cap(monkeypatch):
+    monkeypatch.setattr(collector, 'MAX_FETCHES_PER_HOST', 3)
+    servers = [FakeSubscriptionServer().start() for _ in range(2)]
+    try:
+        urls = [url for server in servers for url in server.add_sources(slow=15, slow_delay=0.05)]
+        assert len(_fetch(urls, max_workers=32)) == 30
+        # هر میزبان (host:port) سقف خودش را دارد و دو میزبان هم‌زمان دریافت می‌شوند
+        assert [server.max_active for server in servers] == [3, 3]
+    finally:
+        for server in servers:
+            server.stop()
+
+
+def test_global_cap(subscription_server):
+    urls = subscription_server.add_sources(slow=12, slow_delay=0.05)
+    assert len(_fetch(urls, max_workers=2)) == 12
+    assert subscription_server.max_active == 2
+
+
+def test_results_arrive_as_completed(subscription_server):
+    slow = subscription_server.add('/slow', b'vless://a@slow.example.com:443', delay=0.5)
+    fast = [subscription_server.add(f'/fast/{i}', f'vless://a@fast{i}.example.com:443'.encode()) for i in range(5)]
+
+    order = [url for url, _ in _fetch([slow] + fast)]
+
+    assert order[-1] == slow
+    assert set(order[:-1]) == set(fast)
+
+
+def test_dead_sources_do_not_stop_the_run(subscription_server, monkeypatch):
+    monkeypatch.setattr(collector, 'REQUEST_TIMEOUT', 0.25)
+    live = subscription_server.add_sources(fast=3)
+    dead = subscription_server.add_sources(dead=2, hanging=2)
+    unreachable = 'http://127.0.0.1:9/closed'
+
+    configs = collector.get_configs_from_sources(dead + [unreachable] + live)
+
+    # کانفیگ‌های vless هر منبع یکتا هستند و trojan و ss در همه منابع یکسان‌اند
+    assert len(configs) == 3 * (len(SAMPLE_CONFIGS) - 2) + 2
@@ -0,0 +1,81 @@
+import pytest
+
+import collector
+
+
+def test_config_fingerprint_ignores_remark_and_param_order():
+    a = "vless://AAAAAAAA-BBBB-CCCC-DDDD-EEEEEEEEEEEE@Host.com:443?type=ws&path=ws&sni=cdn.com&security=tls#one"
+    b = "vless://aaaaaaaa-bbbb-cccc-dddd-eeeeeeeeeeee@host.com.:443?security=tls&sni=CDN.com&path=%2Fws&type=ws#two"
+    assert collector.config_fingerprint(a) == collector.config_fingerprint(b)
+
+
+def test_config_fingerprint_distinguishes_request_host():
+    base = "vless://u@1.2.3.4:443?type=ws&path=%2F&security=tls&sni=cdn.com"
+    assert (collector.config_fingerprint(base + "&host=a.com")
+            != collector.config_fingerprint(base + "&host=b.com"))
+
+
+def test_config_fingerprint_canonical_form():
+    config = "vless://u%40x@[2001:db8::1]:8443?type=grpc&serviceName=%2Fsvc%2F&security=TLS&host=Cdn.com.#r"
+    assert collector.config_fingerprint(config) == (
+        "vless://u%40x@[2001:db8::1]:8443?host=cdn.com&path=svc&security=tls&sni=cdn.com&type=grpc")
+
+
+@pytest.mark.parametrize('a, b', [
+    # UUID فقط وقتی شکل UUID دارد به حروف کوچک تبدیل می‌شود؛ رمز trojan حساس به حروف است
+    ("trojan://Secret@h.com:443?security=tls&type=ws&host=h.com", "trojan://secret@h.com:443?security=tls&type=ws&host=h.com"),
+    ("vless://u@h.com:443?security=tls&type=ws&host=h.com&path=%2Fa", "vless://u@h.com:443?security=tls&type=ws&host=h.com&path=%2Fb"),
+    ("vless://u@h.com:443?security=tls&type=ws&host=h.com", "vless://u@h.com:8443?security=tls&type=ws&host=h.com"),
+    ("vless://u@h.com:443?security=tls&type=ws&sni=a.com", "vless://u@h.com:443?security=tls&type=ws&sni=b.com"),
+    ("vless://u@h.com:443?security=tls&type=grpc&serviceName=a", "vless://u@h.com:443?security=tls&type=ws&path=a"),
+])
+def test_config_fingerprint_keeps_connection_differences(a, b):
+    assert collector.config_fingerprint(a) != collector.config_fingerprint(b)
+
+
+def test_links_without_uuid_or_host_keep_the_raw_string_without_remark():
+    assert collector.config_fingerprint("vmess://eyJhZGQiOiJhIn0=#remark ") == "vmess://eyJhZGQiOiJhIn0="
+    assert collector.config_fingerprint(" vless://h.com:443?type=ws#x") == "vless://h.com:443?type=ws"
+
+
+def test_sni_and_request_host_fall_back_to_each_other_and_the_server():
+    link = collector.parse_share_link("vless://u@Edge.com.:443?security=tls&type=ws")
+    assert collector.canonical_fingerprint(link) == ('vless', 'u', 'edge.com', 443, 'ws', '/', 'edge.com', 'edge.com', 'tls')
+    link = collector.parse_share_link("vless://u@e.com:443?security=tls&type=ws&host=H.com")
+    assert collector.canonical_fingerprint(link)[6:8] == ('h.com', 'h.com')
+    link = collector.parse_share_link("vless://u@e.com:443?security=tls&type=ws&host=h.com&sni=s.com")
+    assert collector.canonical_fingerprint(link)[6:8] == ('h.com', 's.com')
+
+
+def _key(config: str, mode: str, address: str = '10.0.0.1') -> tuple:
+    return collector._probe_key(collector.parse_share_link(config), address, mode)
+
+
+def test_probe_key_per_mode():
+    ws = "vless://u@e.com:443?security=tls&type=ws&host=h.com&sni=s.com&path=ws#r"
+    assert _key(ws, 'tcp') == ('10.0.0.1', 443)
+    assert _key(ws, 'tls') == ('10.0.0.1', 443, 's.com')
+    assert _key(ws, 'transport') == ('10.0.0.1', 443, 's.com', 'ws', 'h.com', '/ws')
+    grpc = "vless://u@e.com:2053?security=tls&type=grpc&serviceName=%2Fsvc&host=h.com"
+    assert _key(grpc, 'transport') == ('10.0.0.1', 2053, 'h.com', 'grpc', 'h.com', '/svc/Tun')
+
+
+def test_probe_key_ignores_what_the_probe_does_not_send():
+    a = "vless://11111111-2222-3333-4444-555555555555@a.com:443?security=tls&type=ws&host=h.com&path=%2Fx&fp=chrome#a"
+    b = "vless://66666666-2222-3333-4444-555555555555@b.com.:443?path=/x&host=H.com&type=ws&security=tls#b"
+    for mode in ('tcp', 'tls', 'transport'):
+        assert _key(a, mode) == _key(b, mode)
+    assert _key(a, 'tcp') != _key(a, 'tcp', address='10.0.0.2')
+
+
+@pytest.mark.parametrize('other, differs_from', [
+    ("vless://u@e.com:443?security=tls&type=ws&host=h.com&path=%2Fy", 'transport'),
+    ("vless://u@e.com:443?security=tls&type=ws&host=other.com&path=%2Fx", 'tls'),
+    ("vless://u@e.com:443?security=tls&type=ws&host=h.com&sni=s.com&path=%2Fx", 'tls'),
+    ("vless://u@e.com:8443?security=tls&type=ws&host=h.com&path=%2Fx", 'tcp'),
+])
+def test_probe_key_separates_what_the_probe_sends(other, differs_from):
+    base = "vless://u@e.com:443?security=tls&type=ws&host=h.com&path=%2Fx"
+    modes = ('tcp', 'tls', 'transport')
+    for mode in modes:
+        assert (_key(base, mode) != _key(other, mode)) == (modes.index(mode) >= modes.index(differs_from))
@@ -0,0 +1,185 @@
+import pytest
+
+import collector
+
+
+@pytest.mark.parametrize('value, prefix_bits, expected', [
+    (10, 5, b'\x0a'), # RFC 7541، C.1.1
+    (1337, 5, b'\x1f\x9a\x0a'), # RFC 7541، C.1.2
+    (42, 8, b'\x2a'), # RFC 7541، C.1.3
+    (31, 5, b'\x1f\x00'),
+    (127, 7, b'\x7f\x00'),
+])
+def test_hpack_int_rfc_examples(value, prefix_bits, expected):
+    assert collector._hpack_int(value, prefix_bits) == expected
+
+
+def test_hpack_int_keeps_first_byte_flags():
+    assert collector._hpack_int(4, 4, 0x10) == b'\x14'
+    assert collector._hpack_int(20, 4, 0x10) == b'\x1f\x05'
+
+
+def test_hpack_string_is_raw_literal():
+    assert collector._hpack_string('custom-key') == b'\x0acustom-key'
+    long_value = 'x' * 200
+    encoded = collector._hpack_string(long_value)
+    assert encoded[:2] == b'\x7f\x49' and encoded[2:] == long_value.encode()
+
+
+def test_grpc_request_headers():
+    block = collector._grpc_request_headers('example.com', '/svc/Tun')
+    assert block == (
+        b'\x83\x87'
+        b'\x04\x08/svc/Tun'
+        b'\x01\x0bexample.com'
+        b'\x00\x0ccontent-type\x10application/grpc'
+        b'\x00\x02te\x08trailers'
+    )
+
+
+@pytest.mark.parametrize('value, encoded', [
+    (b'www.example.com', 'f1e3c2e5f23a6ba0ab90f4ff'), # RFC 7541، C.4.1
+    (b'no-cache', 'a8eb10649cbf'),
+    (b'custom-key', '25a849e95ba97d7f'),
+    (b'custom-value', '25a849e95bb8e8b4bf'),
+    (b'302', '6402'), # C.6.1
+    (b'307', '640eff'), # C.6.2
+    (b'', ''),
+])
+def test_huffman_decode_rfc_examples(value, encoded):
+    assert collector._hpack_huffman_decode(bytes.fromhex(encoded)) == value
+
+
+@pytest.mark.parametrize('encoded', [
+    b'\x00', # '0' و سه بیت padding صفر
+    b'\xff', # padding هشت بیتی
+    b'\xff\xff\xff\xff', # EOS کامل
+])
+def test_huffman_decode_rejects_bad_padding_and_eos(encoded):
+    with pytest.raises(ValueError):
+        collector._hpack_huffman_decode(encoded)
+
+
+def test_huffman_codes_are_a_complete_prefix_code():
+    codes = collector._hpack_huffman_codes()
+    assert len(codes) == 257
+    assert sum(2.0 ** -length for length, _ in codes) == 1.0
+    assert codes[5, 0] == ord('0') and codes[30, (1 << 30) - 1] == 256
+
+
+@pytest.mark.parametrize('data, prefix_bits, expected', [
+    (b'\x0a', 5, (10, 1)),
+    (b'\x1f\x9a\x0a', 5, (1337, 3)),
+    (b'\xea\x2a', 5, (10, 1)), # بیت‌های بالای پیشوند پرچم‌اند
+    (b'\x1f\x00\xff', 5, (31, 2)),
+])
+def test_hpack_read_int(data, prefix_bits, expected):
+    assert collector._hpack_read_int(data, 0, prefix_bits) == expected
+
+
+@pytest.mark.parametrize('data', [b'\x1f', b'\x1f\x80', b'\x1f' + b'\xff' * 5 + b'\x01'])
+def test_hpack_read_int_rejects_truncated_or_huge(data):
+    with pytest.raises(ValueError):
+        collector._hpack_read_int(data, 0, 5)
+
+
+def _blocks(*hex_blocks):
+    return [bytes.fromhex(block.replace(' ', '')) for block in hex_blocks]
+
+
+def test_decoder_rfc_requests_with_huffman():
+    # RFC 7541، C.4: سه درخواست روی یک اتصال که از جدول پویا استفاده می‌کنند
+    decoder = collector._HpackDecoder()
+    first, second, third = (decoder.decode(block) for block in _blocks(
+        '8286 8441 8cf1 e3c2 e5f2 3a6b a0ab 90f4 ff',
+        '8286 84be 5886 a8eb 1064 9cbf',
+        '8287 85bf 4088 25a8 49e9 5ba9 7d7f 8925 a849 e95b b8e8 b4bf'))
+    base = [(':method', 'GET'), (':scheme', 'http'), (':path', '/'), (':authority', 'www.example.com')]
+    assert first == base
+    assert second == base + [('cache-control', 'no-cache')]
+    assert third == [(':method', 'GET'), (':scheme', 'https'), (':path', '/index.html'),
+                     (':authority', 'www.example.com'), ('custom-key', 'custom-value')]
+
+
+def test_decoder_rfc_responses_with_eviction():
+    # RFC 7541، C.6: جدول پویای 256 بایتی که با هر پاسخ عناصر قدیمی را بیرون می‌کند
+    decoder = collector._HpackDecoder(max_size=256)
+    first, second, third = (decoder.decode(block) for block in _blocks(
+        '4882 6402 5885 aec3 771a 4b61 96d0 7abe 9410 54d4 44a8 2005 9504 0b81 66e0 82a6 2d1b ff6e 919d 29ad '
+        '1718 63c7 8f0b 97c8 e9ae 82ae 43d3',
+        '4883 640e ffc1 c0bf',
+        '88c1 6196 d07a be94 1054 d444 a820 0595 040b 8166 e084 a62d 1bff c05a 839b d9ab 77ad 94e7 821d d7f2 '
+        'e6c7 b335 dfdf cd5b 3960 d5af 2708 7f36 72c1 ab27 0fb5 291f 9587 3160 65c0 03ed 4ee5 b106 3d50 07'))
+    tail = [('cache-control', 'private'), ('date', 'Mon, 21 Oct 2013 20:13:21 GMT'),
+            ('location', 'https://www.example.com')]
+    assert first == [(':status', '302')] + tail
+    assert second == [(':status', '307')] + tail
+    assert third == [(':status', '200'), ('cache-control', 'private'), ('date', 'Mon, 21 Oct 2013 20:13:22 GMT'),
+                     ('location', 'https://www.example.com'), ('content-encoding', 'gzip'),
+                     ('set-cookie', 'foo=ASDJKHQKBZXOQWEOPIUAXQWEOIU; max-age=3600; version=1')]
+    assert list(decoder._table) == [
+        ('set-cookie', 'foo=ASDJKHQKBZXOQWEOPIUAXQWEOIU; max-age=3600; version=1'),
+        ('content-encoding', 'gzip'), ('date', 'Mon, 21 Oct 2013 20:13:22 GMT')]
+    assert decoder._size == 215
+
+
+def test_decoder_table_size_update():
+    decoder = collector._HpackDecoder()
+    decoder.decode(b'\x40' + collector._hpack_string('x-a') + collector._hpack_string('1'))
+    assert decoder.decode(b'\xbe') == [('x-a', '1')]
+    assert decoder.decode(b'\x20') == [] # اندازه 0: جدول خالی می‌شود
+    with pytest.raises(ValueError):
+        decoder.decode(b'\xbe')
+    with pytest.raises(ValueError):
+        decoder.decode(b'\x3f\xe2\x1f') # 4097 بیش از سقف اعلام‌شده
+
+
+@pytest.mark.parametrize('block', [
+    b'\x80', # اندیس صفر
+    b'\xbe', # جدول پویای خالی
+    b'\x00\x05abc', # رشته ناقص
+    b'\x48', # مقدار جاافتاده
+])
+def test_decoder_rejects_malformed_blocks(block):
+    with pytest.raises(ValueError):
+        collector._HpackDecoder().decode(block)
+
+
+@pytest.mark.parametrize('flags, payload, expected', [
+    (0, b'\x88', b'\x88'),
+    (collector._H2_FLAG_PADDED, b'\x02\x88\x00\x00', b'\x88'),
+    (collector._H2_FLAG_PRIORITY, b'\x00\x00\x00\x01\x10\x89', b'\x89'),
+    (collector._H2_FLAG_PADDED | collector._H2_FLAG_PRIORITY, b'\x01\x00\x00\x00\x00\x10\x88\x00', b'\x88'),
+])
+def test_h2_header_fragment(flags, payload, expected):
+    assert collector._h2_header_fragment(flags, payload) == expected
+
+
+@pytest.mark.parametrize('flags, payload', [(collector._H2_FLAG_PADDED, b''), (collector._H2_FLAG_PADDED, b'\x05\x88')])
+def test_h2_header_fragment_rejects_bad_padding(flags, payload):
+    with pytest.raises(ValueError):
+        collector._h2_header_fragment(flags, payload)
+
+
+GRPC = ('content-type', 'application/grpc')
+
+
+@pytest.mark.parametrize('headers, end_stream, expected', [
+    ([(':status', '200'), GRPC], False, (200, None)),
+    ([(':status', '503'), GRPC], False, (503, 'http_503')),
+    ([(':status', '200'), GRPC, ('grpc-status', '12')], True, (200, 'grpc_status_12')),
+    ([(':status', '200'), GRPC, ('grpc-status', '0')], True, (200, None)),
+    ([(':status', '200'), GRPC, ('grpc-status', '12')], False, (200, None)), # trailer بعدی خوانده نمی‌شود
+    ([(':status', '200'), ('content-type', 'text/html')], False, (200, 'not_grpc')),
+    ([(':status', '٢٠٠'), GRPC], False, (None, 'bad_status')),
+    ([GRPC], False, (None, 'bad_status')),
+])
+def test_grpc_response_outcome(headers, end_stream, expected):
+    assert collector._grpc_response_outcome(headers, end_stream) == expected
+
+
+def test_h2_frame_header():
+    frame = collector._h2_frame(collector._H2_SETTINGS, collector._H2_FLAG_ACK, 0)
+    assert frame == b'\x00\x00\x00\x04\x01\x00\x00\x00\x00'
+    frame = collector._h2_frame(collector._H2_HEADERS, collector._H2_FLAG_END_HEADERS, 1, b'\x88')
+    assert frame == b'\x00\x00\x01\x01\x04\x00\x00\x00\x01\x88'
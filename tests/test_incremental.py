@@ -0,0 +1,93 @@
+import sqlite3
+
+import pytest
+
+import collector
+
+GOOD = [f"vless://u{i}@h{i}.example.com:443?security=tls&type=ws&host=h{i}.example.com&path=%2F#r{i}"
+        for i in range(6)]
+PREFILTERED = ["vmess://eyJhZGQiOiJhLmV4YW1wbGUuY29tIn0=", "vless://u@h.example.com:443?security=none&type=ws"]
+REJECTED = ["vless://u@h.example.com:443?security=tls&type=ws"] # فقط امتیازدهی کامل ردش می‌کند
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = collector.ConfigStore(str(tmp_path / 'store.sqlite3'))
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def scoring_calls(monkeypatch):
+    calls = []
+    score_configs = collector.score_configs
+
+    def record(configs, workers=None):
+        calls.append(list(configs))
+        return score_configs(configs, workers)
+
+    monkeypatch.setattr(collector, 'score_configs', record)
+    return calls
+
+
+def _run(store, *sources) -> list:
+    return sorted(collector.score_configs_incremental(list(enumerate(sources)), store, workers=1,
+                                                      index_path='seen.bin'))
+
+
+def _full(*sources) -> list:
+    unique = list(dict.fromkeys(config for configs in sources for config in configs))
+    return sorted(collector._score_batch(unique)[0])
+
+
+def _rows(store) -> dict:
+    db = sqlite3.connect(store._db.execute("PRAGMA database_list").fetchone()[2])
+    try:
+        return {config: (score, last_seen, active)
+                for config, score, last_seen, active in db.execute("SELECT config, score, last_seen, active FROM configs")}
+    finally:
+        db.close()
+
+
+def test_incremental_runs_match_a_full_rescore(store, scoring_calls):
+    first = [GOOD[:4] + PREFILTERED, REJECTED + GOOD[1:3]]
+    assert _run(store, *first) == _full(*first)
+    assert scoring_calls == [GOOD[:4] + REJECTED]
+
+    second = [GOOD[2:] + PREFILTERED[:1], GOOD[:1] + REJECTED]
+    assert _run(store, *second) == _full(*second)
+    assert scoring_calls[1] == GOOD[4:]
+
+    # بازگشت کانفیگ ناپدیدشده از امتیاز ذخیره‌شده خوانده می‌شود
+    assert _run(store, GOOD, PREFILTERED) == _full(GOOD, PREFILTERED)
+    assert scoring_calls[2] == []
+
+
+def test_prefilter_rejections_are_stored_and_counted_every_run(store, scoring_calls):
+    _run(store, GOOD[:2] + PREFILTERED + PREFILTERED[:1])
+    assert {config: row[0] for config, row in _rows(store).items() if row[0] == 0} == dict.fromkeys(PREFILTERED, 0)
+    assert collector.RUN_STATS['reject:not_vless'] == 2 and collector.RUN_STATS['store_new'] == 4
+
+    collector.RUN_STATS.clear()
+    _run(store, GOOD[:2] + PREFILTERED + PREFILTERED[:1])
+    assert scoring_calls[1] == []
+    assert collector.RUN_STATS['reject:not_vless'] == 2 and collector.RUN_STATS['reject:not_tls'] == 1
+    assert (collector.RUN_STATS['store_new'], collector.RUN_STATS['store_known']) == (0, 4)
+
+
+def test_last_seen_follows_active_configs(store):
+    _run(store, GOOD[:3] + PREFILTERED)
+    first_run = store.last_run_at()
+    _run(store, GOOD[1:4])
+    second_run = store.last_run_at()
+    assert second_run > first_run
+
+    rows = _rows(store)
+    assert rows[GOOD[0]] == (rows[GOOD[0]][0], first_run, 0)
+    assert rows[PREFILTERED[0]] == (0, first_run, 0)
+    assert [rows[config][1:] for config in GOOD[1:4]] == [(second_run, 1)] * 3
+
+    _run(store, GOOD[:1])
+    rows = _rows(store)
+    assert rows[GOOD[0]][1:] == (store.last_run_at(), 1)
+    assert rows[GOOD[1]][1:] == (second_run, 0)
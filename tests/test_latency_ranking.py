@@ -0,0 +1,80 @@
+import asyncio
+from collections import defaultdict
+
+import pytest
+
+import collector
+
+
+def _result(*samples_ms) -> collector.ProbeResult:
+    result = collector.ProbeResult(True, samples_ms[0] / 1000)
+    result.samples.extend(sample / 1000 for sample in samples_ms)
+    return result
+
+
+@pytest.mark.parametrize('samples, fraction, expected', [
+    ((30,), 0.5, 30),
+    ((10, 20), 0.5, 10),
+    ((30, 10, 20), 0.5, 20),
+    ((40, 10, 30, 20), 0.5, 20),
+    ((40, 10, 30, 20), 0.9, 40),
+    ((5, 1, 4, 2, 3, 10, 9, 8, 7, 6), 0.9, 9),
+    ((5, 1, 4, 2, 3, 10, 9, 8, 7, 6), 0.1, 1),
+    ((5, 1, 4, 2, 3, 10, 9, 8, 7, 6), 1.0, 10),
+    ((5, 1, 4), 0.0, 1),
+])
+def test_nearest_rank_percentile(samples, fraction, expected):
+    assert _result(*samples).percentile(fraction) == pytest.approx(expected / 1000)
+
+
+def test_p50_and_jitter():
+    result = _result(20, 100, 22, 21, 25)
+    assert result.p50 == pytest.approx(0.022)
+    assert result.jitter == pytest.approx(0.1 - 0.022)
+
+
+def test_single_measurement_without_samples_uses_latency():
+    result = collector.ProbeResult(True, 0.05, handshake_time=0.08)
+    assert result.p50 == result.latency == 0.08 and result.jitter == 0
+
+
+def test_rank_value_penalises_median_and_jitter():
+    stable, jittery = _result(50, 50, 50), _result(50, 50, 250)
+    assert collector.rank_value(40, stable) == pytest.approx(
+        collector.RANK_SCORE_WEIGHT * 40 - collector.RANK_LATENCY_WEIGHT * 50)
+    assert collector.rank_value(40, jittery) == pytest.approx(
+        collector.rank_value(40, stable) - collector.RANK_JITTER_WEIGHT * 200)
+
+
+def test_rank_probed_configs_orders_by_rank_and_drops_unreachable():
+    results = {'fast': _result(20, 21, 22), 'slow': _result(400, 410, 420), 'jittery': _result(20, 20, 900),
+               'dead': collector.ProbeResult(False, error='timeout')}
+    scores = dict.fromkeys(results, 40)
+    scores['slow'] = 41
+    # 40 - 0.21 > 41 - 4.1 - 0.2 > 40 - 0.2 - 17.6
+    assert collector.rank_probed_configs(['jittery', 'dead', 'slow', 'fast', 'unprobed'], scores, results) == [
+        'fast', 'slow', 'jittery']
+    scores['slow'] = 45
+    assert collector.rank_probed_configs(['jittery', 'slow', 'fast'], scores, results)[0] == 'slow'
+
+
+def test_probe_endpoints_collects_samples(monkeypatch):
+    latencies = defaultdict(lambda: iter([0.03, 0.01, None, 0.02]))
+
+    async def probe(host, port, timeout):
+        latency = next(latencies[host])
+        return collector.ProbeResult(False, error='timeout') if latency is None else collector.ProbeResult(True, latency)
+
+    async def down(host, port, timeout):
+        return collector.ProbeResult(False, error='ConnectionRefusedError')
+
+    monkeypatch.setattr(collector, '_PROBES', {'tcp': probe, 'down': down})
+    keys = [('10.0.0.1', 443), ('10.0.0.2', 443)]
+    results = asyncio.run(collector._probe_endpoints(keys, 'tcp', 8, 1, 10, samples=4, interval=0))
+    for key in keys:
+        assert list(results[key].samples) == [0.03, 0.01, 0.02]
+        assert results[key].p50 == 0.02
+    assert collector.RUN_STATS['probe_samples_lost'] == 2
+
+    results = asyncio.run(collector._probe_endpoints(keys[:1], 'down', 8, 1, 10, samples=4, interval=0))
+    assert not results[keys[0]].ok and len(results[keys[0]].samples) == 0
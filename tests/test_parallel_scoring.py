@@ -0,0 +1,39 @@
+import multiprocessing
+
+import pytest
+
+import collector
+
+CONFIGS = [
+    f"vless://u{n}@h{n}.example.com:443?security=tls&type=ws&host=h{n}.example.com#{n}" if n % 3 else
+    f"trojan://pw{n}@t{n}.example.com:443#{n}"
+    for n in range(300)
+]
+
+
+def test_parallel_scoring_matches_serial(monkeypatch):
+    serial = collector.score_configs(CONFIGS, workers=1)
+    serial_stats = dict(collector.RUN_STATS)
+    collector.RUN_STATS.clear()
+    monkeypatch.setattr(collector, 'PARALLEL_SCORING_THRESHOLD',
+                        dict.fromkeys(multiprocessing.get_all_start_methods(), 0))
+    monkeypatch.setattr(collector, 'SCORING_BATCH_SIZE', 7)
+    assert collector.score_configs(CONFIGS, workers=2) == serial
+    assert dict(collector.RUN_STATS) == serial_stats == {'reject:not_vless': 100}
+
+
+@pytest.mark.parametrize('size, parallel', [(9, False), (10, True)])
+def test_parallel_mode_is_selected_by_corpus_size(monkeypatch, size, parallel):
+    monkeypatch.setattr(collector, 'PARALLEL_SCORING_THRESHOLD', {multiprocessing.get_start_method(): 10})
+    pools = []
+
+    class RecordingPool(collector.ProcessPoolExecutor):
+        def __init__(self, *args, **kwargs):
+            pools.append(kwargs)
+            super().__init__(*args, **kwargs)
+
+    monkeypatch.setattr(collector, 'ProcessPoolExecutor', RecordingPool)
+    collector.score_configs(CONFIGS[:size], workers=2)
+    assert bool(pools) is parallel
+    collector.score_configs(CONFIGS[:size], workers=1)
+    assert len(pools) == int(parallel)
@@ -0,0 +1,57 @@
+from collections import Counter
+
+import pytest
+
+import collector
+
+CONFIGS = [
+    "vmess://eyJhZGQiOiJhLmV4YW1wbGUuY29tIn0=",
+    "trojan://pw@t.example.com:443?security=tls&type=ws&host=t.example.com",
+    "vless://u@h.example.com:443",
+    "vless://u@h.example.com:443?type=ws&host=h#security=tls",
+    "vless://u@h.example.com:443?security=reality&type=tcp",
+    "vless://u@h.example.com:443?security=tls&type=tcp",
+    "vless://u@h.example.com:443?security=tls&type=ws",
+    "vless://u@h.example.com:443?security=tls&type=ws&host=h.example.com",
+    "vless://u@h.example.com:443?security=tls&type=grpc",
+    "vless://u@h.example.com:443?security=tls&type=grpc&serviceName=svc",
+    "vless://u@h.example.com:443?security=tlsx&type=wss&host=h",
+    "vless://u@h.example.com:443?security=%74ls&type=ws&host=h",
+    "vless://u@h.example.com:443?%73ecurity=tls&type=w%73&host=h",
+    "vless://u@h.example.com:443?security=tls&type=ws&host=h%2Eexample.com&path=%2F",
+    "vless://u@[2001:db8::1]:8443?security=tls&type=grpc&serviceName=s",
+    "vless://u@h:99999?security=tls&type=ws&host=h",
+]
+
+
+@pytest.mark.parametrize('config', CONFIGS)
+def test_prefilter_only_rejects_what_the_full_scorer_rejects(config):
+    reason = collector._prefilter_reject_reason(config)
+    if not config.startswith('vless://'):
+        assert reason == 'not_vless'
+        return
+    score, full_reason = collector._score_parsed_config(config)
+    assert collector.score_and_filter_config(config) == score
+    if reason is not None:
+        assert (score, full_reason) == (0, reason)
+
+
+def test_percent_encoded_params_reach_the_full_parser():
+    assert collector._prefilter_reject_reason("vless://u@h:443?security=%74ls&type=ws&host=h") is None
+    assert collector.score_and_filter_config("vless://u@h:443?security=%74ls&type=ws&host=h") > 0
+
+
+def test_rejection_reasons_are_counted():
+    rejections = Counter()
+    scores = [collector.score_and_filter_config(config, rejections) for config in CONFIGS]
+    assert sum(rejections.values()) == scores.count(0)
+    assert rejections['not_vless'] == 2
+    assert rejections['ws_without_host'] == 1
+    assert rejections['grpc_without_service'] == 1
+    assert rejections['malformed'] == 1
+
+
+def test_score_configs_counts_rejections_in_run_stats():
+    scored = collector.score_configs(CONFIGS, workers=1)
+    assert [config for config, _ in scored] == [c for c in CONFIGS if collector.score_and_filter_config(c)]
+    assert collector.RUN_STATS['reject:not_vless'] == 2
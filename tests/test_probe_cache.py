@@ -0,0 +1,70 @@
+import pytest
+
+import collector
+
+OK_KEY, FAILED_KEY = ('10.0.0.1', 443, 'a.com'), ('10.0.0.2', 443, 'b.com')
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = collector.ProbeCache(str(tmp_path / 'probes.sqlite3'), success_ttl=3600, failure_ttl=900)
+    yield cache
+    cache.close()
+
+
+def _ok() -> collector.ProbeResult:
+    result = collector.ProbeResult(True, 0.02, 0.05, 'h2', True)
+    result.status = 101
+    result.response_time = 0.07
+    result.samples.extend([0.05, 0.04, 0.09])
+    return result
+
+
+def test_results_round_trip(cache):
+    cache.put_many('tls', {OK_KEY: _ok(), FAILED_KEY: collector.ProbeResult(False, 0.01, error='cert_invalid')},
+                   now=1000)
+    fresh = cache.get_many('tls', [OK_KEY, FAILED_KEY, ('10.0.0.3', 443, 'c.com')], now=1000)
+    assert set(fresh) == {OK_KEY, FAILED_KEY}
+    result = fresh[OK_KEY]
+    assert (result.ok, result.connect_time, result.handshake_time, result.alpn, result.cert_valid) == (
+        True, 0.02, 0.05, 'h2', True)
+    assert (result.status, result.response_time, list(result.samples)) == (101, 0.07, [0.05, 0.04, 0.09])
+    assert result.p50 == 0.05
+    assert not fresh[FAILED_KEY].ok and fresh[FAILED_KEY].error == 'cert_invalid'
+    assert fresh[FAILED_KEY].cert_valid is None
+
+
+def test_failures_expire_before_successes(cache):
+    cache.put_many('tls', {OK_KEY: _ok(), FAILED_KEY: collector.ProbeResult(False, error='timeout')}, now=1000)
+    assert set(cache.get_many('tls', [OK_KEY, FAILED_KEY], now=1900)) == {OK_KEY, FAILED_KEY}
+    assert set(cache.get_many('tls', [OK_KEY, FAILED_KEY], now=1901)) == {OK_KEY}
+    assert set(cache.get_many('tls', [OK_KEY, FAILED_KEY], now=4600)) == {OK_KEY}
+    assert cache.get_many('tls', [OK_KEY, FAILED_KEY], now=4601) == {}
+
+
+def test_newer_result_replaces_the_old_one(cache):
+    cache.put_many('tls', {OK_KEY: _ok()}, now=1000)
+    cache.put_many('tls', {OK_KEY: collector.ProbeResult(False, error='timeout')}, now=2000)
+    assert not cache.get_many('tls', [OK_KEY], now=2000)[OK_KEY].ok
+    assert cache.get_many('tls', [OK_KEY], now=2901) == {}
+
+
+def test_skipped_and_cancelled_results_are_not_stored(cache):
+    cache.put_many('tls', {OK_KEY: collector.ProbeResult(False, error='skipped'),
+                           FAILED_KEY: collector.ProbeResult(False, error='deadline')}, now=1000)
+    assert cache.get_many('tls', [OK_KEY, FAILED_KEY], now=1000) == {}
+
+
+def test_entries_are_separate_per_mode(cache):
+    cache.put_many('tls', {OK_KEY: _ok()}, now=1000)
+    assert cache.get_many('transport', [OK_KEY], now=1000) == {}
+
+
+def test_cache_survives_reopening(tmp_path):
+    path = str(tmp_path / 'probes.sqlite3')
+    cache = collector.ProbeCache(path)
+    cache.put_many('tcp', {('10.0.0.1', 443): collector.ProbeResult(True, 0.01)})
+    cache.close()
+    cache = collector.ProbeCache(path)
+    assert cache.get_many('tcp', [('10.0.0.1', 443)])[('10.0.0.1', 443)].latency == 0.01
+    cache.close()
@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+
+import collector
+
+ADDRESSES = {'a.example.com': ['10.0.0.1'], 'b.example.com': ['10.0.0.1'], 'c.example.com': ['10.0.0.2']}
+
+
+@pytest.fixture(autouse=True)
+def fake_dns(monkeypatch):
+    lookups = []
+
+    def lookup(host):
+        lookups.append(host)
+        return ADDRESSES.get(host, []), 0.001
+
+    monkeypatch.setattr(collector, '_lookup_host', lookup)
+    return lookups
+
+
+@pytest.fixture
+def fake_probes(monkeypatch):
+    """به جای اتصال واقعی، هر فراخوانی probe با آرگومان‌هایش ثبت می‌شود."""
+    calls = []
+
+    async def probe(*args):
+        calls.append(args[:-1])
+        await asyncio.sleep(0)
+        return collector.ProbeResult(True, 0.01)
+
+    monkeypatch.setattr(collector, '_PROBES', dict.fromkeys(('tcp', 'tls', 'transport'), probe))
+    return calls
+
+
+def _config(server: str, port: int = 443, uuid: str = 'u', remark: str = '', **params) -> str:
+    query = '&'.join(f'{key}={value}' for key, value in {'security': 'tls', 'type': 'ws', **params}.items())
+    return f"vless://{uuid}@{server}:{port}?{query}#{remark}"
+
+
+def test_tls_groups_ignore_uuid_remark_and_param_order():
+    configs = [_config('a.example.com', uuid='u1', remark='x', sni='s.com', host='h.com'),
+               "vless://u2@a.example.com:443?host=h.com&sni=S.com.&type=ws&security=tls#y",
+               _config('a.example.com', sni='other.com')]
+    groups, unresolved = collector.group_probe_targets(configs, 'tls')
+    assert list(groups.values()) == [configs[:2], configs[2:]]
+    assert list(groups) == [('10.0.0.1', 443, 's.com'), ('10.0.0.1', 443, 'other.com')]
+    assert unresolved == []
+
+
+def test_tcp_groups_by_address_and_port_across_hostnames():
+    configs = [_config('a.example.com', sni='x.com'), _config('b.example.com', sni='y.com'),
+               _config('a.example.com', port=8443), _config('10.0.0.1')]
+    groups, _ = collector.group_probe_targets(configs, 'tcp')
+    assert groups == {('10.0.0.1', 443): [configs[0], configs[1], configs[3]], ('10.0.0.1', 8443): [configs[2]]}
+
+
+def test_transport_groups_split_by_path_and_request_host():
+    configs = [_config('a.example.com', host='h.com', path='%2Fa'), _config('a.example.com', host='h.com', path='a'),
+               _config('a.example.com', host='h.com', path='%2Fb'),
+               _config('a.example.com', host='g.com', path='%2Fa'),
+               _config('c.example.com', type='grpc', serviceName='svc', host='h.com')]
+    groups, _ = collector.group_probe_targets(configs, 'transport')
+    assert [len(members) for members in groups.values()] == [2, 1, 1, 1]
+    assert list(groups)[-1] == ('10.0.0.2', 443, 'h.com', 'grpc', 'h.com', '/svc/Tun')
+
+
+def test_unresolved_and_portless_configs(fake_dns):
+    configs = [_config('a.example.com'), _config('missing.example.com'), "vless://u@a.example.com?type=ws",
+               _config('missing.example.com', uuid='v')]
+    groups, unresolved = collector.group_probe_targets(configs, 'tcp')
+    assert sum(map(len, groups.values())) == 1
+    assert unresolved == [configs[1], configs[3]]
+    assert sorted(fake_dns) == ['a.example.com', 'missing.example.com'] # هر نام یک بار
+
+
+def test_probe_configs_probes_each_group_once_and_fans_out(fake_probes):
+    members = [_config('a.example.com', uuid=f'u{n}', remark=str(n), sni='s.com') for n in range(5)]
+    loner = _config('c.example.com', sni='s.com')
+    missing = _config('missing.example.com')
+    results = collector.probe_configs(members + [loner, missing], 'tls', cache_path='')
+    assert sorted(fake_probes) == [('10.0.0.1', 443, 's.com'), ('10.0.0.2', 443, 's.com')]
+    assert len({id(results[config]) for config in members}) == 1 # یک نتیجه برای همه اعضای گروه
+    assert results[loner].ok and results[missing].error == 'unresolved'
+    assert collector.RUN_STATS['probes_sent'] == 2
+    assert collector.RUN_STATS['probed_configs'] == 6
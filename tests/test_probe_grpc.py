@@ -0,0 +1,133 @@
+import asyncio
+
+import pytest
+
+import collector
+from collector import _H2_CONTINUATION, _H2_FLAG_END_HEADERS, _H2_FLAG_END_STREAM, _H2_FLAG_PADDED, _H2_HEADERS
+from collector import _h2_frame, _hpack_int, _hpack_string
+from probe_servers import h2_handler, tls_context
+
+GRPC_CONTENT_TYPE = b'\x5f' + _hpack_string('application/grpc') # literal با ایندکس، نام از جدول ایستا (31)
+
+
+def huffman(value: str) -> bytes:
+    """رشته HPACK با کد Huffman (H=1)."""
+    codes = {symbol: (length, code) for (length, code), symbol in collector._hpack_huffman_codes().items()}
+    bits = total = 0
+    for byte in value.encode():
+        length, code = codes[byte]
+        bits, total = (bits << length) | code, total + length
+    padding = -total % 8
+    bits, total = (bits << padding) | ((1 << padding) - 1), total + padding
+    return _hpack_int(total // 8, 7, 0x80) + bits.to_bytes(total // 8, 'big')
+
+
+def headers(block: bytes, end_stream: bool = False) -> bytes:
+    return _h2_frame(_H2_HEADERS, _H2_FLAG_END_HEADERS | (_H2_FLAG_END_STREAM if end_stream else 0), 1, block)
+
+
+@pytest.fixture
+def grpc_server(stand_in, certificate):
+    def start(response: bytes, alpn=('h2',)):
+        return stand_in(h2_handler(response), tls=tls_context(certificate, alpn))
+    return start
+
+
+def _probe(port: int, path: str = '/svc/Tun'):
+    return asyncio.run(collector._probe_grpc('127.0.0.1', port, 'probe.test', 'cdn.example.com', path, 2))
+
+
+def test_grpc_response_is_reachable(grpc_server):
+    server = grpc_server(headers(b'\x88' + GRPC_CONTENT_TYPE))
+    result = _probe(server.port)
+    assert result.ok and result.status == 200 and result.alpn == 'h2'
+    assert result.response_time > 0
+    settings, block = server.requests[0]
+    assert settings == b'\x00\x02\x00\x00\x00\x00' # SETTINGS_ENABLE_PUSH = 0
+    assert collector._HpackDecoder().decode(block) == [
+        (':method', 'POST'), (':scheme', 'https'), (':path', '/svc/Tun'), (':authority', 'cdn.example.com'),
+        ('content-type', 'application/grpc'), ('te', 'trailers')]
+
+
+@pytest.mark.parametrize('status', ['502', '503', '302'])
+def test_huffman_encoded_status_is_a_failure(grpc_server, status):
+    # مثل encoder های Go: :status با نام ایندکس‌شده و مقدار Huffman
+    server = grpc_server(headers(b'\x48' + huffman(status) + GRPC_CONTENT_TYPE))
+    result = _probe(server.port)
+    assert not result.ok and result.status == int(status) and result.error == f'http_{status}'
+
+
+def test_huffman_encoded_200_is_reachable(grpc_server):
+    server = grpc_server(headers(b'\x48' + huffman('200') + b'\x5f' + huffman('application/grpc+proto')))
+    assert _probe(server.port).ok
+
+
+@pytest.mark.parametrize('code, ok, error', [('12', False, 'grpc_status_12'), ('0', True, None),
+                                             ('abc', False, 'grpc_bad_status')])
+def test_trailers_only_response_reads_grpc_status(grpc_server, code, ok, error):
+    block = b'\x88' + GRPC_CONTENT_TYPE + b'\x00' + _hpack_string('grpc-status') + huffman(code)
+    result = _probe(grpc_server(headers(block, end_stream=True)).port)
+    assert (result.ok, result.error, result.status) == (ok, error, 200)
+
+
+def test_trailers_only_without_grpc_status_fails(grpc_server):
+    result = _probe(grpc_server(headers(b'\x88' + GRPC_CONTENT_TYPE, end_stream=True)).port)
+    assert not result.ok and result.error == 'grpc_bad_status'
+
+
+def test_non_grpc_200_fails(grpc_server):
+    result = _probe(grpc_server(headers(b'\x88\x5f' + _hpack_string('text/html'))).port)
+    assert not result.ok and result.error == 'not_grpc'
+
+
+@pytest.mark.parametrize('block', [b'\x40' + _hpack_string('x-status') + _hpack_string('200'), # بدون :status
+                                   b'\x48' + _hpack_string('2OO'),
+                                   b'\x48' + _hpack_string('2000')])
+def test_unknown_status_is_a_failure(grpc_server, block):
+    result = _probe(grpc_server(headers(block + GRPC_CONTENT_TYPE)).port)
+    assert not result.ok and result.status is None and result.error == 'bad_status'
+
+
+def test_header_block_split_across_continuation_frames(grpc_server):
+    block = b'\x48' + huffman('200') + GRPC_CONTENT_TYPE + b'\xbe' # 62: همان content-type از جدول پویا
+    padded = bytes((3,)) + block[:2] + b'\x00' * 3
+    response = (_h2_frame(_H2_HEADERS, _H2_FLAG_PADDED, 1, padded)
+                + _h2_frame(_H2_CONTINUATION, 0, 1, block[2:5])
+                + _h2_frame(_H2_CONTINUATION, _H2_FLAG_END_HEADERS, 1, block[5:]))
+    result = _probe(grpc_server(response).port)
+    assert result.ok and result.status == 200
+
+
+@pytest.mark.parametrize('response, error', [
+    (headers(b'\xbe'), 'bad_headers'), # اندیس پویای تعریف‌نشده
+    (headers(b'\x48\x83\xff\xff\xff'), 'bad_headers'), # EOS در رشته Huffman
+    (_h2_frame(_H2_CONTINUATION, _H2_FLAG_END_HEADERS, 1, b'\x88'), 'h2_protocol_error'),
+    (_h2_frame(collector._H2_RST_STREAM, 0, 1, b'\x00\x00\x00\x02'), 'h2_rst_stream'),
+    (_h2_frame(collector._H2_GOAWAY, 0, 0, b'\x00' * 8), 'h2_goaway'),
+])
+def test_protocol_failures(grpc_server, response, error):
+    result = _probe(grpc_server(response).port)
+    assert not result.ok and result.error == error
+
+
+def test_connection_closed_without_response(stand_in, certificate):
+    def close_after_preface(server, conn):
+        conn.recv(4096)
+    server = stand_in(close_after_preface, tls=tls_context(certificate, ('h2',)))
+    result = _probe(server.port)
+    assert not result.ok and result.error == 'closed'
+
+
+def test_server_without_h2(grpc_server):
+    result = _probe(grpc_server(b'', alpn=('http/1.1',)).port)
+    assert not result.ok and result.error == 'no_h2'
+
+
+def test_transport_mode_requests_service_tun_path(grpc_server):
+    server = grpc_server(headers(b'\x88' + GRPC_CONTENT_TYPE))
+    config = (f"vless://u@127.0.0.1:{server.port}?security=tls&type=grpc&serviceName=my.Service"
+              f"&sni=probe.test&host=front.example.com#g")
+    result = collector.probe_configs([config], 'transport', cache_path='')[config]
+    assert result.ok
+    request = dict(collector._HpackDecoder().decode(server.requests[0][1]))
+    assert (request[':path'], request[':authority']) == ('/my.Service/Tun', 'front.example.com')
@@ -0,0 +1,93 @@
+import asyncio
+
+import pytest
+
+import collector
+
+KEYS = [(f'10.0.{i}.1', 443) for i in range(6)]
+
+
+@pytest.fixture
+def fake_probe(monkeypatch):
+    """probe جعلی: تأخیر هر IP از latencies (پیش‌فرض 10ms)، None یعنی خطا؛ فراخوانی‌ها ثبت می‌شوند."""
+    calls = []
+    latencies = {}
+
+    async def probe(host, port, timeout):
+        calls.append(host)
+        latency = latencies.get(host, 0.01)
+        if latency is None:
+            return collector.ProbeResult(False, error='timeout')
+        await asyncio.sleep(min(latency, 0.01))
+        return collector.ProbeResult(True, latency)
+
+    monkeypatch.setattr(collector, '_PROBES', dict.fromkeys(('tcp', 'tls', 'transport'), probe))
+    return calls, latencies
+
+
+def _probe(keys, **options):
+    options = {'concurrency': 1, 'timeout': 1, 'deadline': 10, 'samples': 1, **options}
+    return asyncio.run(collector._probe_endpoints(keys, 'tcp', options.pop('concurrency'), options.pop('timeout'),
+                                                  options.pop('deadline'), **options))
+
+
+def test_stops_once_target_is_reached(fake_probe):
+    calls, _ = fake_probe
+    results = _probe(KEYS, target=2)
+    assert calls == ['10.0.0.1', '10.0.1.1']
+    assert [results[key].error for key in KEYS] == [None, None] + ['skipped'] * 4
+    assert 'probes_expired' not in collector.RUN_STATS
+
+
+def test_failures_and_slow_endpoints_do_not_count_toward_target(fake_probe):
+    calls, latencies = fake_probe
+    latencies.update({'10.0.0.1': None, '10.0.1.1': 0.5})
+    results = _probe(KEYS, target=2, max_latency=0.2)
+    assert calls == ['10.0.0.1', '10.0.1.1', '10.0.2.1', '10.0.3.1']
+    assert results[KEYS[1]].ok and results[KEYS[4]].error == 'skipped'
+
+
+def test_weights_count_every_config_of_an_endpoint(fake_probe):
+    calls, _ = fake_probe
+    results = _probe(KEYS, target=3, weights={KEYS[0]: 2, KEYS[1]: 2})
+    assert calls == ['10.0.0.1', '10.0.1.1']
+    assert results[KEYS[2]].error == 'skipped'
+
+
+def test_without_target_every_endpoint_is_probed(fake_probe):
+    calls, _ = fake_probe
+    results = _probe(KEYS, concurrency=4)
+    assert sorted(calls) == [host for host, _ in KEYS]
+    assert all(result.ok for result in results.values())
+
+
+def test_deadline_cancels_in_flight_and_skips_the_rest(monkeypatch):
+    async def hang(host, port, timeout):
+        await asyncio.sleep(60)
+
+    monkeypatch.setattr(collector, '_PROBES', {'tcp': hang})
+    results = _probe(KEYS, concurrency=2, deadline=0.05)
+    assert [results[key].error for key in KEYS] == ['deadline'] * 2 + ['skipped'] * 4
+    assert collector.RUN_STATS['probes_expired'] == 2
+
+
+def test_cached_healthy_configs_reduce_the_target(fake_probe, monkeypatch, tmp_path):
+    calls, _ = fake_probe
+    addresses = {f'h{i}.example.com': [host] for i, (host, _) in enumerate(KEYS)}
+    monkeypatch.setattr(collector, '_lookup_host', lambda host: (addresses.get(host, []), 0.001))
+    configs = [f"vless://u@h{i}.example.com:443?security=tls&type=ws&host=h#r{i}" for i in range(len(KEYS))]
+    cache = str(tmp_path / 'probes.sqlite3')
+
+    probed = collector.probe_configs(configs, concurrency=1, target=2, cache_path=cache)
+    assert calls == ['10.0.0.1', '10.0.1.1']
+    assert [probed[config].ok for config in configs] == [True, True] + [False] * 4
+
+    # دو کانفیگ سالم در کش هستند، پس برای target=3 فقط یک endpoint دیگر بررسی می‌شود
+    calls.clear()
+    probed = collector.probe_configs(configs, concurrency=1, target=3, cache_path=cache)
+    assert calls == ['10.0.2.1']
+    assert [probed[config].ok for config in configs] == [True] * 3 + [False] * 3
+
+    calls.clear()
+    probed = collector.probe_configs(configs, concurrency=1, target=2, cache_path=cache)
+    assert calls == [] and probed[configs[3]].error == 'skipped'
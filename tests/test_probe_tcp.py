@@ -0,0 +1,51 @@
+import asyncio
+
+import collector
+from probe_servers import closed_port
+
+
+def _config(port: int, n: int = 0) -> str:
+    return f"vless://u{n}@127.0.0.1:{port}?security=tls&type=ws&host=h.example.com#{n}"
+
+
+def test_open_port_is_reachable(stand_in):
+    server = stand_in()
+    result = asyncio.run(collector._probe_tcp('127.0.0.1', server.port, 2))
+    assert result.ok and result.error is None
+    assert 0 < result.connect_time < 2
+    assert result.latency == result.connect_time
+
+
+def test_closed_port_is_refused():
+    result = asyncio.run(collector._probe_tcp('127.0.0.1', closed_port(), 2))
+    assert not result.ok and result.error == 'ConnectionRefusedError'
+
+
+def test_connect_timeout(monkeypatch):
+    async def never_connects(host, port):
+        await asyncio.sleep(10)
+
+    monkeypatch.setattr(asyncio, 'open_connection', never_connects)
+    result = asyncio.run(collector._probe_tcp('127.0.0.1', 1, 0.05))
+    assert not result.ok and result.error == 'timeout'
+
+
+def test_probe_configs_marks_reachable_configs(stand_in):
+    up, down = stand_in(), closed_port()
+    configs = [_config(up.port, 1), _config(down, 2), _config(up.port, 3), "vless://u@127.0.0.1?type=ws"]
+    results = collector.probe_configs(configs, 'tcp', cache_path='')
+    assert results[configs[0]].ok and results[configs[2]].ok
+    assert not results[configs[1]].ok
+    assert configs[3] not in results # بدون پورت بررسی نمی‌شود
+    # دو کانفیگ با endpoint یکسان فقط یک اتصال می‌سازند
+    assert up.wait_for_connections(1) == 1
+    assert collector.RUN_STATS['probes_sent'] == 2
+    assert collector.RUN_STATS['probes_ok'] == collector.RUN_STATS['probes_failed'] == 1
+
+
+def test_many_endpoints_share_the_concurrency_cap(stand_in):
+    servers = [stand_in() for _ in range(20)]
+    configs = [_config(server.port, n) for n, server in enumerate(servers)]
+    results = collector.probe_configs(configs, 'tcp', concurrency=3, cache_path='')
+    assert all(results[config].ok for config in configs)
+    assert [server.wait_for_connections(1) for server in servers] == [1] * 20
@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+
+import collector
+from probe_servers import tls_context
+
+
+@pytest.fixture(autouse=True)
+def fresh_tls_contexts():
+    # context ها cache می‌شوند و نباید CA یک تست به تست دیگر برسد
+    collector._tls_context.cache_clear()
+    yield
+    collector._tls_context.cache_clear()
+
+
+def _probe(port: int, sni: str = 'probe.test'):
+    return asyncio.run(collector._probe_tls('127.0.0.1', port, sni, 2))
+
+
+def test_trusted_certificate(stand_in, certificate, trust_certificate):
+    server = stand_in(tls=tls_context(certificate))
+    result = _probe(server.port)
+    assert result.ok and result.cert_valid is True
+    assert result.alpn == 'h2'
+    assert 0 < result.connect_time and 0 < result.handshake_time == result.latency
+    assert server.server_names == ['probe.test']
+
+
+def test_self_signed_certificate_is_reachable_but_not_valid(stand_in, certificate):
+    server = stand_in(tls=tls_context(certificate))
+    result = _probe(server.port)
+    assert result.ok and result.cert_valid is False
+    # handshake با بررسی گواهی شکست می‌خورد و بدون بررسی تکرار می‌شود
+    assert server.server_names == ['probe.test', 'probe.test']
+    assert server.alpn == ['h2']
+
+
+def test_sni_mismatch_is_not_valid(stand_in, certificate, trust_certificate):
+    server = stand_in(tls=tls_context(certificate))
+    result = _probe(server.port, sni='other.test')
+    assert result.ok and result.cert_valid is False
+    assert server.server_names[0] == 'other.test'
+
+
+@pytest.mark.parametrize('alpn, expected', [(('http/1.1',), 'http/1.1'), ((), None)])
+def test_negotiated_alpn(stand_in, certificate, alpn, expected):
+    server = stand_in(tls=tls_context(certificate, alpn))
+    assert _probe(server.port).alpn == expected
+
+
+@pytest.mark.parametrize('sni', ['.bad.com', 'a' * 64 + '.com', 'bad..com'])
+def test_invalid_sni_is_rejected_before_connecting(stand_in, certificate, sni):
+    server = stand_in(tls=tls_context(certificate))
+    result = _probe(server.port, sni=sni)
+    assert not result.ok and result.error == 'bad_sni'
+    assert server.wait_for_connections(0, timeout=0) == 0
+
+
+def test_plain_tcp_server_fails_the_handshake(stand_in):
+    server = stand_in()
+    result = _probe(server.port)
+    assert not result.ok and result.error
+
+
+def test_probe_configs_uses_sni_then_host(stand_in, certificate):
+    server = stand_in(tls=tls_context(certificate))
+    base = f"vless://u@127.0.0.1:{server.port}?security=tls&type=ws"
+    configs = [base + "&host=probe.test#host-only", base + "&sni=sni.test&host=probe.test#sni-wins",
+               base + "&sni=SNI.test.#same-endpoint"]
+    results = collector.probe_configs(configs, 'tls', cache_path='')
+    assert all(result.ok for result in results.values())
+    # دو endpoint (probe.test و sni.test)، هر کدام با تکرار handshake بدون بررسی گواهی
+    assert sorted(server.server_names) == ['probe.test'] * 2 + ['sni.test'] * 2
+    assert collector.RUN_STATS['probes_cert_invalid'] == 2
+    assert collector.RUN_STATS['alpn:h2'] == 2
@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+
+import collector
+from probe_servers import tls_context, websocket_handler
+
+
+@pytest.fixture
+def ws_server(stand_in, certificate):
+    def start(**kwargs):
+        return stand_in(websocket_handler(**kwargs), tls=tls_context(certificate))
+    return start
+
+
+def _probe(port: int, request_host: str = 'cdn.example.com', path: str = '/ws', timeout: float = 2):
+    return asyncio.run(collector._probe_ws('127.0.0.1', port, 'probe.test', request_host, path, timeout))
+
+
+def test_upgrade_accepted(ws_server):
+    server = ws_server()
+    result = _probe(server.port)
+    assert result.ok and result.status == 101
+    assert result.alpn == 'http/1.1' and result.response_time > 0
+    (path, host, headers), = server.requests
+    assert (path, host) == ('/ws', 'cdn.example.com')
+    assert headers['connection'] == 'Upgrade' and headers['sec-websocket-version'] == '13'
+    assert server.server_names[-1] == 'probe.test'
+
+
+def test_dead_path_fails_with_status(ws_server):
+    server = ws_server()
+    result = _probe(server.port, path='/gone')
+    assert not result.ok and result.status == 404 and result.error == 'http_404'
+
+
+def test_garbage_response(ws_server):
+    server = ws_server(response=b'SSH-2.0-OpenSSH_9.6\r\n')
+    result = _probe(server.port)
+    assert not result.ok and result.status is None and result.error == 'bad_response'
+
+
+def test_no_response_times_out(stand_in, certificate):
+    server = stand_in(lambda server, conn: conn.recv(4096) and conn.recv(4096), tls=tls_context(certificate))
+    result = _probe(server.port, timeout=0.3)
+    assert not result.ok and result.error == 'timeout'
+
+
+@pytest.mark.parametrize('request_host, path', [('a.com\r\nX-Injected: 1', '/ws'), ('a.com', '/ws HTTP/1.1')])
+def test_header_injection_is_not_sent(ws_server, request_host, path):
+    server = ws_server()
+    result = _probe(server.port, request_host, path)
+    assert not result.ok and result.error == 'bad_request'
+    assert server.wait_for_connections(0, timeout=0) == 0
+
+
+def test_transport_mode_sends_host_and_path_of_each_config(ws_server):
+    server = ws_server(paths=('/live',))
+    base = f"vless://u@127.0.0.1:{server.port}?security=tls&type=ws&sni=probe.test&host=cdn.example.com"
+    live, dead = base + "&path=%2Flive#a", base + "&path=dead#b"
+    other_host = base.replace('cdn.', 'www.') + "&path=%2Flive#c"
+    results = collector.probe_configs([live, dead, other_host], 'transport', cache_path='')
+    assert results[live].ok and results[other_host].ok
+    assert not results[dead].ok and results[dead].status == 404
+    assert sorted((path, host) for path, host, _ in server.requests) == [
+        ('/dead', 'cdn.example.com'), ('/live', 'cdn.example.com'), ('/live', 'www.example.com')]
+    assert collector.RUN_STATS['status:101'] == 2 and collector.RUN_STATS['status:404'] == 1
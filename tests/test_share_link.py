@@ -0,0 +1,67 @@
+from urllib.parse import parse_qs, unquote, urlparse
+
+import pytest
+
+import collector
+
+
+def test_parse_basic_link():
+    link = collector.parse_share_link(
+        "VLESS://uuid-1@Node.Example.COM:443/?type=ws&path=%2Fws%3Fed%3D2048&sni=a.b#my%20node")
+    assert (link.scheme, link.uuid, link.host, link.port) == ('vless', 'uuid-1', 'node.example.com', 443)
+    assert link.params == {'type': 'ws', 'path': '/ws?ed=2048', 'sni': 'a.b'}
+    assert link.fragment == 'my node'
+
+
+def test_parse_ipv6_host():
+    link = collector.parse_share_link("trojan://pw@[2001:DB8::1]:8443?sni=x#r")
+    assert (link.host, link.port) == ('2001:db8::1', 8443)
+
+
+def test_parse_percent_encoded_userinfo_and_plus_in_query():
+    link = collector.parse_share_link("trojan://p%40ss@h:1?path=a+b&host=c%2Bd")
+    assert link.uuid == 'p@ss'
+    assert link.params == {'path': 'a b', 'host': 'c+d'}
+
+
+def test_first_non_empty_param_wins():
+    link = collector.parse_share_link("vless://u@h:1?sni=&sni=first&sni=second&flag&type=grpc")
+    assert link.params == {'sni': 'first', 'type': 'grpc'}
+
+
+def test_missing_port():
+    link = collector.parse_share_link("vless://u@h?type=ws")
+    assert link.port is None
+
+
+@pytest.mark.parametrize('config', [
+    "vless://u@h:65536",
+    "vless://u@h:-1",
+    "vless://u@h:44x",
+    "vless://u@h:٤٤٣", # ارقام غیر ASCII
+    "vless://u@[::1",
+    "vless://u@x[::1]:443",
+    "vless://u@::1]:443",
+    "vless://u@[::1]:443]",
+    "no-scheme",
+    "://u@h:443",
+])
+def test_invalid_links(config):
+    assert collector.parse_share_link(config) is None
+
+
+
+@pytest.mark.parametrize('config', [
+    "vless://uuid@Host.Example.com:443?security=tls&type=ws&host=h.example.com&path=%2Fws%3Fed%3D2048#r",
+    "vless://uuid@[2001:db8::1]:8443?type=grpc&serviceName=svc&mode=gun#%F0%9F%87%A9%F0%9F%87%AA",
+    "trojan://p%40ss@10.0.0.1:443/?sni=a.b&alpn=h2%2Chttp%2F1.1&allowInsecure=0",
+    "vless://uuid@h.example.com?security=tls&type=ws&host=&host=second",
+    "ss://YWVzLTI1Ni1nY206cGFzcw@1.2.3.4:8388/?plugin=v2ray-plugin%3Bpath%3D%2F#ss",
+])
+def test_parser_matches_urlparse(config):
+    parsed = urlparse(config)
+    link = collector.parse_share_link(config)
+    assert (link.scheme, link.host, link.port) == (parsed.scheme, parsed.hostname, parsed.port)
+    assert link.uuid == unquote(parsed.username)
+    assert link.params == {key: values[0] for key, values in parse_qs(parsed.query).items()}
+    assert link.fragment == unquote(parsed.fragment)
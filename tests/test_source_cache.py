@@ -0,0 +1,71 @@
+import json
+
+import collector
+from fake_subscription import SAMPLE_CONFIGS, encode_body
+
+
+def test_second_run_uses_conditional_get(subscription_server):
+    urls = [subscription_server.add('/plain', encode_body(SAMPLE_CONFIGS)),
+            subscription_server.add('/base64', encode_body(SAMPLE_CONFIGS, 'base64'))]
+
+    assert collector.get_configs_from_sources(urls) == set(SAMPLE_CONFIGS)
+    assert collector.RUN_STATS['cache_misses'] == 2
+
+    subscription_server.requests.clear()
+    assert collector.get_configs_from_sources(urls) == set(SAMPLE_CONFIGS)
+    assert collector.RUN_STATS['cache_hits'] == 2
+    assert collector.RUN_STATS['cache_bytes_saved'] == sum(len(body) for body, _ in subscription_server.routes.values())
+    assert all(etag for _, etag in subscription_server.requests)
+
+
+def test_unchanged_body_without_etag_is_not_extracted_again(subscription_server, monkeypatch):
+    url = subscription_server.add('/plain', encode_body(SAMPLE_CONFIGS))
+    list(collector.iter_source_configs([url]))
+    with open(collector.SOURCE_CACHE_FILE) as f:
+        cache = json.load(f)
+    cache['sources'][url]['etag'] = None
+    with open(collector.SOURCE_CACHE_FILE, 'w') as f:
+        json.dump(cache, f)
+
+    monkeypatch.setattr(collector, 'extract_configs', None) # نباید فراخوانی شود
+    assert dict(collector.iter_source_configs([url])) == {url: SAMPLE_CONFIGS}
+    assert collector.RUN_STATS['cache_hits'] == 1
+
+
+def test_changed_body_is_extracted_again(subscription_server):
+    url = subscription_server.add('/plain', encode_body(SAMPLE_CONFIGS[:10]))
+    list(collector.iter_source_configs([url]))
+    subscription_server.add('/plain', encode_body(SAMPLE_CONFIGS[:20]))
+
+    assert dict(collector.iter_source_configs([url])) == {url: SAMPLE_CONFIGS[:20]}
+    assert collector.RUN_STATS['cache_misses'] == 2
+
+
+def test_failed_source_keeps_its_cache_entry(subscription_server):
+    urls = [subscription_server.add('/a', encode_body(SAMPLE_CONFIGS)),
+            subscription_server.add('/b', encode_body(SAMPLE_CONFIGS[:5]))]
+    list(collector.iter_source_configs(urls))
+
+    del subscription_server.routes['/b']
+    list(collector.iter_source_configs(urls))
+
+    assert set(collector.load_source_cache()) == set(urls)
+
+
+def test_interrupted_run_keeps_previous_cache(subscription_server):
+    urls = [subscription_server.add(f'/{i}', encode_body(SAMPLE_CONFIGS)) for i in range(3)]
+    list(collector.iter_source_configs(urls))
+    before = collector.load_source_cache()
+
+    for _ in collector.iter_source_configs(urls):
+        break
+
+    assert collector.load_source_cache() == before
+
+
+def test_incompatible_or_corrupt_cache_is_ignored(tmp_path):
+    path = str(tmp_path / 'cache.json')
+    for content in ('{"version": 0, "sources": {"u": {}}}', '[1, 2]', '{not json'):
+        with open(path, 'w') as f:
+            f.write(content)
+        assert collector.load_source_cache(path) == {}
@@ -0,0 +1,84 @@
+import threading
+import time
+
+import pytest
+
+import collector
+from probe_servers import read_http_request
+
+PAYLOAD_SIZE = 400_000
+
+
+def payload(server, conn):
+    request_line, _ = read_http_request(conn)
+    server.requests.append(request_line)
+    if not request_line.startswith('GET /__down'):
+        conn.sendall(b'HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\nConnection: close\r\n\r\n')
+        return
+    conn.sendall(b'HTTP/1.1 200 OK\r\nContent-Type: application/octet-stream\r\n'
+                 b'Content-Length: %d\r\nConnection: close\r\n\r\n' % PAYLOAD_SIZE)
+    conn.sendall(bytes(PAYLOAD_SIZE))
+
+
+@pytest.fixture
+def payload_url(stand_in):
+    return f'http://127.0.0.1:{stand_in(payload).port}/__down?bytes={PAYLOAD_SIZE}'
+
+
+def _config(uuid: str, remark: str = '') -> str:
+    return f"vless://{uuid}@edge.example.com:443?security=tls&type=ws&host=edge.example.com#{remark}"
+
+
+def test_speeds_follow_the_throughput_of_each_config(stub_core, payload_url):
+    fast, slow, broken = _config('rate-4000000', 'fast'), _config('rate-800000', 'slow'), _config('bad', 'x')
+    configs = [slow, broken, fast, "trojan://pw@edge.example.com:443#t"]
+    with collector.CoreProxyBackend(stub_core, workers=1, batch_size=2) as backend:
+        speeds = collector.speedtest_configs(configs, backend, payload_url)
+    assert speeds[broken] is None and configs[3] not in speeds
+    assert 400_000 < speeds[slow] < 1_200_000
+    assert speeds[fast] > 2 * speeds[slow]
+    assert collector.order_by_throughput(configs, speeds) == [fast, slow, broken, configs[3]]
+    assert (collector.RUN_STATS['speedtest_ok'], collector.RUN_STATS['speedtest_failed'],
+            collector.RUN_STATS['speedtest_unmeasured']) == (2, 1, 1)
+    assert collector.RUN_STATS['speedtest_bytes'] == 2 * PAYLOAD_SIZE
+
+
+def test_download_stops_at_max_bytes(stub_core, payload_url):
+    with collector.CoreProxyBackend(stub_core, workers=1, batch_size=1) as backend:
+        with backend.lease([_config('rate-2000000')]) as proxies:
+            speed = collector.measure_throughput(proxies[_config('rate-2000000')], payload_url, max_bytes=100_000)
+    assert speed is not None
+    # اولین تکه (پیش از شروع زمان‌سنجی) در max_bytes حساب نمی‌شود
+    assert 100_000 < collector.RUN_STATS['speedtest_bytes'] < 100_000 + 2 * collector.STREAM_CHUNK_SIZE < PAYLOAD_SIZE
+
+
+def test_http_errors_are_failures(stub_core, payload_url):
+    with collector.CoreProxyBackend(stub_core, workers=1, batch_size=1) as backend:
+        speeds = collector.speedtest_configs([_config('good')], backend, payload_url.replace('__down', 'missing'))
+    assert speeds == {_config('good'): None}
+
+
+def test_concurrency_cap_applies_across_batches(stub_core, monkeypatch):
+    active, peak = [0], [0]
+    lock = threading.Lock()
+
+    def measure(proxy, url):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.05)
+        with lock:
+            active[0] -= 1
+        return 1.0
+
+    monkeypatch.setattr(collector, 'measure_throughput', measure)
+    configs = [_config('good', str(i)) for i in range(8)]
+    with collector.CoreProxyBackend(stub_core, workers=4, batch_size=2) as backend:
+        speeds = collector.speedtest_configs(configs, backend, 'http://unused/', concurrency=2)
+    assert speeds == dict.fromkeys(configs, 1.0)
+    assert peak[0] == 2
+
+
+def test_order_by_throughput_keeps_unmeasured_configs_in_place():
+    assert collector.order_by_throughput(['a', 'b', 'c', 'd', 'e'], {'b': 10.0, 'c': None, 'd': 30.0}) == [
+        'd', 'b', 'a', 'c', 'e']
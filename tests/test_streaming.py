@@ -0,0 +1,67 @@
+import base64
+import os
+
+import pytest
+
+import collector
+from fake_subscription import SAMPLE_CONFIGS, encode_body
+
+TEXT = encode_body(SAMPLE_CONFIGS)
+BODIES = {
+    'plain': TEXT,
+    'base64': base64.b64encode(TEXT),
+    'base64_wrapped': base64.encodebytes(TEXT), # خط‌های 76 نویسه‌ای
+}
+CHUNK_SIZES = list(range(1, 17)) + [97, 1000, 4096, 4097]
+
+
+def stream(body: bytes, chunk_size: int, raw_bytes: bool = False) -> list:
+    extractor = collector.StreamingExtractor(raw_bytes=raw_bytes)
+    for start in range(0, len(body), chunk_size):
+        extractor.feed(body[start:start + chunk_size])
+    return extractor.close()
+
+
+@pytest.mark.parametrize('name', sorted(BODIES))
+def test_chunk_boundaries_do_not_change_the_result(name):
+    body = BODIES[name]
+    assert collector.extract_configs(body.decode()) == SAMPLE_CONFIGS
+    # اندازه‌های کوچک گروه چهارتایی Base64 و خود کانفیگ‌ها را در همه جایگاه‌ها می‌شکنند
+    for chunk_size in CHUNK_SIZES + [len(body)]:
+        assert stream(body, chunk_size) == SAMPLE_CONFIGS, chunk_size
+
+
+@pytest.mark.parametrize('padding', [0, 1, 2])
+def test_base64_carry_with_every_remainder(padding):
+    configs = [config + 'x' * padding for config in SAMPLE_CONFIGS[:3]]
+    body = base64.b64encode(encode_body(configs))
+    for chunk_size in (1, 2, 3, 5, 7):
+        assert stream(body, chunk_size) == configs
+
+
+def test_multibyte_text_split_across_chunks():
+    config = "vless://id@host.example.com:443?type=ws#%D8%B3-سلام"
+    body = f"header\n{config}\n".encode()
+    for chunk_size in range(1, 8):
+        assert stream(body, chunk_size) == [config]
+
+
+def test_last_config_without_trailing_delimiter():
+    assert stream(TEXT.rstrip(b'\n'), 5) == SAMPLE_CONFIGS
+
+
+def test_empty_and_tiny_bodies():
+    assert stream(b'', 1) == []
+    assert stream(b'abc', 1) == []
+
+
+def test_streaming_fetch_matches_buffered_fetch(subscription_server, monkeypatch):
+    monkeypatch.setattr(collector, 'STREAM_CHUNK_SIZE', 7)
+    urls = [subscription_server.add(f'/{name}', body) for name, body in BODIES.items()]
+
+    streamed = dict(collector.iter_source_configs(urls, stream=True))
+    os.remove(collector.SOURCE_CACHE_FILE) # تا اجرای دوم از کش استفاده نکند
+    buffered = dict(collector.iter_source_configs(urls, stream=False))
+
+    assert streamed == buffered == {url: SAMPLE_CONFIGS for url in urls}
+    assert collector.RUN_STATS['cache_misses'] == 2 * len(urls)
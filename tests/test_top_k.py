@@ -0,0 +1,44 @@
+import pytest
+
+import collector
+
+
+def _config(n: int, remark: str = '') -> str:
+    return f"vless://u{n}@h{n}.example.com:443?security=tls&type=ws&host=h{n}.example.com#{remark}"
+
+
+SCORED = [
+    (_config(1, 'a'), 35),
+    (_config(2), 45),
+    (_config(1, 'b'), 45),
+    (_config(3), 40),
+    (_config(2, 'dup'), 45),
+    (_config(4), 35),
+]
+
+
+def test_keeps_best_score_per_fingerprint_in_rank_order():
+    assert collector.select_top_configs(SCORED) == [_config(2), _config(1, 'b'), _config(3), _config(4)]
+
+
+@pytest.mark.parametrize('max_output', [1, 2, 3, 4, 10])
+def test_heap_selection_matches_sorted_prefix(max_output):
+    assert (collector.select_top_configs(SCORED, max_output)
+            == collector.select_top_configs(SCORED)[:max_output])
+
+
+def test_empty_input():
+    assert collector.select_top_configs([], 5) == []
+
+
+@pytest.mark.parametrize('option', ['--max-output', '--probe-samples', '--probe-target'])
+@pytest.mark.parametrize('value', ['0', '-1', 'x'])
+def test_count_options_reject_values_below_one(capsys, option, value):
+    with pytest.raises(SystemExit):
+        collector.parse_args([option, value])
+    assert option in capsys.readouterr().err
+
+
+def test_max_output_is_parsed():
+    assert collector.parse_args(['--max-output', '3']).max_output == 3
+    assert collector.parse_args([]).max_output is None